@@ -0,0 +1,213 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import sys
+import sysconfig
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from code_metrics.cyclomatic import CyclomaticComplexityVisitor
+from code_metrics.halstead import HalsteadMetricsVisitor
+from scanner.cache import TOOL_VERSION
+from scanner.repo_scan import EXCLUDED_DIRS, iter_python_files
+
+# radon is only needed here, the harness exists to show it can be dropped from the pipeline
+try:
+    import radon
+    from radon.metrics import h_visit_ast
+    from radon.visitors import ComplexityVisitor
+except ImportError:
+    radon = None
+
+HALSTEAD_FIELDS = ('operators', 'operands', 'unique_operators', 'unique_operands')
+
+
+def load_corpus(root, limit=None):
+    # (path, tree) of every module under root that parses on this interpreter
+    corpus = []
+    skipped = 0
+    for path in iter_python_files(root, EXCLUDED_DIRS | {'site-packages'}):
+        if limit is not None and len(corpus) >= limit:
+            break
+        try:
+            with open(path, 'rb') as file:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    corpus.append((path, ast.parse(file.read())))
+        except (OSError, SyntaxError, ValueError):
+            skipped += 1
+    return corpus, skipped
+
+
+def our_blocks(functions, classes, prefix=''):
+    # (lineno, name) -> (full name, kind, complexity) of every function, closure, method and class
+    blocks = {}
+    for func in functions:
+        name = f"{prefix}{func.get_name()}"
+        blocks[(func.start_lineno, func.name)] = (name, 'method' if func.is_method else 'function', func.complexity)
+        blocks.update(our_blocks(func.closures, [], f"{name}."))
+    for cls in classes:
+        # radon counts the path through the class body itself, as for a function
+        blocks[(cls.start_lineno, cls.name)] = (f"{prefix}{cls.name}", 'class', cls.complexity + 1)
+        blocks.update(our_blocks(cls.methods, [], prefix))
+    return blocks
+
+
+def radon_blocks(functions, classes, prefix=''):
+    blocks = {}
+    for func in functions:
+        name = f"{prefix}{func.fullname}"
+        blocks[(func.lineno, func.name)] = (name, 'method' if func.is_method else 'function', func.complexity)
+        blocks.update(radon_blocks(func.closures, [], f"{name}."))
+    for cls in classes:
+        blocks[(cls.lineno, cls.name)] = (f"{prefix}{cls.name}", 'class', cls.real_complexity)
+        blocks.update(radon_blocks(cls.methods, cls.inner_classes, prefix))
+    return blocks
+
+
+def cyclomatic_ours(tree):
+    visitor = CyclomaticComplexityVisitor()
+    visitor.visit(tree)
+    return our_blocks(visitor.functions, visitor.classes)
+
+def cyclomatic_radon(tree):
+    visitor = ComplexityVisitor.from_ast(tree)
+    return radon_blocks(visitor.functions, visitor.classes)
+
+
+def outer_functions(tree):
+    # Functions not nested in another function, in the order radon reports their Halstead metrics
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node is not tree:
+            yield node
+            continue
+        stack.extend(reversed(list(ast.iter_child_nodes(node))))
+
+def halstead_ours(tree):
+    visitor = HalsteadMetricsVisitor()
+    visitor.visit(tree)
+    return {(node.lineno, node.name): (node.name, 'function', tuple(getattr(metrics, field) for field in HALSTEAD_FIELDS)) for node, metrics in visitor.functions}
+
+def halstead_radon(tree):
+    # radon names its reports by function only, they are matched to the nodes by position
+    report = h_visit_ast(tree)
+    return {
+        (node.lineno, node.name): (name, 'function', (metrics.N1, metrics.N2, metrics.h1, metrics.h2))
+        for node, (name, metrics) in zip(outer_functions(tree), report.functions)
+    }
+
+ENGINES = {
+    'cyclomatic': (cyclomatic_ours, cyclomatic_radon),
+    'halstead': (halstead_ours, halstead_radon),
+}
+
+
+def timed(engine, corpus, repeat):
+    # Fastest of repeat runs over the whole corpus, with the blocks of the last one
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        blocks = [engine(tree) for path, tree in corpus]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, blocks
+
+
+def disagreements(corpus, ours, theirs, metric):
+    # Radon's records are the reference, blocks only one engine reports are disagreements too
+    found = []
+    compared = {} # kind -> blocks compared
+    for (path, tree), our_file, radon_file in zip(corpus, ours, theirs):
+        # radon only reports outer functions for Halstead, nested ones are compared for cyclomatic only
+        keys = radon_file.keys() | (our_file.keys() if metric == 'cyclomatic' else set())
+        for key in sorted(keys):
+            ours_block, radon_block = our_file.get(key), radon_file.get(key)
+            name, kind, value = radon_block or ours_block
+            compared[kind] = compared.get(kind, 0) + 1
+            if ours_block is not None and radon_block is not None and ours_block[2] == radon_block[2]:
+                continue
+            found.append({
+                "path": path,
+                "lineno": key[0],
+                "name": name,
+                "kind": kind,
+                "ours": ours_block and ours_block[2],
+                "radon": radon_block and radon_block[2],
+            })
+    return compared, found
+
+
+def compare(corpus, metrics, repeat, show):
+    results = {}
+    for metric in metrics:
+        our_engine, radon_engine = ENGINES[metric]
+        our_seconds, ours = timed(our_engine, corpus, repeat)
+        radon_seconds, theirs = timed(radon_engine, corpus, repeat)
+        compared, found = disagreements(corpus, ours, theirs, metric)
+        print(f"{metric:<12} ours {our_seconds:8.3f}s radon {radon_seconds:8.3f}s {radon_seconds / our_seconds:6.2f}x faster")
+
+        kinds = {}
+        for kind, blocks in sorted(compared.items()):
+            differ = [finding for finding in found if finding['kind'] == kind]
+            only_ours = sum(1 for finding in differ if finding['radon'] is None)
+            only_radon = sum(1 for finding in differ if finding['ours'] is None)
+            kinds[kind] = {
+                "blocks": blocks,
+                "agreement": 1 - len(differ) / blocks,
+                "differ": len(differ) - only_ours - only_radon,
+                "only_ours": only_ours,
+                "only_radon": only_radon,
+            }
+            print(f"  {kind:<10} {blocks:8} blocks {kinds[kind]['agreement']:8.2%} agree, {kinds[kind]['differ']} differ, {only_radon} only in radon, {only_ours} only ours")
+            for finding in differ[:show]:
+                print(f"    {finding['path']}:{finding['lineno']}: {finding['name']} ours {finding['ours']} radon {finding['radon']}")
+
+        results[metric] = {
+            "ours_seconds": our_seconds,
+            "radon_seconds": radon_seconds,
+            "speedup": radon_seconds / our_seconds,
+            "kinds": kinds,
+            "disagreements": found,
+        }
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the cyclomatic and Halstead metrics of every function with radon's, and the time both take.")
+    parser.add_argument('--path', default=sysconfig.get_paths()['stdlib'], help="Corpus to compare on (defaults to the standard library)")
+    parser.add_argument('--limit', type=int, default=None, help="Only compare the first this many modules")
+    parser.add_argument('--metrics', nargs='+', choices=sorted(ENGINES), default=list(ENGINES))
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per engine, the fastest is reported")
+    parser.add_argument('--show', type=int, default=10, help="Disagreements printed per metric and kind of block, all of them are written to --output")
+    parser.add_argument('--output', default='radon_comparison.json', help="Machine-readable results with every disagreement")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if radon is None:
+        sys.exit("radon is not installed, it is part of the dev dependency group")
+
+    corpus, skipped = load_corpus(args.path, args.limit)
+    print(f"Corpus: {args.path} ({len(corpus)} modules, {skipped} skipped), both engines run on the same parsed trees")
+    report = {
+        "tool_version": TOOL_VERSION,
+        "radon_version": radon.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "corpus": {"path": args.path, "modules": len(corpus), "skipped": skipped},
+        "results": compare(corpus, args.metrics, args.repeat, args.show),
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, default=repr)
+
+
+if __name__ == "__main__":
+    main()
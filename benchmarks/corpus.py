@@ -0,0 +1,124 @@
+import os
+import random
+
+class CorpusSpec:
+
+    def __init__(self, files=50, functions=40, statements=12, nesting_depth=3, branch_density=0.3, methods_per_class=5, seed=0):
+        self.files = files
+        self.functions = functions # functions per module, a fifth of them are grouped into classes
+        self.statements = statements # statements per function body
+        self.nesting_depth = nesting_depth
+        self.branch_density = branch_density # probability that a statement opens a branch
+        self.methods_per_class = methods_per_class
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class ModuleGenerator:
+    """
+    Deterministic synthetic Python source: the same spec and seed always give the same text.
+    """
+
+    def __init__(self, spec, seed):
+        self.spec = spec
+        self.random = random.Random(seed)
+        self.lines = []
+
+    def emit(self, depth, text):
+        self.lines.append('    ' * depth + text)
+
+    def expression(self, names):
+        left = self.random.choice(names)
+        right = self.random.choice(names + [str(self.random.randint(0, 99))])
+        op = self.random.choice(('+', '-', '*', '//', '%'))
+        return f"{left} {op} {right}"
+
+    def condition(self, names):
+        compare = f"{self.random.choice(names)} {self.random.choice(('<', '>', '==', '!='))} {self.random.randint(0, 99)}"
+        if self.random.random() < 0.3:
+            compare += f" and {self.random.choice(names)}"
+        return compare
+
+    def block(self, depth, names, statements, nesting):
+        for _ in range(max(statements, 1)):
+            roll = self.random.random()
+            if nesting < self.spec.nesting_depth and roll < self.spec.branch_density:
+                kind = self.random.choice(('if', 'if_else', 'for', 'while', 'try'))
+                inner = max(statements // 3, 1)
+                if kind == 'if':
+                    self.emit(depth, f"if {self.condition(names)}:")
+                    self.block(depth + 1, names, inner, nesting + 1)
+                elif kind == 'if_else':
+                    self.emit(depth, f"if {self.condition(names)}:")
+                    self.block(depth + 1, names, inner, nesting + 1)
+                    self.emit(depth, "else:")
+                    self.block(depth + 1, names, inner, nesting + 1)
+                elif kind == 'for':
+                    self.emit(depth, f"for item in range({self.random.choice(names)}):")
+                    self.block(depth + 1, names + ['item'], inner, nesting + 1)
+                elif kind == 'while':
+                    self.emit(depth, f"while {self.condition(names)}:")
+                    self.block(depth + 1, names, inner, nesting + 1)
+                    self.emit(depth + 1, "break")
+                else:
+                    self.emit(depth, "try:")
+                    self.block(depth + 1, names, inner, nesting + 1)
+                    self.emit(depth, "except ValueError:")
+                    self.emit(depth + 1, "pass")
+            elif roll < 0.75:
+                target = f"v{self.random.randint(0, 9)}"
+                self.emit(depth, f"{target} = {self.expression(names)}")
+                if target not in names:
+                    names = names + [target]
+            else:
+                self.emit(depth, f"print({self.expression(names)})")
+
+    def function(self, depth, name, is_method):
+        params = [f"p{i}" for i in range(self.random.randint(0, 4))]
+        signature = ['self'] + params if is_method else params
+        self.emit(depth, f"def {name}({', '.join(signature)}):")
+        names = params + ['0'] if params else ['0']
+        self.emit(depth + 1, f"v0 = {len(params)}")
+        self.block(depth + 1, names + ['v0'], self.spec.statements, 0)
+        self.emit(depth + 1, "return v0")
+        self.lines.append('')
+
+    def generate(self):
+        spec = self.spec
+        num_methods = spec.functions // 5
+        num_classes = (num_methods + spec.methods_per_class - 1) // spec.methods_per_class if spec.methods_per_class else 0
+
+        self.lines.append("import os")
+        self.lines.append('')
+        for index in range(spec.functions - num_methods):
+            self.function(0, f"function_{index}", False)
+
+        for class_index in range(num_classes):
+            self.emit(0, f"class Generated{class_index}:")
+            self.emit(1, f"limit = {class_index}")
+            self.lines.append('')
+            for method_index in range(min(spec.methods_per_class, num_methods - class_index * spec.methods_per_class)):
+                self.function(1, f"method_{method_index}", True)
+
+        return '\n'.join(self.lines) + '\n'
+
+
+def generate_module(spec, index=0):
+    return ModuleGenerator(spec, spec.seed * 1_000_003 + index).generate()
+
+
+def generate_corpus(spec):
+    return [(f"generated_{index}.py", generate_module(spec, index)) for index in range(spec.files)]
+
+
+def write_corpus(spec, directory):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, source in generate_corpus(spec):
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(source)
+        paths.append(path)
+    return paths
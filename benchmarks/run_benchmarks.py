@@ -0,0 +1,261 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from textwrap import dedent
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from corpus import CorpusSpec, generate_corpus
+from code_metrics.cyclomatic import CyclomaticComplexityVisitor
+from code_metrics.halstead import HalsteadMetricsVisitor
+from code_metrics.trace import VisitTracer
+from code_metrics.records import MetricsTable
+from code_metrics.source import SourceFile, SourceIndex
+from code_metrics.unified import UnifiedMetricsVisitor
+from detectors.detect_long_function import LongFunctionDetector
+from scanner.cache import TOOL_VERSION
+
+
+def all_functions(visitor):
+    functions = list(visitor.functions)
+    for cls in visitor.classes:
+        functions.extend(cls.methods)
+    return functions
+
+def run_cyclomatic(source, tree):
+    visitor = CyclomaticComplexityVisitor()
+    visitor.visit(tree)
+    return len(all_functions(visitor))
+
+def run_halstead(source, tree):
+    visitor = HalsteadMetricsVisitor()
+    visitor.visit(tree)
+    return 0
+
+def run_unified(source, tree):
+    visitor = UnifiedMetricsVisitor()
+    visitor.visit(tree)
+    return len(all_functions(visitor))
+
+def run_long_function(source, tree):
+    visitor = CyclomaticComplexityVisitor()
+    visitor.visit(tree)
+    detector = LongFunctionDetector()
+    detector.check_long_function(all_functions(visitor))
+    return len(detector.long_functions)
+
+def run_parse(source, tree):
+    ast.parse(source)
+    return 0
+
+ANALYSERS = {
+    'parse': run_parse,
+    'cyclomatic': run_cyclomatic,
+    'halstead': run_halstead,
+    'unified': run_unified,
+    'long_function': run_long_function,
+}
+
+
+def load_read(path, tree=None):
+    # How main() loaded modules before, a decoded copy and a dedented, stripped one
+    with open(path, 'r', encoding='utf-8') as file:
+        code = file.read()
+    return len(SourceIndex(dedent(code).strip()))
+
+def load_mmap(path, tree=None):
+    with SourceFile(path, mmap_threshold=0) as source:
+        return len(source.index())
+
+LOADERS = {
+    'read': load_read,
+    'mmap': load_mmap,
+}
+
+
+def run_loading(corpus, repeat):
+    # Loading on its own, parsing is the same for both and would hide the copies in the peak
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for name, source in corpus:
+            paths.append(os.path.join(directory, name))
+            with open(paths[-1], 'w', encoding='utf-8') as file:
+                file.write(source)
+        # The whole corpus as one generated module
+        large = os.path.join(directory, 'generated.py')
+        with open(large, 'w', encoding='utf-8') as file:
+            file.writelines(source for name, source in corpus)
+
+        for files, group in ((paths, 'files'), ([large], 'large_module')):
+            for name, loader in LOADERS.items():
+                elapsed, peak = measure(loader, [(path, path) for path in files], [None] * len(files), repeat)
+                results[f"{group}_{name}"] = {"seconds": elapsed, "peak_memory_bytes": peak}
+                print(f"{'load ' + name:<14} {elapsed:8.3f}s {group:<14} {peak / 1024 / 1024:8.1f} MiB peak")
+    return results
+
+
+def peak_rss():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def measure(analyser, corpus, trees, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for (name, source), tree in zip(corpus, trees):
+            analyser(source, tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Peak memory is measured on a separate run, tracemalloc slows every allocation down
+    tracemalloc.start()
+    for (name, source), tree in zip(corpus, trees):
+        analyser(source, tree)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def trace_halstead(trees, n=10):
+    # One traced pass, kept out of the timed runs since tracing slows every visit down
+    tracer = VisitTracer()
+    for tree in trees:
+        HalsteadMetricsVisitor(tracer).visit(tree)
+
+    rows = tracer.report(n)
+    print(f"{'node type':<14} {'visits':>10} {'total ms':>10} {'self ms':>10}")
+    for node_type, visits, total, own in rows:
+        print(f"{node_type:<14} {visits:>10} {total / 1e6:>10.2f} {own / 1e6:>10.2f}")
+    return [
+        {"node_type": node_type, "visits": visits, "total_ns": total, "self_ns": own}
+        for node_type, visits, total, own in rows
+    ]
+
+
+def synthetic_table(rows, seed):
+    # Metric columns with roughly the spread of real code, filled directly to skip a million records
+    generator = random.Random(seed)
+    table = MetricsTable()
+    spreads = {'mloc': 80, 'complexity': 12, 'num_params': 8, 'num_localvar': 16, 'branches': 8}
+    for column, values in table.columns.items():
+        spread = spreads.get(column)
+        values.extend(generator.randrange(spread) if spread else 0 for _ in range(rows))
+    table.is_method.extend(bytes(rows))
+    table.long_function.extend(bytes(rows))
+    table.name_ids.extend([table.intern('func')] * rows)
+    table.belongs_to_ids.extend([-1] * rows)
+    table.path_ids.extend([-1] * rows)
+    return table
+
+
+def run_rules(rows, seed, repeat):
+    detector = LongFunctionDetector()
+    table = synthetic_table(rows, seed)
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        selected = detector.select(table)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # The same rule checked one record at a time, as check_long_function does
+    records = list(table)
+    start = time.perf_counter()
+    flagged = sum(1 for record in records if detector.is_long_function(record))
+    per_record = time.perf_counter() - start
+    assert flagged == len(selected)
+
+    print(f"{'rules':<14} {best:8.3f}s {rows / best:12.1f} functions/s batched, {per_record:8.3f}s {rows / per_record:12.1f} functions/s per record ({len(selected)} long)")
+    return {
+        "rows": rows,
+        "seconds": best,
+        "functions_per_sec": rows / best,
+        "per_record_seconds": per_record,
+        "selected": len(selected),
+    }
+
+
+def run(spec, analysers, repeat, trace=False, rule_rows=0, loading=False):
+    corpus = generate_corpus(spec)
+    trees = [ast.parse(source) for name, source in corpus]
+    lines = sum(source.count('\n') for name, source in corpus)
+    functions = sum(run_unified(source, tree) for (name, source), tree in zip(corpus, trees))
+
+    results = {}
+    for name in analysers:
+        elapsed, peak = measure(ANALYSERS[name], corpus, trees, repeat)
+        results[name] = {
+            "seconds": elapsed,
+            "files_per_sec": len(corpus) / elapsed,
+            "functions_per_sec": functions / elapsed,
+            "loc_per_sec": lines / elapsed,
+            "peak_memory_bytes": peak,
+        }
+        print(f"{name:<14} {elapsed:8.3f}s {len(corpus) / elapsed:10.1f} files/s {functions / elapsed:12.1f} functions/s {lines / elapsed:12.1f} LOC/s {peak / 1024 / 1024:8.1f} MiB peak")
+
+    report = {
+        "tool_version": TOOL_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "corpus": dict(spec.as_dict(), lines=lines, functions=functions),
+        "results": results,
+    }
+    if trace:
+        report["halstead_trace"] = trace_halstead(trees)
+    if rule_rows:
+        report["rules"] = run_rules(rule_rows, spec.seed, repeat)
+    if loading:
+        report["loading"] = run_loading(corpus, repeat)
+    report["peak_rss_bytes"] = peak_rss()
+    print(f"Peak RSS: {report['peak_rss_bytes'] / 1024 / 1024:.1f} MiB")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the metric visitors and detectors on a synthetic corpus.")
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--functions', type=int, default=40, help="Functions per module")
+    parser.add_argument('--statements', type=int, default=12, help="Statements per function body")
+    parser.add_argument('--nesting-depth', type=int, default=3)
+    parser.add_argument('--branch-density', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per analyser, the fastest is reported")
+    parser.add_argument('--analysers', nargs='+', choices=sorted(ANALYSERS), default=list(ANALYSERS))
+    parser.add_argument('--rule-rows', type=int, default=0, help="Also time the long function rule on a synthetic metrics table of this many functions, e.g. 1000000")
+    parser.add_argument('--load', action='store_true', help="Also compare reading modules into strings with memory-mapping them, per file and as one large module")
+    parser.add_argument('--trace', action='store_true', help="Also print where the Halstead visitor spends its time per node type")
+    parser.add_argument('--output', default='bench_output.json', help="Machine-readable results, compare these between versions")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    spec = CorpusSpec(
+        files=args.files,
+        functions=args.functions,
+        statements=args.statements,
+        nesting_depth=args.nesting_depth,
+        branch_density=args.branch_density,
+        seed=args.seed
+    )
+    report = run(spec, args.analysers, args.repeat, args.trace, args.rule_rows, args.load)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
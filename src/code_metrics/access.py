@@ -0,0 +1,69 @@
+from collections import Counter
+
+class AccessProfile:
+    """
+    Attribute accesses of one function or method, gathered while its metrics are computed.
+    Method calls are left out, only data accesses are counted.
+    """
+
+    __slots__ = ('own', 'assigned', 'foreign')
+
+    def __init__(self):
+        self.own = Counter() # attribute -> accesses through self
+        self.assigned = set() # attributes assigned through self
+        self.foreign = Counter() # (receiver, attribute) -> accesses through any other object
+
+    def own_total(self):
+        return sum(self.own.values())
+
+    def foreign_total(self):
+        return sum(self.foreign.values())
+
+    def foreign_receivers(self):
+        receivers = Counter()
+        for (receiver, attribute), count in self.foreign.items():
+            receivers[receiver] += count
+        return receivers
+
+    def __repr__(self):
+        return f"AccessProfile(own={dict(self.own)}, foreign={dict(self.foreign)})"
+
+
+def cohesion(profiles):
+    # Tight class cohesion (share of method pairs using a common attribute) and LCOM (disjoint pairs minus connected pairs)
+    # Every attribute gets a bitmask of the methods using it, a method is connected to the union of the masks of its
+    # attributes, so the cost grows with the attribute accesses instead of the number of method pairs
+    users = {}
+    for index, profile in enumerate(profiles):
+        for attribute in profile.own:
+            users[attribute] = users.get(attribute, 0) | 1 << index
+
+    pairs = len(profiles) * (len(profiles) - 1) // 2
+    if not pairs:
+        return 1.0, 0
+
+    reach = [0] * len(profiles)
+    for mask in users.values():
+        remaining = mask
+        while remaining:
+            lowest = remaining & -remaining
+            reach[lowest.bit_length() - 1] |= mask
+            remaining ^= lowest
+    # Each connected pair is seen from both of its methods, every method reaches itself
+    connected = sum(max(methods.bit_count() - 1, 0) for methods in reach) // 2
+
+    return connected / pairs, max((pairs - connected) - connected, 0)
+
+
+def class_design_metrics(cls):
+    # (attributes, foreign data accessed, tight class cohesion, lack of cohesion) for a Class
+    profiles = [method.access for method in cls.methods if method.access is not None]
+
+    attributes = set(cls.attributes)
+    foreign = set()
+    for profile in profiles:
+        attributes.update(profile.assigned)
+        foreign.update(profile.foreign)
+
+    tcc, lcom = cohesion(profiles)
+    return len(attributes), len(foreign), tcc, lcom
@@ -0,0 +1,130 @@
+import ast
+import os
+from collections import OrderedDict
+from code_metrics.source import PARSE_ERRORS
+from scanner.cache import content_hash
+
+# Parsed trees take about 30 bytes of memory per byte of source (median over the standard library)
+AST_BYTES_PER_SOURCE_BYTE = 30
+
+class CachedTree:
+
+    __slots__ = ('path', 'mtime_ns', 'size', 'digest', 'source', 'parsed', 'nbytes')
+
+    def __init__(self, path, mtime_ns, size, digest, source):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+        self.source = source # bytes the tree is parsed from
+        self.parsed = None # the tree, or the error parsing raised
+        self.nbytes = len(source) * (AST_BYTES_PER_SOURCE_BYTE + 1)
+
+    @property
+    def tree(self):
+        # Parsed on first use, analyses that skip unchanged files by digest never pay for it
+        if self.parsed is None:
+            try:
+                self.parsed = ast.parse(self.source, filename=self.path)
+            except PARSE_ERRORS as error:
+                self.parsed = error
+        if isinstance(self.parsed, Exception):
+            raise self.parsed
+        return self.parsed
+
+
+class ASTCache:
+    """
+    One read and at most one parse per file for every analyser in a process. Entries are keyed by
+    path and checked against the file's mtime and size, a changed stat falls back to the content
+    hash so a touched but unchanged file keeps its tree. Trees are parsed the first time one is
+    asked for. Least recently used entries are dropped once their estimated memory exceeds max_bytes.
+
+    The cache lives in one process, files analysed by worker processes are read and parsed there
+    and never enter it. Trees are shared, callers that transform one must work on a copy.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # path -> CachedTree, least recently used first
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path):
+        # Returns the parsed CachedTree of path. OSError and SyntaxError propagate, files that do not parse are dropped.
+        entry = self.read(path)
+        try:
+            entry.tree
+        except PARSE_ERRORS:
+            self.discard(path)
+            raise
+        return entry
+
+    def read(self, path):
+        # Returns the CachedTree of path without parsing it, reading the file only when it changed. OSError propagates.
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+        with open(path, 'rb') as file:
+            source = file.read()
+        return self.add(path, source, stat.st_mtime_ns, len(source))
+
+    def parse(self, path):
+        return self.get(path).tree
+
+    def add(self, path, source, mtime_ns=None, size=None, digest=None):
+        digest = digest or content_hash(source)
+        entry = self.entries.get(path)
+        if entry is not None and entry.digest == digest:
+            entry.mtime_ns, entry.size = mtime_ns, size
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        self.discard(path)
+        entry = CachedTree(path, mtime_ns, size, digest, source)
+        self.entries[path] = entry
+        self.nbytes += entry.nbytes
+        self.evict()
+        return entry
+
+    def discard(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+
+    def evict(self):
+        # The most recent entry is kept even when it alone is over the budget
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            path, entry = self.entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,85 @@
+import operator
+from array import array
+
+# NumPy is optional and only imported once a column of VECTOR_MIN_ROWS rows is evaluated, importing
+# it takes longer than scanning a few files. Shorter columns, and installs without it, run the same
+# operations as plain loops over the array columns
+VECTOR_MIN_ROWS = 2048
+np = None
+numpy_missing = False
+
+def vectorised(rows):
+    # The numpy module for columns of this many rows, None for the plain loops
+    global np, numpy_missing
+    if rows < VECTOR_MIN_ROWS or numpy_missing:
+        return None
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            numpy_missing = True
+    return np
+
+COMPARISONS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+def as_vector(column, np=None):
+    # Zero-copy view of an array.array column
+    if np is not None:
+        return np.frombuffer(column, dtype=column.typecode) if len(column) else np.zeros(0, dtype=column.typecode)
+    return column
+
+def compare(column, op, threshold):
+    try:
+        comparison = COMPARISONS[op]
+    except KeyError:
+        raise ValueError(f"Unknown comparison '{op}'") from None
+    np = vectorised(len(column))
+    values = as_vector(column, np)
+    if np is not None:
+        return comparison(values, threshold)
+    return [comparison(value, threshold) for value in values]
+
+def logical_and(*masks):
+    np = vectorised(len(masks[0]))
+    if np is not None:
+        return np.logical_and.reduce(masks) if len(masks) > 1 else masks[0]
+    return [all(values) for values in zip(*masks)]
+
+def logical_or(*masks):
+    np = vectorised(len(masks[0]))
+    if np is not None:
+        return np.logical_or.reduce(masks) if len(masks) > 1 else masks[0]
+    return [any(values) for values in zip(*masks)]
+
+def nonzero(mask):
+    # Row indices where the mask holds
+    np = vectorised(len(mask))
+    if np is not None:
+        return array('l', np.flatnonzero(mask).tolist())
+    return array('l', (index for index, value in enumerate(mask) if value))
+
+def group_sum(values, groups, size):
+    # Sum of values per group id, like a SQL GROUP BY over two parallel columns
+    np = vectorised(len(groups))
+    if np is not None:
+        return np.bincount(as_vector(groups, np), weights=as_vector(values, np), minlength=size)
+    totals = [0] * size
+    for group, value in zip(groups, values):
+        totals[group] += value
+    return totals
+
+def group_count(groups, size):
+    np = vectorised(len(groups))
+    if np is not None:
+        return np.bincount(as_vector(groups, np), minlength=size)
+    counts = [0] * size
+    for group in groups:
+        counts[group] += 1
+    return counts
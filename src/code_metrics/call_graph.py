@@ -0,0 +1,481 @@
+import ast
+import contextlib
+import os
+import pickle
+from array import array
+from code_metrics.source import PARSE_ERRORS
+from scanner.cache import TOOL_VERSION, content_hash
+
+AMBIGUOUS = -1
+
+def module_name(path, root='.'):
+    # Dotted module of path relative to root, a package is named after its directory
+    relative = os.path.splitext(os.path.relpath(path, root))[0]
+    parts = [part for part in relative.split(os.sep) if part not in ('', '.')]
+    if parts and parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+class FileCalls:
+
+    def __init__(self, path, digest, module, functions, calls, imports):
+        self.path = path
+        self.digest = digest
+        self.module = module
+        self.functions = functions # (qualname, start_lineno, end_lineno) of every function and method
+        self.calls = calls # (caller qualname, callee qualname as written, resolved within the file)
+        self.imports = imports # module level alias -> qualified name it stands for
+
+    def signature(self):
+        # What the graph is built from, a body edit that keeps it leaves the graph valid
+        return (self.module, [name for name, start, end in self.functions], sorted(set(self.calls)), sorted(self.imports.items()))
+
+
+class CallCollector(ast.NodeVisitor):
+    """
+    Functions of one module and the calls they make, with callee names qualified as far as the
+    module itself can tell: local and module level definitions, imported names and modules,
+    and methods called on self or cls. Calls outside any function are not collected.
+    """
+
+    def __init__(self, path, module, is_package=False):
+        self.path = path
+        self.module = module
+        self.is_package = is_package
+        self.functions = []
+        self.calls = []
+        self.imports = {}
+        self.scopes = [] # (kind, qualname, {local definition: qualname}, self name)
+
+    def resolve_import(self, node: ast.ImportFrom):
+        if not node.level:
+            return node.module
+        parts = self.module.split('.') if self.module else []
+        if not self.is_package:
+            parts = parts[:-1]
+        parts = parts[:len(parts) - (node.level - 1)] if node.level > 1 else parts
+        return '.'.join(parts + ([node.module] if node.module else []))
+
+    def definitions(self, body, prefix):
+        return {
+            child.name: f"{prefix}.{child.name}"
+            for child in body
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        }
+
+    def visit_Module(self, node: ast.Module):
+        self.module_definitions = self.definitions(node.body, self.module)
+        self.generic_visit(node)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            if alias.asname:
+                self.imports[alias.asname] = alias.name
+            else:
+                top = alias.name.split('.')[0]
+                self.imports[top] = top
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        base = self.resolve_import(node)
+        for alias in node.names:
+            if alias.name != '*':
+                self.imports[alias.asname or alias.name] = f"{base}.{alias.name}" if base else alias.name
+
+    def enclosing(self):
+        return self.scopes[-1][1] if self.scopes else self.module
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        qualname = f"{self.enclosing()}.{node.name}"
+        self.functions.append((qualname, node.lineno, node.end_lineno))
+
+        self_name = None
+        if self.scopes and self.scopes[-1][0] == 'class' and node.args.args:
+            if not any(isinstance(decorator, ast.Name) and decorator.id == 'staticmethod' for decorator in node.decorator_list):
+                self_name = node.args.args[0].arg
+        elif self.scopes and self.scopes[-1][0] == 'function':
+            # Closures of a method still see its self
+            self_name = self.scopes[-1][3]
+
+        for child in node.decorator_list + node.args.defaults + node.args.kw_defaults:
+            if child is not None:
+                self.visit(child)
+        self.scopes.append(('function', qualname, self.definitions(node.body, qualname), self_name))
+        for child in node.body:
+            self.visit(child)
+        self.scopes.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        qualname = f"{self.enclosing()}.{node.name}"
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+        self.scopes.append(('class', qualname, {}, None))
+        for child in node.body:
+            self.visit(child)
+        self.scopes.pop()
+
+    def resolve_name(self, name):
+        # Class bodies are not visible from the functions inside them
+        for kind, qualname, definitions, self_name in reversed(self.scopes):
+            if name in definitions:
+                return definitions[name]
+        if name in self.module_definitions:
+            return self.module_definitions[name]
+        return self.imports.get(name)
+
+    def enclosing_class(self):
+        for kind, scope_qualname, definitions, self_name in reversed(self.scopes):
+            if kind == 'class':
+                return scope_qualname
+        return None
+
+    def resolve_callee(self, func):
+        if isinstance(func, ast.Name):
+            return self.resolve_name(func.id)
+        if not isinstance(func, ast.Attribute):
+            return None
+
+        attrs = []
+        value = func
+        while isinstance(value, ast.Attribute):
+            attrs.append(value.attr)
+            value = value.value
+        if not isinstance(value, ast.Name):
+            return None
+        attrs.reverse()
+
+        self_name = self.scopes[-1][3] if self.scopes else None
+        if value.id == self_name and len(attrs) == 1:
+            cls = self.enclosing_class()
+            return f"{cls}.{attrs[0]}" if cls else None
+        base = self.resolve_name(value.id)
+        return '.'.join([base] + attrs) if base else None
+
+    def visit_Call(self, node: ast.Call):
+        if self.scopes and self.scopes[-1][0] == 'function':
+            callee = self.resolve_callee(node.func)
+            if callee is not None:
+                self.calls.append((self.scopes[-1][1], callee))
+        self.generic_visit(node)
+
+
+class CallGraph:
+    """
+    Repository-wide call graph. Every file contributes its functions and calls, a changed file
+    only replaces its own contribution, and a change that leaves them alone only moves line spans.
+    The graph is held as compressed adjacency arrays, callees of node i are
+    targets[offsets[i]:offsets[i + 1]], and fan-in, fan-out, strongly connected components and the
+    number of functions each one transitively affects are computed by build().
+
+    The graph itself is not updated incrementally: a single changed call or definition, in any
+    file, drops it and the next build() recomputes everything from the per-file data. Only that
+    per-file data is saved, a loaded graph is always built from scratch.
+    """
+
+    def __init__(self, root='.'):
+        self.root = root
+        self.files = {}
+        self.built = False
+
+    def update_file(self, path, source, tree=None, digest=None):
+        digest = digest or content_hash(source.encode('utf-8') if isinstance(source, str) else source)
+        current = self.files.get(path)
+        if current is not None and current.digest == digest:
+            return False
+
+        try:
+            node = tree if tree is not None else ast.parse(source)
+        except PARSE_ERRORS:
+            node = None
+
+        collector = CallCollector(path, module_name(path, self.root), os.path.basename(path) == '__init__.py')
+        if node is not None:
+            collector.visit(node)
+
+        calls = FileCalls(path, digest, collector.module, collector.functions, collector.calls, collector.imports)
+        if current is None or current.signature() != calls.signature():
+            self.built = False
+        elif self.built:
+            # Same graph, only the line spans of the file's functions may have moved
+            for qualname, start_lineno, end_lineno in calls.functions:
+                node = self.ids[qualname]
+                if self.paths[node] == path:
+                    self.lines[2 * node] = start_lineno
+                    self.lines[2 * node + 1] = end_lineno
+        self.files[path] = calls
+        return True
+
+    def remove_file(self, path):
+        if self.files.pop(path, None) is not None:
+            self.built = False
+
+    def build(self):
+        if self.built:
+            return self
+
+        self.names = [] # node id -> qualified name
+        self.paths = []
+        self.lines = array('l') # start, end line of every node
+        self.ids = {}
+        for calls in self.files.values():
+            for qualname, start_lineno, end_lineno in calls.functions:
+                if qualname in self.ids:
+                    continue
+                self.ids[qualname] = len(self.names)
+                self.names.append(qualname)
+                self.paths.append(calls.path)
+                self.lines.extend((start_lineno, end_lineno))
+
+        # Names re-exported by a module, e.g. from .mod import func in a package __init__
+        self.aliases = {}
+        for calls in self.files.values():
+            for alias, target in calls.imports.items():
+                self.aliases[f"{calls.module}.{alias}" if calls.module else alias] = target
+
+        # The same module may be imported relative to a different root, e.g. with a src/ layout
+        self.suffixes = {}
+        for calls in self.files.values():
+            parts = calls.module.split('.')
+            for qualname, start_lineno, end_lineno in calls.functions:
+                for index in range(1, len(parts)):
+                    suffix = qualname.split('.', index)[index]
+                    other = self.suffixes.get(suffix)
+                    self.suffixes[suffix] = self.ids[qualname] if other in (None, self.ids[qualname]) else AMBIGUOUS
+
+        edges = set()
+        for calls in self.files.values():
+            for caller, callee in calls.calls:
+                target = self.resolve(callee)
+                source = self.ids.get(caller)
+                if target is not None and source is not None and target != source:
+                    edges.add((source, target))
+
+        self.offsets, self.targets = self.adjacency(sorted(edges))
+        self.reverse_offsets, self.sources = self.adjacency(sorted((target, source) for source, target in edges))
+        self.components = self.strongly_connected_components()
+        self.impacts = self.transitive_impacts()
+        self.built = True
+        return self
+
+    def resolve(self, qualname, hops=8):
+        # Node id of the function a qualified callee name refers to, a called class means its __init__
+        for _ in range(hops):
+            for candidate in (qualname, f"{qualname}.__init__"):
+                node = self.ids.get(candidate)
+                if node is None:
+                    node = self.suffixes.get(candidate)
+                if node is not None and node != AMBIGUOUS:
+                    return node
+            # Follow re-exports, the longest imported prefix first
+            parts = qualname.split('.')
+            for index in range(len(parts), 0, -1):
+                target = self.aliases.get('.'.join(parts[:index]))
+                if target is not None and target != '.'.join(parts[:index]):
+                    qualname = '.'.join([target] + parts[index:])
+                    break
+            else:
+                return None
+        return None
+
+    def adjacency(self, edges):
+        offsets = array('l', bytes(array('l').itemsize * (len(self.names) + 1)))
+        targets = array('l', (target for source, target in edges))
+        for source, target in edges:
+            offsets[source + 1] += 1
+        for index in range(len(self.names)):
+            offsets[index + 1] += offsets[index]
+        return offsets, targets
+
+    def callee_ids(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def caller_ids(self, node):
+        return self.sources[self.reverse_offsets[node]:self.reverse_offsets[node + 1]]
+
+    def strongly_connected_components(self):
+        # Iterative Tarjan, component id of every node, components numbered callees first
+        count = len(self.names)
+        index = array('l', [-1]) * count
+        lowlink = array('l', [0]) * count
+        component = array('l', [-1]) * count
+        on_stack = bytearray(count)
+        stack = []
+        next_index = 0
+        next_component = 0
+
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            work = [(root, self.offsets[root])]
+            index[root] = lowlink[root] = next_index
+            next_index += 1
+            stack.append(root)
+            on_stack[root] = 1
+            while work:
+                node, edge = work[-1]
+                if edge < self.offsets[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    target = self.targets[edge]
+                    if index[target] == -1:
+                        index[target] = lowlink[target] = next_index
+                        next_index += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, self.offsets[target]))
+                    elif on_stack[target]:
+                        lowlink[node] = min(lowlink[node], index[target])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component[member] = next_component
+                        if member == node:
+                            break
+                    next_component += 1
+        return component
+
+    def transitive_impacts(self):
+        # Functions that reach each node through calls, as bit sets. Components are numbered callees
+        # first, so from the highest number down every caller is done before its callees. Bits are
+        # numbered in that order too, a node's set never needs more bits than nodes before it, and a
+        # set is dropped once all the components it calls have taken it over.
+        count = len(self.names)
+        components = self.components
+        order = sorted(range(count), key=lambda node: -components[node])
+        rank = array('l', [0]) * count
+        for position, node in enumerate(order):
+            rank[node] = position
+
+        pending = array('l', [0]) * (max(components) + 1 if count else 0)
+        for node in range(count):
+            for callee in self.callee_ids(node):
+                if components[callee] != components[node]:
+                    pending[components[node]] += 1
+
+        reached = {}
+        impacts = array('l', [0]) * count
+        start = 0
+        while start < count:
+            component = components[order[start]]
+            end = start
+            while end < count and components[order[end]] == component:
+                end += 1
+            group = order[start:end]
+
+            bits = 0
+            for node in group:
+                bits |= 1 << rank[node]
+                for caller in self.caller_ids(node):
+                    caller_component = components[caller]
+                    if caller_component != component:
+                        bits |= reached[caller_component]
+                        pending[caller_component] -= 1
+                        if not pending[caller_component]:
+                            del reached[caller_component]
+            for node in group:
+                impacts[node] = (bits & ~(1 << rank[node])).bit_count()
+            if pending[component]:
+                reached[component] = bits
+            start = end
+        return impacts
+
+    def node(self, qualname):
+        self.build()
+        return self.ids[qualname]
+
+    def fan_in(self, qualname):
+        node = self.node(qualname)
+        return self.reverse_offsets[node + 1] - self.reverse_offsets[node]
+
+    def fan_out(self, qualname):
+        node = self.node(qualname)
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def callers(self, qualname):
+        return [self.names[caller] for caller in self.caller_ids(self.node(qualname))]
+
+    def callees(self, qualname):
+        return [self.names[callee] for callee in self.callee_ids(self.node(qualname))]
+
+    def impact(self, qualname):
+        # Functions that may behave differently when qualname changes
+        return self.impacts[self.node(qualname)]
+
+    def cycle(self, qualname):
+        # The other functions qualname is mutually recursive with
+        node = self.node(qualname)
+        component = self.components[node]
+        return [self.names[other] for other in range(len(self.names)) if other != node and self.components[other] == component]
+
+    def cycles(self):
+        self.build()
+        groups = {}
+        for node, component in enumerate(self.components):
+            groups.setdefault(component, []).append(self.names[node])
+        return [sorted(names) for names in groups.values() if len(names) > 1]
+
+    def function_metrics(self, path):
+        # {name within the module: (fan_in, fan_out, impact)} for the functions of path, named as Function.get_name()
+        self.build()
+        calls = self.files.get(path)
+        if calls is None:
+            return {}
+        metrics = {}
+        prefix = f"{calls.module}." if calls.module else ""
+        for qualname, start_lineno, end_lineno in calls.functions:
+            node = self.ids[qualname]
+            if self.paths[node] == path:
+                metrics[qualname[len(prefix):]] = (
+                    self.reverse_offsets[node + 1] - self.reverse_offsets[node],
+                    self.offsets[node + 1] - self.offsets[node],
+                    self.impacts[node]
+                )
+        return metrics
+
+    def iter_metrics(self):
+        self.build()
+        for node, qualname in enumerate(self.names):
+            yield {
+                "name": qualname,
+                "path": self.paths[node],
+                "start_lineno": self.lines[2 * node],
+                "end_lineno": self.lines[2 * node + 1],
+                "fan_in": self.reverse_offsets[node + 1] - self.reverse_offsets[node],
+                "fan_out": self.offsets[node + 1] - self.offsets[node],
+                "impact": self.impacts[node],
+            }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as file:
+            pickle.dump((TOOL_VERSION, self.root, self.files), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, root='.'):
+        # A graph saved by another version, or one that does not load, is deleted and rebuilt from scratch
+        graph = cls(root)
+        try:
+            with open(path, 'rb') as file:
+                version, saved_root, files = pickle.load(file)
+            if version != TOOL_VERSION:
+                raise ValueError(f"call graph saved by version {version}")
+            if not all(isinstance(calls, FileCalls) and calls.path == file_path for file_path, calls in files.items()):
+                raise ValueError("call graph holds something other than FileCalls")
+        except FileNotFoundError:
+            return graph
+        except Exception:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return graph
+        # Module names depend on the root the files were named against
+        if saved_root == root:
+            graph.files = files
+        return graph
@@ -1,12 +1,14 @@
 class Class:
 
-    def __init__(self, name, start_lineno, end_lineno, methods, complexity,mloc):
+    def __init__(self, name, start_lineno, end_lineno, methods, complexity,mloc, attributes=None, halstead=None):
         self.name = name
         self.start_lineno = start_lineno
         self.end_lineno = end_lineno
         self.methods = methods
         self.complexity = complexity
         self.mloc = mloc
+        self.attributes = attributes if attributes is not None else set() # names assigned in the class body
+        self.halstead = halstead # HalsteadMetrics of the class body and its methods, when collected
 
     def avg_method_complexity(self):
         return sum(methd.complexity for methd in self.methods) / len(self.methods)
@@ -1,10 +1,15 @@
 import ast
 from code_metrics.func import Function
 from code_metrics.cls import Class
-    
-class CyclomaticComplexityVisitor(ast.NodeVisitor):
+from code_metrics.source import SourceIndex
+from code_metrics.visitor import DispatchVisitor
+
+class CyclomaticComplexityVisitor(DispatchVisitor):
+
+    # Function and class bodies are visited by visitors of their own
+    leaves = frozenset((ast.Assert, ast.FunctionDef, ast.ClassDef))
 
-    def __init__(self, starting_complexity = 1, func_to_method=False, classname=None, location =0, source_code=""):
+    def __init__(self, starting_complexity = 1, func_to_method=False, classname=None, location =0, source_code="", source_index=None):
         self.cyclomatic_complexity = starting_complexity
         self.functions = []
         self.classes = []
@@ -12,6 +17,7 @@ class CyclomaticComplexityVisitor(ast.NodeVisitor):
         self.classname = classname
         self.location = location
         self.source_code = source_code
+        self.source_index = source_index
         self.num_localvar = set()
         self.branches = 0
         self.mloc = set()
@@ -26,6 +32,12 @@ class CyclomaticComplexityVisitor(ast.NodeVisitor):
         if lineno > self.location:
             self.location = lineno
 
+    def get_source_index(self):
+        # Built once per module and shared with child visitors, source_code may be assigned after __init__
+        if self.source_index is None or self.source_index.source is not self.source_code:
+            self.source_index = SourceIndex(self.source_code)
+        return self.source_index
+
     def function_complexity(self):
         if not self.functions:
             return 0
@@ -51,52 +63,59 @@ class CyclomaticComplexityVisitor(ast.NodeVisitor):
 
         return module_loc + function_loc + class_loc
 
-    def generic_visit(self, node: ast.AST):
-
-        if isinstance(node, (
-            ast.Return, ast.Delete, ast.Assign, ast.AugAssign, ast.AnnAssign,
-            ast.For, ast.AsyncFor, ast.While, ast.If, ast.With, ast.AsyncWith,
-            ast.Raise, ast.Try, ast.Assert, ast.Import, ast.ImportFrom,
-            ast.Global, ast.Nonlocal, ast.Expr, ast.Pass, ast.Break, ast.Continue,
-            ast.Match
-        )):
-            lineno = getattr(node, 'lineno', None)
-            if lineno is not None:
-                self.mloc.add(lineno)
-        
+    # Every handler does all the work for its node type, children are pushed by DispatchVisitor.visit
+
+    def count_line(self, node: ast.stmt):
+        self.mloc.add(node.lineno)
+
+    visit_Return = visit_Delete = visit_AnnAssign = visit_With = visit_AsyncWith = count_line
+    visit_Raise = visit_Import = visit_ImportFrom = visit_Global = visit_Nonlocal = count_line
+    visit_Expr = visit_Pass = visit_Break = visit_Continue = visit_AugAssign = count_line
+
+    def visit_Try(self, node: ast.Try):
         # For AST node, 'try' blocks are characterised with handlers (except) and orelse (else)
-        if isinstance(node, (ast.Try)):
-            self.cyclomatic_complexity += len(node.handlers) + bool(node.orelse)
+        self.mloc.add(node.lineno)
+        self.cyclomatic_complexity += len(node.handlers) + bool(node.orelse)
+
+    def visit_If(self, node: ast.If):
         # For AST node, 'if' can be counted each time as it appears with orelse as well as the start of the conditional block
-        elif isinstance(node, (ast.If, ast.IfExp)):
-            self.cyclomatic_complexity += 1
-            self.branches += 1
-            
-            if isinstance(node.orelse, list) and len(node.orelse) >= 1 and hasattr(node.orelse[0], 'lineno') and not isinstance(node.orelse[0], ast.If):
-                self.mloc.add(node.orelse[0].lineno - 1)
+        self.mloc.add(node.lineno)
+        self.cyclomatic_complexity += 1
+        self.branches += 1
+        if node.orelse and hasattr(node.orelse[0], 'lineno') and not isinstance(node.orelse[0], ast.If):
+            self.mloc.add(node.orelse[0].lineno - 1)
 
+    def visit_IfExp(self, node: ast.IfExp):
+        self.cyclomatic_complexity += 1
+        self.branches += 1
+
+    def visit_BoolOp(self, node: ast.BoolOp):
         # Count each of the values for a 'BoolOp' node as a decision point, default path is not counted therefore - 1
-        elif isinstance(node, (ast.BoolOp)):
-            self.cyclomatic_complexity += len(node.values) - 1
+        self.cyclomatic_complexity += len(node.values) - 1
+
+    def visit_For(self, node: ast.For):
         # For AST node, 'for', 'while' and 'AsyncFor' are counted as decision points, these could contain orelse so this is counted
-        # also if it exists 
-        elif isinstance(node, (ast.For, ast.While, ast.AsyncFor)):
-            self.cyclomatic_complexity += bool(node.orelse) + 1
+        # also if it exists
+        self.mloc.add(node.lineno)
+        self.cyclomatic_complexity += bool(node.orelse) + 1
+
+    visit_While = visit_AsyncFor = visit_For
+
+    def visit_comprehension(self, node: ast.comprehension):
         # For AST node, 'comprehension' nodes count the number of 'ifs' or test expressions + 1
-        elif isinstance(node, (ast.comprehension)):
-            self.cyclomatic_complexity += len(node.ifs) + 1
-        # For AST node, 'match' is counted as a decision point, this could contain orelse so this is counted, underscore/wildcard cases are considered
-        # as 'else' so are not counted
-        elif isinstance(node, (ast.Match)):
-            wildcard_cases = sum(1 for case in node.cases if isinstance(case.__getattribute__('pattern'), ast.MatchAs) and case.pattern is None)
-            self.cyclomatic_complexity += (len(node.cases) - wildcard_cases) if (len(node.cases) - wildcard_cases) > 0 else 0
-            
-        super().generic_visit(node)
+        self.cyclomatic_complexity += len(node.ifs) + 1
+
+    def visit_Match(self, node: ast.Match):
+        # For AST node, 'match' is counted as a decision point for every case
+        self.mloc.add(node.lineno)
+        self.cyclomatic_complexity += len(node.cases)
 
     def visit_Assert(self, node: ast.Assert):
+        # Neither the line nor the children of an assert are counted
         self.cyclomatic_complexity += 1
 
     def visit_Assign(self, node: ast.Assign):
+        self.mloc.add(node.lineno)
         for target in node.targets:
             if isinstance(target, ast.Name):
                 self.num_localvar.add(target.id)
@@ -105,8 +124,6 @@ class CyclomaticComplexityVisitor(ast.NodeVisitor):
                     if isinstance(elt, ast.Name):
                         self.num_localvar.add(elt.id)
 
-        self.generic_visit(node)
-
     def visit_FunctionDef(self, node: ast.FunctionDef):
 
         function_closures = []
@@ -121,11 +138,16 @@ class CyclomaticComplexityVisitor(ast.NodeVisitor):
         if hasattr(node, 'lineno'):
             func_loc.add(node.lineno)
 
-        cyclomatic_visitor = CyclomaticComplexityVisitor(starting_complexity=0)
+        source_index = self.get_source_index() if self.source_code else None
 
         for child in node.body:
 
             # Careful not double count the +1 complexity for the function itself, set the starting complexity to 0
+            cyclomatic_visitor = CyclomaticComplexityVisitor(
+                starting_complexity=0,
+                source_code=self.source_code,
+                source_index=source_index
+            )
             cyclomatic_visitor.visit(child)
             function_closures.extend(cyclomatic_visitor.functions)
             function_complexity += cyclomatic_visitor.cyclomatic_complexity
@@ -137,11 +159,11 @@ class CyclomaticComplexityVisitor(ast.NodeVisitor):
                 if localvar not in params:
                     num_localvar.add(localvar)
 
-        func_loc.update(cyclomatic_visitor.mloc)
+            func_loc.update(cyclomatic_visitor.mloc)
 
         func = Function(
             node.name,
-            ast.get_source_segment(self.source_code, node) if self.source_code else "",
+            source_index.segment(node) if source_index else "",
             node.lineno,
             node.end_lineno if hasattr(node, 'end_lineno') else self.get_location(),
             self.func_to_method,
@@ -166,12 +188,16 @@ class CyclomaticComplexityVisitor(ast.NodeVisitor):
         if lineno is not None:
             cls_loc.add(lineno)
 
+        source_index = self.get_source_index() if self.source_code else None
+
         for child in node.body:
             
             cyclomatic_visitor = CyclomaticComplexityVisitor(
                 starting_complexity=0, 
                 func_to_method=True,
-                classname=class_name
+                classname=class_name,
+                source_code=self.source_code,
+                source_index=source_index
             )
             cyclomatic_visitor.visit(child)
 
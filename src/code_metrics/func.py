@@ -1,6 +1,8 @@
+from code_metrics.halstead import maintainability_index
+
 class Function:
     
-    def __init__(self, name, body, start_lineno, end_lineno, is_method, belongs_to, closures, complexity, mloc, num_params, num_localvar, branches, long_function=False):
+    def __init__(self, name, body, start_lineno, end_lineno, is_method, belongs_to, closures, complexity, mloc, num_params, num_localvar, branches, long_function=False, access=None, halstead=None):
         self.name = name
         self.body = body
         self.start_lineno = start_lineno
@@ -10,10 +12,12 @@ class Function:
         self.closures = closures
         self.complexity = complexity
         self.mloc = mloc # Lines of code within a function/method (excluding comments and empty lines)
+        self.halstead = halstead # HalsteadMetrics of the body, when collected
         self.num_params = num_params # Number of function parameters
         self.num_localvar = num_localvar # Number of local variables in the function/method
         self.branches = branches # Number of branches in the function/method (e.g., if, for, while, match)
         self.long_function = long_function
+        self.access = access # AccessProfile of attribute accesses, when collected
 
     def get_name(self):
 
@@ -21,6 +25,11 @@ class Function:
             return self.name
         else:
             return f"{self.belongs_to}.{self.name}"
+
+    def maintainability_index(self):
+        if self.halstead is None:
+            return None
+        return maintainability_index(self.halstead.volume(), self.complexity, self.mloc)
         
     def __str__(self):
         return (f"""
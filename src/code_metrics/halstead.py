@@ -1,57 +1,119 @@
 import ast
 import math
+from code_metrics.trace import VisitTracer
+from code_metrics.visitor import DispatchVisitor
 
-class HalsteadMetricsVisitor(ast.NodeVisitor):
+def maintainability_index(volume, complexity, loc):
+    # Normalised to 0-100 as in radon and Visual Studio, without the comment term
+    index = 171 - 5.2 * math.log(max(volume, 1)) - 0.23 * complexity - 16.2 * math.log(max(loc, 1))
+    return max(0.0, index * 100 / 171)
 
-    def __init__(self):
+
+class HalsteadMetrics:
+    """
+    Operator and operand tallies of one scope and the measures derived from them. Only the four
+    counts are kept, so a record stays small and the derived values are computed on demand.
+    """
+
+    __slots__ = ('operators', 'operands', 'unique_operators', 'unique_operands')
+
+    def __init__(self, operators, operands, unique_operators, unique_operands):
+        self.operators = operators # N1
+        self.operands = operands # N2
+        self.unique_operators = unique_operators # n1
+        self.unique_operands = unique_operands # n2
+
+    def vocabulary(self):
+        return self.unique_operators + self.unique_operands
+
+    def length(self):
+        return self.operators + self.operands
+
+    def estimated_length(self):
+        n1, n2 = self.unique_operators, self.unique_operands
+        return (n1 * math.log2(n1) if n1 else 0) + (n2 * math.log2(n2) if n2 else 0)
+
+    def volume(self):
+        vocabulary = self.vocabulary()
+        return self.length() * math.log2(vocabulary) if vocabulary else 0
+
+    def difficulty(self):
+        if self.unique_operators == 0 or self.unique_operands == 0:
+            return 0
+        return (self.unique_operators / 2) * (self.operands / self.unique_operands)
+
+    def effort(self):
+        return self.difficulty() * self.volume()
+
+    def time_to_program(self):
+        return self.effort() / 18 #in seconds
+
+    def bugs(self):
+        return (self.effort() ** (2/3)) / 3000
+
+    def __eq__(self, other):
+        if not isinstance(other, HalsteadMetrics):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"HalsteadMetrics(N1={self.operators} N2={self.operands} n1={self.unique_operators} n2={self.unique_operands})"
+
+
+class HalsteadMetricsVisitor(DispatchVisitor):
+
+    # Comparisons are counted from the node itself, function bodies by a visitor of their own
+    leaves = frozenset((ast.Compare, ast.FunctionDef))
+
+    def __init__(self, tracer: VisitTracer = None):
         self.operators = 0
         self.operands = 0
         self.unique_operators = set()
         self.unique_operands = set()
-        self.functions = []
+        self.functions = [] # (FunctionDef node, HalsteadMetrics) of every function below this scope
+        self.tracer = tracer
+        if tracer is not None:
+            tracer.attach(self)
+
+    def metrics(self):
+        return HalsteadMetrics(self.operators, self.operands, len(self.unique_operators), len(self.unique_operands))
 
     def halstead_vocab(self):
-        return len(self.unique_operands) + len(self.unique_operators)
+        return self.metrics().vocabulary()
     
     def halstead_length(self):
-        return self.operators + self.operands
+        return self.metrics().length()
     
     def halstead_estimated_length(self):
-        return len(self.unique_operators) * math.log2(len(self.unique_operators)) + len(self.unique_operands) * math.log2(len(self.unique_operands))
+        return self.metrics().estimated_length()
 
     def halstead_volume(self):
-        return self.halstead_length() * math.log2(self.halstead_vocab())
+        return self.metrics().volume()
     
     def halstead_difficulty(self):
-        if len(self.unique_operators) == 0 or len(self.unique_operands) == 0:
-            return 0
-        return (self.operators / 2) * (self.operands / len(self.unique_operands))
+        return self.metrics().difficulty()
     
     def halstead_effort(self):
-        return self.halstead_difficulty() * self.halstead_volume()
+        return self.metrics().effort()
     
     def time_to_program(self):
-        return self.halstead_effort() / 18 #in seconds
+        return self.metrics().time_to_program()
     
     def delivered_bugs(self):
-        return (self.halstead_effort() ** (2/3)) / 3000
+        return self.metrics().bugs()
 
-    def generic_visit(self, node: ast.AST):
+    def count_statement(self, node: ast.stmt):
+        self.operators += 1
+        self.unique_operators.add(node.__class__.__name__)
 
-        if node.__class__.__name__ in ['While', 'For', 'With', 'Try', 'TryExcept']:
-            self.operators += 1
-            self.unique_operators.add(node.__class__.__name__)
-        
-        super().generic_visit(node)
+    visit_While = visit_For = visit_With = visit_Try = count_statement
 
     def operand_helper(self, node: ast.AST):
         if isinstance(node, ast.Name):
             self.operands += 1
-            print(node.id)
             self.unique_operands.add(node.id)
         if isinstance(node, ast.Constant):
             self.operands += 1
-            print(node.value)
             self.unique_operands.add(node.value)
         if isinstance(node, ast.List):
             if len(node.elts) == 0:
@@ -75,8 +137,6 @@ class HalsteadMetricsVisitor(ast.NodeVisitor):
             if isinstance(operand, ast.Name):
                 self.unique_operands.add(operand.id)
 
-        self.generic_visit(node)
-
     def visit_BinOp(self, node: ast.BinOp):
         # Mathematical operands e.g. '+', '*' etc.
         self.operator_helper(node.op)
@@ -84,8 +144,6 @@ class HalsteadMetricsVisitor(ast.NodeVisitor):
         self.operand_helper(node.left)
         self.operand_helper(node.right)
 
-        self.generic_visit(node)
-
     def visit_UnaryOp(self, node: ast.UnaryOp):
         # 
         self.operator_helper(node.op)
@@ -96,20 +154,13 @@ class HalsteadMetricsVisitor(ast.NodeVisitor):
         if isinstance(node.operand, ast.Name):
             self.unique_operands.add(node.operand.id)
 
-        self.generic_visit(node)
-
     def visit_Assign(self, node: ast.Assign):
         # LHS of assignment
         self.operator_helper(node)
         self.operand_helper(node.targets[0])
-        if isinstance(node.targets, ast.Tuple):
-            for target in node.targets.elts:
-                self.operand_helper(target)
 
         #RHS of assignment
         self.operand_helper(node.value)
-
-        self.generic_visit(node)
         
 
     def visit_AugAssign(self, node: ast.AugAssign):
@@ -120,8 +171,6 @@ class HalsteadMetricsVisitor(ast.NodeVisitor):
 
         self.operand_helper(node.value)
 
-        self.generic_visit(node)
-
     def visit_Compare(self, node: ast.Compare):
         # Comparison operations (e.g., <, >, ==, etc.)
         self.operators += len(node.ops)
@@ -156,7 +205,6 @@ class HalsteadMetricsVisitor(ast.NodeVisitor):
             if isinstance(arg, ast.Expr):
                 self.unique_operands.add(arg.value)
             
-        self.generic_visit(node)
 
     def visit_If(self, node: ast.If):
         self.operator_helper(node)
@@ -168,8 +216,6 @@ class HalsteadMetricsVisitor(ast.NodeVisitor):
                 self.operators += 1
                 self.unique_operators.add('Else')
 
-        self.generic_visit(node)
-
     def visit_Subscript(self, node: ast.Subscript):
         self.operator_helper(node)
 
@@ -183,9 +229,12 @@ class HalsteadMetricsVisitor(ast.NodeVisitor):
             if node.slice.upper is not None:
                 self.operand_helper(node.slice.upper)
 
-        self.generic_visit(node)
-
 
     def visit_FunctionDef(self, node: ast.FunctionDef):
-        pass
+        # The body is counted for the function only, not for the enclosing scope
+        function_visitor = HalsteadMetricsVisitor(self.tracer)
+        for child in node.body:
+            function_visitor.visit(child)
+        self.functions.append((node, function_visitor.metrics()))
+        self.functions.extend(function_visitor.functions)
     
\ No newline at end of file
@@ -0,0 +1,221 @@
+from array import array
+from heapq import nlargest
+from itertools import islice
+from code_metrics.access import class_design_metrics
+from code_metrics.halstead import HalsteadMetrics, maintainability_index
+
+class FunctionRecord:
+    """
+    Compact stand-in for Function: line span and numeric metrics only. The body and closures
+    are not kept, the source is read back from the file when asked for.
+    """
+
+    __slots__ = (
+        'name', 'path', 'start_lineno', 'end_lineno', 'is_method', 'belongs_to',
+        'complexity', 'mloc', 'num_params', 'num_localvar', 'branches', 'long_function', 'halstead'
+    )
+
+    def __init__(self, name, path, start_lineno, end_lineno, is_method, belongs_to, complexity, mloc, num_params, num_localvar, branches, long_function=False, halstead=None):
+        self.name = name
+        self.path = path
+        self.start_lineno = start_lineno
+        self.end_lineno = end_lineno
+        self.is_method = is_method
+        self.belongs_to = belongs_to
+        self.complexity = complexity
+        self.mloc = mloc
+        self.num_params = num_params
+        self.num_localvar = num_localvar
+        self.branches = branches
+        self.long_function = long_function
+        self.halstead = halstead
+
+    @classmethod
+    def from_function(cls, func, path=None):
+        return cls(
+            func.name,
+            path,
+            func.start_lineno,
+            func.end_lineno,
+            func.is_method,
+            func.belongs_to,
+            func.complexity,
+            func.mloc,
+            func.num_params,
+            func.num_localvar,
+            func.branches,
+            func.long_function,
+            getattr(func, 'halstead', None)
+        )
+
+    def get_name(self):
+        if self.belongs_to is None:
+            return self.name
+        return f"{self.belongs_to}.{self.name}"
+
+    def maintainability_index(self):
+        if self.halstead is None:
+            return None
+        return maintainability_index(self.halstead.volume(), self.complexity, self.mloc)
+
+    @property
+    def body(self):
+        if self.path is None:
+            return ""
+        with open(self.path, 'r', encoding='utf-8') as file:
+            return ''.join(islice(file, self.start_lineno - 1, self.end_lineno))
+
+    def __eq__(self, other):
+        if not isinstance(other, FunctionRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"FunctionRecord({self.get_name()} {self.path}:{self.start_lineno}-{self.end_lineno} complexity={self.complexity} mloc={self.mloc})"
+
+
+class ClassRecord:
+
+    __slots__ = ('name', 'path', 'start_lineno', 'end_lineno', 'methods', 'complexity', 'mloc', 'noa', 'atfd', 'tcc', 'lcom', 'halstead')
+
+    def __init__(self, name, path, start_lineno, end_lineno, methods, complexity, mloc, noa=0, atfd=0, tcc=1.0, lcom=0, halstead=None):
+        self.name = name
+        self.path = path
+        self.start_lineno = start_lineno
+        self.end_lineno = end_lineno
+        self.methods = methods # tuple of FunctionRecord
+        self.complexity = complexity
+        self.mloc = mloc
+        self.noa = noa # number of attributes
+        self.atfd = atfd # access to foreign data
+        self.tcc = tcc # tight class cohesion
+        self.lcom = lcom # lack of cohesion in methods
+        self.halstead = halstead
+
+    @classmethod
+    def from_class(cls, klass, path=None):
+        return cls(
+            klass.name,
+            path,
+            klass.start_lineno,
+            klass.end_lineno,
+            tuple(FunctionRecord.from_function(method, path) for method in klass.methods),
+            klass.complexity,
+            klass.mloc,
+            *class_design_metrics(klass),
+            halstead=getattr(klass, 'halstead', None)
+        )
+
+    def avg_method_complexity(self):
+        if not self.methods:
+            return 0
+        return sum(method.complexity for method in self.methods) / len(self.methods)
+
+    def get_method_loc(self):
+        return sum(method.mloc for method in self.methods)
+
+    def __repr__(self):
+        return f"ClassRecord({self.name} {self.path}:{self.start_lineno}-{self.end_lineno} methods={len(self.methods)} complexity={self.complexity} mloc={self.mloc})"
+
+
+class MetricsTable:
+    """
+    Column store of function metrics. Numbers live in typed arrays and strings are pooled,
+    so a row costs a few dozen bytes instead of a Python object per field.
+    """
+
+    numeric_columns = ('start_lineno', 'end_lineno', 'complexity', 'mloc', 'num_params', 'num_localvar', 'branches')
+    # Halstead counts of each row, -1 when the record has none
+    halstead_columns = ('operators', 'operands', 'unique_operators', 'unique_operands')
+
+    def __init__(self):
+        self.columns = {column: array('l') for column in self.numeric_columns + self.halstead_columns}
+        self.is_method = array('b')
+        self.long_function = array('b')
+        self.name_ids = array('l')
+        self.belongs_to_ids = array('l')
+        self.path_ids = array('l')
+        self.strings = []
+        self.string_ids = {}
+
+    @classmethod
+    def from_records(cls, records):
+        table = cls()
+        table.extend(records)
+        return table
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.string_ids[value] = string_id
+            self.strings.append(value)
+        return string_id
+
+    def string(self, string_id):
+        return None if string_id < 0 else self.strings[string_id]
+
+    def append(self, record):
+        for column in self.numeric_columns:
+            self.columns[column].append(getattr(record, column))
+        halstead = getattr(record, 'halstead', None)
+        for column in self.halstead_columns:
+            self.columns[column].append(-1 if halstead is None else getattr(halstead, column))
+        self.is_method.append(bool(record.is_method))
+        self.long_function.append(bool(record.long_function))
+        self.name_ids.append(self.intern(record.name))
+        self.belongs_to_ids.append(self.intern(record.belongs_to))
+        self.path_ids.append(self.intern(getattr(record, 'path', None)))
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    def __getitem__(self, index):
+        columns = self.columns
+        return FunctionRecord(
+            self.strings[self.name_ids[index]],
+            self.string(self.path_ids[index]),
+            columns['start_lineno'][index],
+            columns['end_lineno'][index],
+            bool(self.is_method[index]),
+            self.string(self.belongs_to_ids[index]),
+            columns['complexity'][index],
+            columns['mloc'][index],
+            columns['num_params'][index],
+            columns['num_localvar'][index],
+            columns['branches'][index],
+            bool(self.long_function[index]),
+            self.halstead(index)
+        )
+
+    def halstead(self, index):
+        counts = [self.columns[column][index] for column in self.halstead_columns]
+        return None if counts[0] < 0 else HalsteadMetrics(*counts)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def column(self, name):
+        return self.columns[name]
+
+    def total(self, name):
+        return sum(self.columns[name])
+
+    def mean(self, name):
+        if not len(self):
+            return 0
+        return self.total(name) / len(self)
+
+    def maximum(self, name):
+        return max(self.columns[name], default=0)
+
+    def top(self, name, n=10):
+        values = self.columns[name]
+        return [self[index] for index in nlargest(n, range(len(values)), key=values.__getitem__)]
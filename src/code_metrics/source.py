@@ -0,0 +1,98 @@
+import mmap
+import os
+import re
+from array import array
+from textwrap import dedent
+
+NEWLINE = re.compile(rb'\r\n|\r|\n')
+# Smaller files are read, mapping them costs more than the copy it saves
+MMAP_THRESHOLD = 64 * 1024
+# What ast.parse raises on a module it cannot build a tree of, a long enough expression exhausts the
+# parser's recursion limit or memory instead of being a syntax error
+PARSE_ERRORS = (SyntaxError, ValueError, RecursionError, MemoryError)
+
+class SourceIndex:
+    """
+    Byte offset of every line start in a module, built once per file. AST positions
+    (lineno, col_offset in UTF-8 bytes) map straight to a slice of the encoded source,
+    where ast.get_source_segment re-splits the whole module on every call.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.data = source.encode('utf-8') if isinstance(source, str) else source
+        self.line_offsets = array('l', [0])
+        self.line_offsets.extend(match.end() for match in NEWLINE.finditer(self.data))
+
+    def __len__(self):
+        return len(self.line_offsets)
+
+    def offset(self, lineno, col_offset=0):
+        return self.line_offsets[lineno - 1] + col_offset
+
+    def segment(self, node):
+        # Same result as ast.get_source_segment(source, node)
+        end_lineno = getattr(node, 'end_lineno', None)
+        end_col_offset = getattr(node, 'end_col_offset', None)
+        if end_lineno is None or end_col_offset is None:
+            return None
+        start = self.offset(node.lineno, node.col_offset)
+        end = self.offset(end_lineno, end_col_offset)
+        return bytes(self.data[start:end]).decode('utf-8')
+
+    def lines(self, start_lineno, end_lineno):
+        start = self.line_offsets[start_lineno - 1]
+        end = self.line_offsets[end_lineno] if end_lineno < len(self.line_offsets) else len(self.data)
+        return bytes(self.data[start:end]).decode('utf-8')
+
+
+class SourceFile:
+    """
+    A source file mapped read-only into memory. ast.parse, hashing and SourceIndex all take
+    the mapping as it is, so a large module is never copied into a bytes object, the text is
+    only decoded when a caller asks for it and then once.
+    """
+
+    def __init__(self, path, mmap_threshold=MMAP_THRESHOLD):
+        self.path = path
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size >= max(mmap_threshold, 1):
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = file.read()
+        self._text = None
+        self._index = None
+
+    def text(self):
+        if self._text is None:
+            self._text = str(memoryview(self.data), 'utf-8')
+        return self._text
+
+    def index(self):
+        if self._index is None:
+            self._index = SourceIndex(self.data)
+        return self._index
+
+    def close(self):
+        # Slices taken from data are copies, nothing handed out keeps the mapping alive
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def dedented(source):
+    # dedent(source).strip() as used for snippets, without copying a module that already starts at column 0
+    if not source[:1].isspace():
+        return source
+    if not isinstance(source, str):
+        source = str(memoryview(source), 'utf-8')
+    return dedent(source).strip()
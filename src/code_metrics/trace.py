@@ -0,0 +1,58 @@
+import time
+from collections import Counter
+
+class VisitTracer:
+    """
+    Per node type visit counts and time of a DispatchVisitor or ast.NodeVisitor. The tracer is
+    attached to one visitor instance, visitors without a tracer run untouched.
+    """
+
+    def __init__(self, callback=None, clock=time.perf_counter_ns):
+        self.counts = Counter()
+        self.total_time = Counter() # nanoseconds per node type, children included
+        self.self_time = Counter() # nanoseconds per node type, children excluded
+        self.callback = callback # called as callback(node, elapsed) after every visit
+        self.clock = clock
+        self.child_time = [] # time of finished children for every visit still open
+        self.starts = [] # clock at the start of every visit still open
+
+    def enter(self, node):
+        self.child_time.append(0)
+        self.starts.append(self.clock())
+
+    def leave(self, node):
+        elapsed = self.clock() - self.starts.pop()
+        node_type = node.__class__.__name__
+        self.counts[node_type] += 1
+        self.total_time[node_type] += elapsed
+        self.self_time[node_type] += elapsed - self.child_time.pop()
+        if self.child_time:
+            self.child_time[-1] += elapsed
+        if self.callback is not None:
+            self.callback(node, elapsed)
+
+    def attach(self, visitor):
+        # A DispatchVisitor reports the start and end of every node from its own walk
+        if hasattr(visitor, 'visit_traced'):
+            visitor.tracer = self
+            return visitor
+
+        visit = visitor.visit
+
+        def traced_visit(node):
+            self.enter(node)
+            try:
+                return visit(node)
+            finally:
+                self.leave(node)
+
+        # generic_visit looks up self.visit, so the instance attribute catches every nested visit too
+        visitor.visit = traced_visit
+        return visitor
+
+    def report(self, n=None):
+        # [(node_type, visits, total_ns, self_ns), ...] by time spent in the node type itself
+        return [
+            (node_type, self.counts[node_type], self.total_time[node_type], self.self_time[node_type])
+            for node_type, _ in self.self_time.most_common(n)
+        ]
@@ -0,0 +1,508 @@
+import ast
+from code_metrics.func import Function
+from code_metrics.cls import Class
+from code_metrics.source import SourceIndex
+from code_metrics.access import AccessProfile
+from code_metrics.halstead import HalsteadMetrics
+from code_metrics.visitor import handler_table, push_children
+
+# Which analyses are active for a node, children inherit the flags of their parent
+CYCLOMATIC = 1
+HALSTEAD = 2
+LINES = 4
+ACCESS = 8
+ALL = CYCLOMATIC | HALSTEAD | LINES | ACCESS
+
+# Statements counted as a line of code, mirrors the count_line handlers of CyclomaticComplexityVisitor
+# (ast.Assert is absent as visit_Assert does not count its line)
+STATEMENT_TYPES = frozenset((
+    ast.Return, ast.Delete, ast.Assign, ast.AugAssign, ast.AnnAssign,
+    ast.For, ast.AsyncFor, ast.While, ast.If, ast.With, ast.AsyncWith,
+    ast.Raise, ast.Try, ast.Import, ast.ImportFrom,
+    ast.Global, ast.Nonlocal, ast.Expr, ast.Pass, ast.Break, ast.Continue,
+    ast.Match
+))
+
+# Halstead statements counted as operators by HalsteadMetricsVisitor.count_statement
+HALSTEAD_STATEMENTS = frozenset((ast.While, ast.For, ast.With, ast.Try))
+
+# Nodes whose children are not visited by the respective visitor
+CYCLOMATIC_LEAVES = frozenset((ast.Assert,))
+HALSTEAD_LEAVES = frozenset((ast.Compare,))
+
+
+class Scope:
+
+    def __init__(self, kind, name, node, parent, starting_complexity=0):
+        self.kind = kind # 'module', 'class' or 'function'
+        self.name = name
+        self.node = node
+        self.parent = parent
+        self.cyclomatic_complexity = starting_complexity
+        self.mloc = set()
+        self.num_localvar = set()
+        self.branches = 0
+        self.functions = []
+        self.classes = []
+        self.method_scopes = [] # closed method scopes of a class, for its Halstead totals
+        self.operators = 0
+        self.operands = 0
+        self.unique_operators = set()
+        self.unique_operands = set()
+        # Attribute accesses are only profiled for functions
+        self.access = AccessProfile() if kind == 'function' else None
+        self.self_name = None
+
+    def add_operator(self, name):
+        self.operators += 1
+        self.unique_operators.add(name)
+
+    def add_operand(self, node: ast.AST):
+        # Equivalent of HalsteadMetricsVisitor.operand_helper
+        if isinstance(node, ast.Name):
+            self.operands += 1
+            self.unique_operands.add(node.id)
+        elif isinstance(node, ast.Constant):
+            self.operands += 1
+            self.unique_operands.add(node.value)
+        elif isinstance(node, ast.List):
+            if len(node.elts) == 0:
+                self.operands += 1
+                self.unique_operands.add(str(node.elts))
+            for elt in node.elts:
+                self.add_operand(elt)
+        elif isinstance(node, ast.Tuple):
+            for elt in node.elts:
+                self.add_operand(elt)
+
+    def halstead(self):
+        return HalsteadMetrics(self.operators, self.operands, len(self.unique_operators), len(self.unique_operands))
+
+    def merge_halstead(self, other):
+        self.operators += other.operators
+        self.operands += other.operands
+        self.unique_operators |= other.unique_operators
+        self.unique_operands |= other.unique_operands
+
+    def __repr__(self):
+        return f"Scope({self.kind} {self.name} complexity={self.cyclomatic_complexity} mloc={len(self.mloc)} operators={self.operators} operands={self.operands})"
+
+
+class Context:
+
+    __slots__ = ('scope', 'flags')
+
+    def __init__(self, scope, flags):
+        self.scope = scope
+        self.flags = flags
+
+
+class UnifiedMetricsVisitor:
+    """
+    Computes the CyclomaticComplexityVisitor and HalsteadMetricsVisitor metrics in a single walk
+    of the tree. Function and class bodies push a Scope onto an explicit stack instead of
+    re-instantiating a visitor, so every node is visited exactly once. Each function keeps the
+    Halstead tallies of its own body next to its complexity.
+    """
+
+    cyclomatic_handlers = {}
+    halstead_handlers = {}
+
+    def __init__(self, source_code=""):
+        self.source_code = source_code
+        self.source_index = None
+        self.module = Scope('module', None, None, None, starting_complexity=1)
+        self.scopes = [self.module]
+        self.imported_names = set()
+        self.called = set()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.build_handlers()
+
+    @classmethod
+    def build_handlers(cls):
+        # Handlers are looked up by exact node type so each node costs one dict lookup per analysis
+        cls.cyclomatic_handlers = handler_table(cls, 'cyclomatic_')
+        cls.halstead_handlers = handler_table(cls, 'halstead_')
+
+    # Results for the module scope, named as on the individual visitors
+    @property
+    def functions(self):
+        return self.module.functions
+
+    @property
+    def classes(self):
+        return self.module.classes
+
+    @property
+    def cyclomatic_complexity(self):
+        return self.module.cyclomatic_complexity
+
+    @property
+    def mloc(self):
+        return self.module.mloc
+
+    @property
+    def num_localvar(self):
+        return self.module.num_localvar
+
+    @property
+    def branches(self):
+        return self.module.branches
+
+    @property
+    def operators(self):
+        return self.module.operators
+
+    @property
+    def operands(self):
+        return self.module.operands
+
+    @property
+    def unique_operators(self):
+        return self.module.unique_operators
+
+    @property
+    def unique_operands(self):
+        return self.module.unique_operands
+
+    def get_source_index(self):
+        if self.source_index is None or self.source_index.source is not self.source_code:
+            self.source_index = SourceIndex(self.source_code)
+        return self.source_index
+
+    def function_complexity(self):
+        return sum(func.complexity for func in self.functions) - len(self.functions)
+
+    def class_complexity(self):
+        return sum(cls.complexity for cls in self.classes) - len(self.classes)
+
+    def total_complexity(self):
+        return (
+            self.cyclomatic_complexity
+            + self.function_complexity()
+            + self.class_complexity()
+        )
+
+    def get_total_loc(self):
+        module_loc = len(self.mloc)
+        function_loc = sum(func.mloc for func in self.functions)
+        class_loc = sum(cls.mloc for cls in self.classes)
+
+        return module_loc + function_loc + class_loc
+
+    def visit(self, tree: ast.AST):
+
+        self.module.node = tree
+        scope, flags = self.module, ALL
+        stack = [tree]
+        push = stack.append
+        cyclomatic_handlers = self.cyclomatic_handlers
+        halstead_handlers = self.halstead_handlers
+
+        while stack:
+            node = stack.pop()
+            node_type = node.__class__
+
+            # Children share the scope and flags of their parent, a Context on the stack restores them
+            if node_type is Context:
+                scope, flags = node.scope, node.flags
+                continue
+            # A scope on the stack marks the end of its body
+            if node_type is Scope:
+                self.close_scope(node)
+                continue
+
+            if node_type is ast.FunctionDef:
+                self.open_function(node, scope, flags, stack)
+                continue
+            if node_type is ast.ClassDef:
+                self.open_class(node, scope, flags, stack)
+                continue
+
+            child_flags = flags
+            if flags & CYCLOMATIC:
+                if flags & LINES and node_type in STATEMENT_TYPES:
+                    scope.mloc.add(node.lineno)
+                handler = cyclomatic_handlers.get(node_type)
+                if handler is not None:
+                    handler(self, node, scope, flags)
+                if node_type in CYCLOMATIC_LEAVES:
+                    child_flags &= ~(CYCLOMATIC | LINES)
+
+            if flags & HALSTEAD:
+                if node_type in HALSTEAD_STATEMENTS:
+                    scope.add_operator(node_type.__name__)
+                handler = halstead_handlers.get(node_type)
+                if handler is not None:
+                    handler(self, node, scope)
+                if node_type in HALSTEAD_LEAVES:
+                    child_flags &= ~HALSTEAD
+
+            if flags & ACCESS:
+                if node_type is ast.Attribute:
+                    if scope.access is not None:
+                        self.record_access(node, scope)
+                elif node_type is ast.Call:
+                    if node.func.__class__ is ast.Attribute:
+                        self.called.add(id(node.func))
+                elif node_type is ast.Import or node_type is ast.ImportFrom:
+                    for alias in node.names:
+                        self.imported_names.add(alias.asname or alias.name.split('.')[0])
+
+            if child_flags & (CYCLOMATIC | HALSTEAD | ACCESS):
+                if child_flags != flags:
+                    # The children are popped next, the Context below them applies once they are done
+                    push(Context(scope, flags))
+                    flags = child_flags
+                push_children(node, push)
+
+        return self
+
+    def open_function(self, node: ast.FunctionDef, parent, flags, stack):
+        # Decorators, arguments and annotations are not part of the function metrics
+        scope = Scope('function', node.name, node, parent)
+        if parent.kind == 'class' and node.args.args:
+            scope.self_name = node.args.args[0].arg
+        if parent.kind == 'class' and any(isinstance(decorator, ast.Name) and decorator.id == 'staticmethod' for decorator in node.decorator_list):
+            # Static methods have no instance, none of their data is their own class's
+            scope.self_name = None
+            scope.access = None
+        elif parent.kind == 'function':
+            # Closures inside a method still see its self
+            scope.self_name = parent.self_name
+        self.scopes.append(scope)
+        stack.append(Context(parent, flags))
+        stack.append(scope)
+        stack.extend(reversed(node.body))
+        stack.append(Context(scope, ALL))
+
+    def open_class(self, node: ast.ClassDef, parent, flags, stack):
+        scope = Scope('class', node.name, node, parent)
+        self.scopes.append(scope)
+        stack.append(Context(parent, flags))
+        stack.append(scope)
+        body = Context(scope, ALL)
+        for child in reversed(node.body):
+            if child.__class__ is ast.AsyncFunctionDef:
+                # Lines inside an async method are not attributed to the class body
+                stack.append(body)
+                stack.append(child)
+                stack.append(Context(scope, ALL & ~LINES))
+            else:
+                stack.append(child)
+        stack.append(body)
+
+        # Bases, keywords and decorators only contribute to the Halstead metrics of the enclosing scope
+        if flags & HALSTEAD:
+            for field in ('decorator_list', 'bases', 'keywords', 'type_params'):
+                stack.extend(reversed(getattr(node, field, ())))
+            stack.append(Context(parent, HALSTEAD))
+
+    def close_scope(self, scope):
+        if scope.kind == 'function':
+            self.close_function(scope)
+        elif scope.kind == 'class':
+            self.close_class(scope)
+
+    def close_function(self, scope):
+        node = scope.node
+        parent = scope.parent
+        params = [param.arg for param in node.args.args]
+        is_method = parent.kind == 'class'
+
+        func_loc = set(scope.mloc)
+        func_loc.add(node.lineno)
+
+        func = Function(
+            node.name,
+            self.get_source_index().segment(node) if self.source_code else "",
+            node.lineno,
+            node.end_lineno,
+            is_method,
+            parent.name if is_method else None,
+            scope.functions,
+            scope.cyclomatic_complexity + 1,
+            len(func_loc),
+            len(node.args.args),
+            len(scope.num_localvar.difference(params)),
+            scope.branches,
+            access=scope.access,
+            halstead=scope.halstead()
+        )
+        parent.functions.append(func)
+        if is_method:
+            parent.method_scopes.append(scope)
+
+    def close_class(self, scope):
+        node = scope.node
+        parent = scope.parent
+        methods = scope.functions
+
+        cls_loc = set(scope.mloc)
+        cls_loc.add(node.lineno)
+
+        # Class Halstead metrics cover the class body and its methods together
+        members = Scope('class', node.name, node, None)
+        members.merge_halstead(scope)
+        for method_scope in scope.method_scopes:
+            members.merge_halstead(method_scope)
+
+        cls = Class(
+            node.name,
+            node.lineno,
+            node.end_lineno,
+            methods,
+            scope.cyclomatic_complexity + sum(method.complexity for method in methods),
+            len(cls_loc) + sum(method.mloc for method in methods),
+            attributes=scope.num_localvar,
+            halstead=members.halstead()
+        )
+        # Classes nested in functions or other classes are not reported, as with CyclomaticComplexityVisitor
+        if parent.kind == 'module':
+            parent.classes.append(cls)
+        parent.merge_halstead(scope)
+
+    def record_access(self, node: ast.Attribute, scope):
+        # Method calls are behaviour, not data
+        if id(node) in self.called:
+            return
+
+        value = node.value
+        profile = scope.access
+        if value.__class__ is ast.Name:
+            if value.id == scope.self_name:
+                profile.own[node.attr] += 1
+                if node.ctx.__class__ is ast.Store:
+                    profile.assigned.add(node.attr)
+            elif value.id not in self.imported_names:
+                profile.foreign[(value.id, node.attr)] += 1
+        elif value.__class__ is ast.Attribute and value.value.__class__ is ast.Name and value.value.id == scope.self_name:
+            # self.customer.name is data of the customer object
+            profile.foreign[(f"{value.value.id}.{value.attr}", node.attr)] += 1
+
+    # Cyclomatic complexity handlers
+
+    def cyclomatic_Try(self, node: ast.Try, scope, flags):
+        scope.cyclomatic_complexity += len(node.handlers) + bool(node.orelse)
+
+    def cyclomatic_If(self, node: ast.If, scope, flags):
+        scope.cyclomatic_complexity += 1
+        scope.branches += 1
+        if flags & LINES and node.orelse and hasattr(node.orelse[0], 'lineno') and not isinstance(node.orelse[0], ast.If):
+            # The 'else:' line itself
+            scope.mloc.add(node.orelse[0].lineno - 1)
+
+    def cyclomatic_IfExp(self, node: ast.IfExp, scope, flags):
+        scope.cyclomatic_complexity += 1
+        scope.branches += 1
+
+    def cyclomatic_BoolOp(self, node: ast.BoolOp, scope, flags):
+        scope.cyclomatic_complexity += len(node.values) - 1
+
+    def cyclomatic_For(self, node: ast.For, scope, flags):
+        scope.cyclomatic_complexity += bool(node.orelse) + 1
+
+    cyclomatic_While = cyclomatic_For
+    cyclomatic_AsyncFor = cyclomatic_For
+
+    def cyclomatic_comprehension(self, node: ast.comprehension, scope, flags):
+        scope.cyclomatic_complexity += len(node.ifs) + 1
+
+    def cyclomatic_Match(self, node: ast.Match, scope, flags):
+        # Every case is a decision point, including the wildcard
+        scope.cyclomatic_complexity += len(node.cases)
+
+    def cyclomatic_Assert(self, node: ast.Assert, scope, flags):
+        scope.cyclomatic_complexity += 1
+
+    def cyclomatic_Assign(self, node: ast.Assign, scope, flags):
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                scope.num_localvar.add(target.id)
+            elif isinstance(target, (ast.Tuple, ast.List)):
+                for elt in target.elts:
+                    if isinstance(elt, ast.Name):
+                        scope.num_localvar.add(elt.id)
+
+    # Halstead handlers
+
+    def halstead_BoolOp(self, node: ast.BoolOp, scope):
+        scope.add_operator(node.op.__class__.__name__)
+        scope.operands += len(node.values)
+        for operand in node.values:
+            if isinstance(operand, ast.Name):
+                scope.unique_operands.add(operand.id)
+
+    def halstead_BinOp(self, node: ast.BinOp, scope):
+        scope.add_operator(node.op.__class__.__name__)
+        scope.add_operand(node.left)
+        scope.add_operand(node.right)
+
+    def halstead_UnaryOp(self, node: ast.UnaryOp, scope):
+        scope.add_operator(node.op.__class__.__name__)
+        scope.operands += 1
+        if isinstance(node.operand, ast.Constant):
+            scope.unique_operands.add(node.operand.value)
+        if isinstance(node.operand, ast.Name):
+            scope.unique_operands.add(node.operand.id)
+
+    def halstead_Assign(self, node: ast.Assign, scope):
+        scope.add_operator('Assign')
+        scope.add_operand(node.targets[0])
+        scope.add_operand(node.value)
+
+    def halstead_AugAssign(self, node: ast.AugAssign, scope):
+        scope.add_operator('AugAssign' + node.op.__class__.__name__)
+        scope.add_operand(node.target)
+        scope.add_operand(node.value)
+
+    def halstead_Compare(self, node: ast.Compare, scope):
+        scope.operators += len(node.ops)
+        for op in node.ops:
+            scope.unique_operators.add(op.__class__.__name__)
+        scope.operands += len(node.comparators) + 1
+        for operand in (node.left, *node.comparators):
+            if isinstance(operand, ast.Name):
+                scope.unique_operands.add(operand.id)
+            if isinstance(operand, ast.Constant):
+                scope.unique_operands.add(operand.value)
+
+    def halstead_Call(self, node: ast.Call, scope):
+        scope.operators += 1
+        if isinstance(node.func, ast.Name):
+            scope.unique_operators.add(node.func.id)
+        if isinstance(node.func, ast.Attribute):
+            scope.unique_operators.add(node.func.attr)
+            if isinstance(node.func.value, ast.Name):
+                scope.operands += 1
+                scope.unique_operands.add(node.func.value.id)
+        scope.operands += len(node.args)
+        for arg in node.args:
+            if isinstance(arg, ast.Name):
+                scope.unique_operands.add(arg.id)
+            if isinstance(arg, ast.Constant):
+                scope.unique_operands.add(arg.value)
+
+    def halstead_If(self, node: ast.If, scope):
+        scope.add_operator('If')
+        if node.orelse:
+            if isinstance(node.orelse[0], ast.If):
+                scope.unique_operators.add('Elif')
+            else:
+                scope.add_operator('Else')
+
+    def halstead_Subscript(self, node: ast.Subscript, scope):
+        scope.add_operator('Subscript')
+        scope.operands += 1
+        if isinstance(node.value, ast.Name):
+            scope.unique_operands.add(node.value.id)
+        if isinstance(node.slice, ast.Slice):
+            if node.slice.lower is not None:
+                scope.add_operand(node.slice.lower)
+            if node.slice.upper is not None:
+                scope.add_operand(node.slice.upper)
+
+
+UnifiedMetricsVisitor.build_handlers()
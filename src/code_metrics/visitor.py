@@ -0,0 +1,99 @@
+import ast
+
+def handler_table(cls, prefix):
+    # {node type: function} for the methods of cls named prefix + an ast node class name
+    table = {}
+    for attr in dir(cls):
+        if attr.startswith(prefix):
+            node_type = getattr(ast, attr[len(prefix):], None)
+            if isinstance(node_type, type) and issubclass(node_type, ast.AST):
+                table[node_type] = getattr(cls, attr)
+    return table
+
+
+class Leave:
+    # Marks the end of a node's subtree on the stack of a traced walk
+
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+
+class DispatchVisitor:
+    """
+    Visitor core with one handler lookup per node. visit_<NodeType> methods are collected into a
+    table keyed by node class when the subclass is defined, so dispatch is a single dict lookup
+    instead of a getattr on the class name or a chain of isinstance checks. The tree is walked
+    with an explicit stack in the same order as ast.NodeVisitor, deep nesting cannot reach the
+    recursion limit. Handlers do not visit children themselves, children of the node types in
+    leaves are skipped.
+    """
+
+    handlers = {}
+    leaves = frozenset()
+    tracer = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.handlers = handler_table(cls, 'visit_')
+
+    def visit(self, tree: ast.AST):
+        if self.tracer is not None:
+            return self.visit_traced(tree)
+
+        handlers = self.handlers
+        leaves = self.leaves
+        stack = [tree]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node = pop()
+            node_type = node.__class__
+            handler = handlers.get(node_type)
+            if handler is not None:
+                handler(self, node)
+            if node_type in leaves:
+                continue
+            push_children(node, push)
+        return self
+
+    def visit_traced(self, tree: ast.AST):
+        # Same walk, with the tracer told when each node's subtree starts and ends
+        tracer = self.tracer
+        handlers = self.handlers
+        leaves = self.leaves
+        stack = [tree]
+        push = stack.append
+        while stack:
+            node = stack.pop()
+            if node.__class__ is Leave:
+                tracer.leave(node.node)
+                continue
+            node_type = node.__class__
+            tracer.enter(node)
+            push(Leave(node))
+            handler = handlers.get(node_type)
+            if handler is not None:
+                handler(self, node)
+            if node_type not in leaves:
+                push_children(node, push)
+        return self
+
+
+# Fields of every node type, last first, so children come off the stack in field order
+REVERSED_FIELDS = {}
+
+def push_children(node, push):
+    node_type = node.__class__
+    fields = REVERSED_FIELDS.get(node_type)
+    if fields is None:
+        fields = REVERSED_FIELDS[node_type] = node_type._fields[::-1]
+    for field in fields:
+        value = getattr(node, field, None)
+        if value.__class__ is list:
+            for item in reversed(value):
+                if isinstance(item, ast.AST):
+                    push(item)
+        elif isinstance(value, ast.AST):
+            push(value)
@@ -0,0 +1,237 @@
+import ast
+import contextlib
+import os
+import pickle
+from collections import Counter
+from code_metrics.source import PARSE_ERRORS
+from scanner.cache import TOOL_VERSION, content_hash
+
+# Calls that name an attribute through a string, e.g. getattr(obj, 'method')
+ATTRIBUTE_BUILTINS = {'getattr', 'hasattr', 'setattr', 'delattr'}
+
+class Definition:
+
+    def __init__(self, kind, name, qualname, path, start_lineno, end_lineno, decorated=False):
+        self.kind = kind # 'function', 'method', 'class' or 'global'
+        self.name = name
+        self.qualname = qualname
+        self.path = path
+        self.start_lineno = start_lineno
+        self.end_lineno = end_lineno
+        self.decorated = decorated
+
+    def __repr__(self):
+        return f"Definition({self.kind} {self.qualname} {self.path}:{self.start_lineno})"
+
+
+class FileSymbols:
+
+    def __init__(self, path, digest, definitions, references):
+        self.path = path
+        self.digest = digest
+        self.definitions = definitions
+        self.references = references # Counter of referenced names
+
+
+class SymbolCollector(ast.NodeVisitor):
+
+    def __init__(self, path):
+        self.path = path
+        self.definitions = []
+        self.references = Counter()
+        self.scopes = [] # (kind, name) of the enclosing classes and functions
+
+    def qualname(self, name):
+        return '.'.join([scope_name for kind, scope_name in self.scopes] + [name])
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        kind = 'method' if self.scopes and self.scopes[-1][0] == 'class' else 'function'
+        self.definitions.append(Definition(kind, node.name, self.qualname(node.name), self.path, node.lineno, node.end_lineno, bool(node.decorator_list)))
+
+        for child in node.decorator_list:
+            self.visit(child)
+        self.visit(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+
+        self.scopes.append(('function', node.name))
+        for child in node.body:
+            self.visit(child)
+        self.scopes.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.definitions.append(Definition('class', node.name, self.qualname(node.name), self.path, node.lineno, node.end_lineno, bool(node.decorator_list)))
+
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+
+        self.scopes.append(('class', node.name))
+        for child in node.body:
+            self.visit(child)
+        self.scopes.pop()
+
+    def add_globals(self, target):
+        if isinstance(target, ast.Name):
+            self.definitions.append(Definition('global', target.id, target.id, self.path, target.lineno, target.end_lineno))
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for elt in target.elts:
+                self.add_globals(elt)
+
+    def visit_Assign(self, node: ast.Assign):
+        if not self.scopes:
+            for target in node.targets:
+                self.add_globals(target)
+            # Names listed in __all__ are exported
+            if any(isinstance(target, ast.Name) and target.id == '__all__' for target in node.targets) and isinstance(node.value, (ast.List, ast.Tuple)):
+                for elt in node.value.elts:
+                    if isinstance(elt, ast.Constant) and isinstance(elt.value, str):
+                        self.references[elt.value] += 1
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        if not self.scopes:
+            self.add_globals(node.target)
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        # Recursive calls do not keep a function alive
+        if isinstance(node.ctx, ast.Store) or (self.scopes and self.scopes[-1] == ('function', node.id)):
+            return
+        self.references[node.id] += 1
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if not isinstance(node.ctx, ast.Store):
+            self.references[node.attr] += 1
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        for alias in node.names:
+            self.references[alias.name] += 1
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Name) and node.func.id in ATTRIBUTE_BUILTINS and len(node.args) >= 2:
+            name = node.args[1]
+            if isinstance(name, ast.Constant) and isinstance(name.value, str):
+                self.references[name.value] += 1
+        self.generic_visit(node)
+
+
+class SymbolIndex:
+    """
+    Repository-wide table of definitions and references. Both are hashed by simple name, so
+    resolving every reference costs one dict lookup, and a changed file only replaces its own
+    contribution.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.definitions = {} # name -> [Definition]
+        self.references = Counter()
+
+    def update_file(self, path, source, tree=None, digest=None):
+        digest = digest or content_hash(source.encode('utf-8') if isinstance(source, str) else source)
+        current = self.files.get(path)
+        if current is not None and current.digest == digest:
+            return False
+
+        try:
+            node = tree if tree is not None else ast.parse(source)
+        except PARSE_ERRORS:
+            node = None
+
+        self.remove_file(path)
+        collector = SymbolCollector(path)
+        if node is not None:
+            collector.visit(node)
+
+        symbols = FileSymbols(path, digest, collector.definitions, collector.references)
+        self.files[path] = symbols
+        for definition in symbols.definitions:
+            self.definitions.setdefault(definition.name, []).append(definition)
+        self.references.update(symbols.references)
+        return True
+
+    def remove_file(self, path):
+        symbols = self.files.pop(path, None)
+        if symbols is None:
+            return
+        self.references.subtract(symbols.references)
+        for definition in symbols.definitions:
+            remaining = [other for other in self.definitions[definition.name] if other.path != path]
+            if remaining:
+                self.definitions[definition.name] = remaining
+            else:
+                del self.definitions[definition.name]
+
+    def reference_count(self, name):
+        return self.references.get(name, 0)
+
+    def iter_definitions(self):
+        for definitions in self.definitions.values():
+            yield from definitions
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as file:
+            pickle.dump((TOOL_VERSION, self.files), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        # An index saved by another version, or one that does not load, is deleted and rebuilt from scratch
+        index = cls()
+        try:
+            with open(path, 'rb') as file:
+                version, files = pickle.load(file)
+            if version != TOOL_VERSION:
+                raise ValueError(f"symbol index saved by version {version}")
+            for symbols in files.values():
+                index.files[symbols.path] = symbols
+                for definition in symbols.definitions:
+                    index.definitions.setdefault(definition.name, []).append(definition)
+                index.references.update(symbols.references)
+        except FileNotFoundError:
+            return index
+        except Exception:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return cls()
+        return index
+
+
+class DeadCodeDetector:
+
+    def __init__(self, index=None, ignored_prefixes=('test_', 'Test')):
+        self.index = index if index is not None else SymbolIndex()
+        self.ignored_prefixes = ignored_prefixes
+        self.dead_code = []
+
+    def is_ignored(self, definition):
+        # Dunder methods are called by Python itself and decorated definitions are usually registered with a framework
+        name = definition.name
+        return (
+            definition.kind == 'global'
+            or definition.decorated
+            or (name.startswith('__') and name.endswith('__'))
+            or name.startswith(self.ignored_prefixes)
+            or name == 'main'
+        )
+
+    def check_dead_code(self):
+
+        self.dead_code = []
+        for definition in self.index.iter_definitions():
+            if self.is_ignored(definition) or self.index.reference_count(definition.name) > 0:
+                continue
+            self.dead_code.append(
+            {
+                "name": definition.qualname,
+                "kind": definition.kind,
+                "path": definition.path,
+                "start_lineno": definition.start_lineno,
+                "end_lineno": definition.end_lineno
+            })
+
+        self.dead_code.sort(key=lambda finding: (finding["path"], finding["start_lineno"]))
+        return self.dead_code
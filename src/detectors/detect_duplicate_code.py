@@ -1 +1,234 @@
+import io
+import keyword
+import tokenize
+from array import array
+from collections import deque
 
+HASH_BASE = 1_000_003
+HASH_MODULUS = (1 << 61) - 1
+
+SKIPPED_TOKENS = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+STATEMENT_START_TOKENS = {tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT}
+
+class CloneGroup:
+
+    def __init__(self, clone_type, tokens, fragments):
+        self.clone_type = clone_type # 1: identical apart from layout and comments, 2: identifiers/literals renamed
+        self.tokens = tokens
+        self.fragments = fragments # [(path, start_lineno, end_lineno), ...]
+
+    def __repr__(self):
+        return f"CloneGroup(Type-{self.clone_type}, tokens={self.tokens}, fragments={self.fragments})"
+
+
+class TokenStream:
+
+    def __init__(self, path):
+        self.path = path
+        self.normalised = array('l') # identifiers and literals collapsed, compared for Type-2 clones
+        self.exact = array('l') # original token text, compared for Type-1 clones
+        self.lines = array('l')
+
+
+def kgram_hashes(tokens, k):
+    # Karp-Rabin rolling hash of every window of k tokens
+    if len(tokens) < k:
+        return []
+
+    power = pow(HASH_BASE, k - 1, HASH_MODULUS)
+    value = 0
+    for token in tokens[:k]:
+        value = (value * HASH_BASE + token) % HASH_MODULUS
+
+    hashes = [value]
+    for index in range(k, len(tokens)):
+        value = ((value - tokens[index - k] * power) * HASH_BASE + tokens[index]) % HASH_MODULUS
+        hashes.append(value)
+    return hashes
+
+
+def winnow(hashes, window):
+    # Keeps the rightmost minimum hash of every window, any shared run of window + k - 1 tokens shares a fingerprint
+    selected = []
+    candidates = deque()
+
+    for index, value in enumerate(hashes):
+        while candidates and hashes[candidates[-1]] >= value:
+            candidates.pop()
+        candidates.append(index)
+        if candidates[0] <= index - window:
+            candidates.popleft()
+        if index >= window - 1 or index == len(hashes) - 1:
+            position = candidates[0]
+            if not selected or selected[-1][1] != position:
+                selected.append((hashes[position], position))
+
+    return selected
+
+
+def is_repetition(tokens):
+    # True when the sequence is a unit repeated at least twice, smallest period from the KMP prefix function
+    prefix = [0] * len(tokens)
+    for index in range(1, len(tokens)):
+        length = prefix[index - 1]
+        while length and tokens[index] != tokens[length]:
+            length = prefix[length - 1]
+        if tokens[index] == tokens[length]:
+            length += 1
+        prefix[index] = length
+    return bool(tokens) and (len(tokens) - prefix[-1]) * 2 <= len(tokens)
+
+
+class DuplicateCodeDetector:
+
+    def __init__(self, min_tokens=50, kgram=15, max_bucket=64):
+        self.min_tokens = min_tokens
+        self.kgram = kgram
+        self.window = max(min_tokens - kgram + 1, 1)
+        self.max_bucket = max_bucket # comparisons in one bucket finding no clone before its fingerprint is taken for boilerplate
+        self.streams = []
+        self.index = {}
+        self.vocabulary = {}
+        self.duplicates = []
+
+    def token_id(self, text):
+        token_id = self.vocabulary.get(text)
+        if token_id is None:
+            token_id = len(self.vocabulary) + 1
+            self.vocabulary[text] = token_id
+        return token_id
+
+    def tokenize(self, path, source):
+
+        stream = TokenStream(path)
+        statement_start = True
+        in_import = False
+
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type in SKIPPED_TOKENS:
+                continue
+
+            # Import blocks look alike everywhere once names are normalised, leave them out
+            if statement_start and token.type == tokenize.NAME and token.string in ('import', 'from'):
+                in_import = True
+            statement_start = token.type in STATEMENT_START_TOKENS
+            if in_import:
+                in_import = token.type != tokenize.NEWLINE
+                continue
+
+            if token.type == tokenize.NAME and not keyword.iskeyword(token.string):
+                normalised = 'ID'
+            elif token.type in (tokenize.NUMBER, tokenize.STRING):
+                normalised = 'LIT'
+            else:
+                normalised = tokenize.tok_name[token.type] if token.type in STATEMENT_START_TOKENS else token.string
+
+            stream.normalised.append(self.token_id(normalised))
+            stream.exact.append(self.token_id(token.string) if normalised in ('ID', 'LIT') else self.token_id(normalised))
+            # Dedents are reported on the following line, keep them on the line of the block they close
+            stream.lines.append(stream.lines[-1] if token.type == tokenize.DEDENT and stream.lines else token.start[0])
+
+        return stream
+
+    def add_file(self, path, source):
+        try:
+            stream = self.tokenize(path, source)
+        except (tokenize.TokenError, SyntaxError):
+            return
+
+        stream_id = len(self.streams)
+        self.streams.append(stream)
+        for value, position in winnow(kgram_hashes(stream.normalised, self.kgram), self.window):
+            self.index.setdefault(value, []).append((stream_id, position))
+
+    def extend_match(self, first, second):
+        (a, a_pos), (b, b_pos) = first, second
+        tokens_a = self.streams[a].normalised
+        tokens_b = self.streams[b].normalised
+
+        start_a, start_b = a_pos, b_pos
+        while start_a > 0 and start_b > 0 and tokens_a[start_a - 1] == tokens_b[start_b - 1]:
+            start_a -= 1
+            start_b -= 1
+
+        end_a, end_b = a_pos, b_pos
+        while end_a < len(tokens_a) and end_b < len(tokens_b) and tokens_a[end_a] == tokens_b[end_b]:
+            end_a += 1
+            end_b += 1
+
+        # Repetitive code (e.g. the same statement many times over) matches itself shifted, that is not a clone
+        if a == b:
+            overlapping = min(start_a, start_b) + end_a - start_a > max(start_a, start_b)
+            if overlapping or is_repetition(tokens_a[start_a:end_a]):
+                return start_a, start_b, 0
+
+        return start_a, start_b, end_a - start_a
+
+    def find_matches(self):
+
+        covered = {}
+        for occurrences in self.index.values():
+            if len(occurrences) < 2:
+                continue
+
+            # Every occurrence is compared with the first one, so code copied into many files is
+            # still one linear pass. A fingerprint that keeps matching only short runs is boilerplate
+            anchor = occurrences[0]
+            misses = 0
+            for other in occurrences[1:]:
+                if misses >= self.max_bucket:
+                    break
+                # Fingerprints inside a match already found on the same diagonal add nothing
+                diagonal = (anchor[0], other[0], other[1] - anchor[1])
+                if any(start <= anchor[1] < end for start, end in covered.get(diagonal, ())):
+                    continue
+
+                start_a, start_b, length = self.extend_match(anchor, other)
+                if length < self.min_tokens:
+                    misses += 1
+                if length <= 0:
+                    continue
+                covered.setdefault(diagonal, []).append((start_a, start_a + length))
+                if length >= self.min_tokens:
+                    yield (anchor[0], start_a), (other[0], start_b), length
+
+    def check_duplicate_code(self):
+
+        parents = {}
+
+        def find(fragment):
+            while parents[fragment] != fragment:
+                parents[fragment] = parents[parents[fragment]]
+                fragment = parents[fragment]
+            return fragment
+
+        for (a, start_a), (b, start_b), length in self.find_matches():
+            first = (a, start_a, length)
+            second = (b, start_b, length)
+            parents.setdefault(first, first)
+            parents.setdefault(second, second)
+            parents[find(second)] = find(first)
+
+        groups = {}
+        for fragment in parents:
+            groups.setdefault(find(fragment), []).append(fragment)
+
+        self.duplicates = []
+        for fragments in groups.values():
+            fragments.sort()
+            self.duplicates.append(self.clone_group(fragments))
+        return self.duplicates
+
+    def clone_group(self, fragments):
+        stream_id, start, length = fragments[0]
+        exact = self.streams[stream_id].exact[start:start + length]
+        identical = all(self.streams[other].exact[other_start:other_start + other_length] == exact for other, other_start, other_length in fragments[1:])
+
+        return CloneGroup(
+            1 if identical else 2,
+            min(fragment[2] for fragment in fragments),
+            [
+                (self.streams[stream_id].path, self.streams[stream_id].lines[start], self.streams[stream_id].lines[start + length - 1])
+                for stream_id, start, length in fragments
+            ]
+        )
@@ -0,0 +1,55 @@
+class FeatureEnvyDetector:
+
+    def __init__(self, min_foreign=3, locality=0.5, max_providers=2):
+        # A method is envious when it touches a few other objects' data more than its own class's
+        if min_foreign < 1:
+            # Without a foreign access there is nothing to envy, and the share of own accesses is undefined
+            raise ValueError(f"min_foreign must be at least 1, got {min_foreign}")
+        self.min_foreign = min_foreign # fewest foreign data accesses (ATFD) worth reporting
+        self.locality = locality # share of own accesses (LAA) below which a method is flagged
+        self.max_providers = max_providers # most distinct foreign data providers (FDP), more means a coordinator, not envy
+        self.feature_envy = []
+
+    def envied(self, func):
+        # Returns (own, foreign, providers) accesses when the method is envious, None otherwise
+        profile = func.access
+        if not func.is_method or profile is None:
+            return None
+
+        foreign = profile.foreign_total()
+        if foreign < self.min_foreign:
+            return None
+
+        providers = profile.foreign_receivers()
+        if len(providers) > self.max_providers:
+            return None
+
+        # Reaching self.customer to read self.customer.name is a step towards the customer's data, not a use of our own
+        own = profile.own_total() - sum(count for receiver, count in providers.items() if '.' in receiver)
+        if own / (own + foreign) >= self.locality:
+            return None
+        return own, foreign, providers
+
+    def iter_feature_envy(self, functions, path=None):
+
+        for func in functions:
+            envy = self.envied(func)
+            if envy is None:
+                continue
+            own, foreign, providers = envy
+            receiver, count = providers.most_common(1)[0]
+            yield {
+                "name": func.get_name(),
+                "path": path,
+                "start_lineno": func.start_lineno,
+                "end_lineno": func.end_lineno,
+                "own_accesses": own,
+                "foreign_accesses": foreign,
+                "providers": len(providers),
+                "envied": receiver,
+                "envied_accesses": count
+            }
+
+    def check_feature_envy(self, functions, path=None):
+        self.feature_envy.extend(self.iter_feature_envy(functions, path))
+        return self.feature_envy
@@ -0,0 +1,93 @@
+from array import array
+from code_metrics.batch import compare, group_count, group_sum, logical_and, nonzero
+from code_metrics.records import ClassRecord
+
+class ClassMetricsTable:
+    """
+    Per-class design metrics in array columns. Method complexities are kept in one flat column
+    with the owning class index beside them, so WMC and method counts are a single grouped sum
+    over the whole scan.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.paths = []
+        self.start_lineno = array('l')
+        self.end_lineno = array('l')
+        self.noa = array('l')
+        self.atfd = array('l')
+        self.tcc = array('d')
+        self.lcom = array('l')
+        self.method_class = array('l')
+        self.method_complexity = array('l')
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, record):
+        index = len(self.names)
+        self.names.append(record.name)
+        self.paths.append(record.path)
+        self.start_lineno.append(record.start_lineno)
+        self.end_lineno.append(record.end_lineno)
+        self.noa.append(record.noa)
+        self.atfd.append(record.atfd)
+        self.tcc.append(record.tcc)
+        self.lcom.append(record.lcom)
+        for method in record.methods:
+            self.method_class.append(index)
+            self.method_complexity.append(method.complexity)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def wmc(self):
+        # Weighted methods per class
+        return array('l', (int(total) for total in group_sum(self.method_complexity, self.method_class, len(self))))
+
+    def nom(self):
+        return array('l', (int(count) for count in group_count(self.method_class, len(self))))
+
+
+class GodClassDetector:
+
+    def __init__(self, wmc=47, tcc=1/3, atfd=5):
+        # Defaults from Lanza & Marinescu: very high WMC, low cohesion and more than a few foreign data accesses
+        self.wmc_threshold = wmc
+        self.tcc_threshold = tcc
+        self.atfd_threshold = atfd
+        self.table = ClassMetricsTable()
+        self.god_classes = []
+
+    def add_classes(self, classes, path=None):
+        for cls in classes:
+            self.table.append(cls if isinstance(cls, ClassRecord) else ClassRecord.from_class(cls, path))
+
+    def check_god_class(self):
+
+        table = self.table
+        wmc = table.wmc()
+        nom = table.nom()
+        mask = logical_and(
+            compare(wmc, '>=', self.wmc_threshold),
+            compare(table.tcc, '<', self.tcc_threshold),
+            compare(table.atfd, '>', self.atfd_threshold)
+        )
+
+        self.god_classes = [
+            {
+                "name": table.names[index],
+                "path": table.paths[index],
+                "start_lineno": table.start_lineno[index],
+                "end_lineno": table.end_lineno[index],
+                "wmc": wmc[index],
+                "nom": nom[index],
+                "noa": table.noa[index],
+                "tcc": table.tcc[index],
+                "lcom": table.lcom[index],
+                "atfd": table.atfd[index]
+            }
+            for index in nonzero(mask)
+        ]
+        return self.god_classes
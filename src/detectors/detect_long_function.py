@@ -1,15 +1,25 @@
+from detectors.rules import LONG_FUNCTION, Rule
+
 class LongFunctionDetector:
 
-    def __init__(self):
+    def __init__(self, thresholds=None):
+        self.rule = Rule('long_function', LONG_FUNCTION, thresholds)
         self.long_functions = []
 
-    def check_long_function(self, functions):
+    def is_long_function(self, func):
+        return self.rule.matches(func)
+
+    def select(self, table):
+        # Row indices of the long functions in a MetricsTable, all rows are evaluated at once
+        return self.rule.select(table)
+
+    def iter_long_functions(self, functions):
+        # Yields findings one at a time so callers can stream them without holding the whole list
 
         for func in functions:
-            if (func.mloc > 50) or (func.complexity > 5) or (((func.num_params > 5) or (func.num_localvar > 10)) and func.branches > 4):
+            if self.is_long_function(func):
                 func.long_function = True
-                self.long_functions.append(
-                {
+                yield {
                     "name": func.name,
                     "start_lineno":func.start_lineno,
                     "end_lineno": func.end_lineno,
@@ -22,5 +32,7 @@ class LongFunctionDetector:
                     "num_localvar": func.num_localvar,
                     "branches": func.branches,
                     "long_function": func.long_function
-                })
-            
\ No newline at end of file
+                }
+
+    def check_long_function(self, functions):
+        self.long_functions.extend(self.iter_long_functions(functions))
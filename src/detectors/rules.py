@@ -0,0 +1,135 @@
+import os
+import tomllib
+import warnings
+from code_metrics.batch import COMPARISONS, compare, logical_and, logical_or, nonzero
+
+# Thresholds of every rule, overridden per key from [tool.refactoring.<rule>] in pyproject.toml
+DEFAULT_THRESHOLDS = {
+    'long_function': {
+        'mloc': 50,
+        'complexity': 5,
+        'num_params': 5,
+        'num_localvar': 10,
+        'branches': 4,
+    },
+}
+
+class Condition:
+
+    def __init__(self, column, op, threshold):
+        if op not in COMPARISONS:
+            raise ValueError(f"Unknown comparison '{op}'")
+        self.column = column # metric compared, a MetricsTable column or record attribute
+        self.op = op
+        self.threshold = threshold # key of the threshold in the rule's configuration
+
+    def mask(self, table, thresholds):
+        return compare(table.column(self.column), self.op, thresholds[self.threshold])
+
+    def matches(self, record, thresholds):
+        return COMPARISONS[self.op](getattr(record, self.column), thresholds[self.threshold])
+
+    def __repr__(self):
+        return f"{self.column} {self.op} {self.threshold}"
+
+
+class AllOf:
+
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def mask(self, table, thresholds):
+        return logical_and(*(predicate.mask(table, thresholds) for predicate in self.predicates))
+
+    def matches(self, record, thresholds):
+        return all(predicate.matches(record, thresholds) for predicate in self.predicates)
+
+    def __repr__(self):
+        return '(' + ' and '.join(map(repr, self.predicates)) + ')'
+
+
+class AnyOf(AllOf):
+
+    def mask(self, table, thresholds):
+        return logical_or(*(predicate.mask(table, thresholds) for predicate in self.predicates))
+
+    def matches(self, record, thresholds):
+        return any(predicate.matches(record, thresholds) for predicate in self.predicates)
+
+    def __repr__(self):
+        return '(' + ' or '.join(map(repr, self.predicates)) + ')'
+
+
+LONG_FUNCTION = AnyOf(
+    Condition('mloc', '>', 'mloc'),
+    Condition('complexity', '>', 'complexity'),
+    AllOf(
+        AnyOf(Condition('num_params', '>', 'num_params'), Condition('num_localvar', '>', 'num_localvar')),
+        Condition('branches', '>', 'branches')
+    )
+)
+
+
+class Rule:
+    """
+    A predicate over metric columns with its thresholds. select() evaluates it for a whole
+    MetricsTable at once and returns row indices, matches() checks a single record.
+    """
+
+    def __init__(self, name, predicate, thresholds=None):
+        self.name = name
+        self.predicate = predicate
+        self.thresholds = dict(DEFAULT_THRESHOLDS.get(name, {}))
+        self.thresholds.update(thresholds or {})
+
+    def select(self, table):
+        if not len(table):
+            return nonzero([])
+        return nonzero(self.predicate.mask(table, self.thresholds))
+
+    def matches(self, record):
+        return self.predicate.matches(record, self.thresholds)
+
+    def __repr__(self):
+        return f"Rule({self.name}: {self.predicate} with {self.thresholds})"
+
+
+def find_pyproject(start='.'):
+    directory = os.path.abspath(start if os.path.isdir(start) else os.path.dirname(start) or '.')
+    while True:
+        path = os.path.join(directory, 'pyproject.toml')
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def load_thresholds(path=None):
+    # {rule: {threshold: value}} from [tool.refactoring], defaults for anything not configured
+    thresholds = {name: dict(values) for name, values in DEFAULT_THRESHOLDS.items()}
+    if path is None:
+        return thresholds
+
+    with open(path, 'rb') as file:
+        config = tomllib.load(file).get('tool', {}).get('refactoring', {})
+
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: [tool.refactoring] must be a table")
+    for name, values in config.items():
+        if name not in thresholds:
+            # Other tools and newer versions may keep their own tables under [tool.refactoring]
+            warnings.warn(f"{path}: ignoring [tool.refactoring.{name}], there is no rule '{name}'", stacklevel=2)
+            continue
+        if not isinstance(values, dict):
+            raise ValueError(f"{path}: [tool.refactoring.{name}] must be a table")
+        unknown = set(values) - set(thresholds[name])
+        if unknown:
+            raise ValueError(f"{path}: unknown thresholds {sorted(unknown)} for [tool.refactoring.{name}]")
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{path}: threshold [tool.refactoring.{name}] {key} must be a number")
+        thresholds[name].update(values)
+
+    return thresholds
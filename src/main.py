@@ -1,26 +1,391 @@
-import ast
-from textwrap import dedent
-from code_metrics.cyclomatic import CyclomaticComplexityVisitor
-import astpretty
+import argparse
+import contextlib
+import os
+import sys
 
-def main():
+# Everything else is imported by the function that needs it, a run on a few files would
+# otherwise spend most of its time importing analyses it never uses
 
-    with open('src/code_smells.py', 'r') as file:
-        code = file.read()
-    
-    node = ast.parse(code)
+def build_parser():
+    parser = argparse.ArgumentParser(description="Detect code smells in Python source code.")
+    parser.add_argument('--scan', metavar='PATH', help="Walk a directory tree and analyse every .py file in it")
+    parser.add_argument('--diff', metavar='RANGE', help="Only report functions touched by a git revision range, e.g. main...HEAD")
+    parser.add_argument('--duplicates', action='store_true', help="Also report Type-1/Type-2 clone groups across the scanned files")
+    parser.add_argument('--min-clone-tokens', type=int, default=50, help="Smallest clone reported by --duplicates, in tokens")
+    parser.add_argument('--dead-code', action='store_true', help="Also report functions, methods and classes that are never referenced")
+    parser.add_argument('--call-graph', action='store_true', help="Also report fan-in, fan-out, transitive impact and call cycles of the functions")
+    parser.add_argument('--god-classes', action='store_true', help="Also report classes with high WMC, low cohesion (TCC) and heavy foreign data access (ATFD)")
+    parser.add_argument('--refactor', action='store_true', help="Split the long functions under --scan with Extract Method and write every changed file once")
+    parser.add_argument('--dry-run', action='store_true', help="Plan the --refactor edits without writing them")
+    parser.add_argument('--config', metavar='PYPROJECT', help="pyproject.toml with [tool.refactoring] thresholds (defaults to the nearest one above the scanned path)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (defaults to the CPU count)")
+    parser.add_argument('--chunksize', type=int, default=16, help="Number of files sent to a worker per task")
+    parser.add_argument('--async-io', action='store_true', help="Read files concurrently while earlier ones are analysed, for slow or network filesystems")
+    parser.add_argument('--read-concurrency', type=int, default=16, help="Files read at the same time with --async-io")
+    parser.add_argument('--queue-size', type=int, default=64, help="Read files waiting for analysis before reading pauses, with --async-io")
+    parser.add_argument('--format', choices=('text', 'ndjson'), default='text', help="Print a summary or stream one JSON record per function, class and finding")
+    parser.add_argument('--output', default='-', help="File every --format ndjson record of the run is written to, '-' for stdout")
+    parser.add_argument('--ast-cache-mb', type=int, default=256, help="Memory budget of the parsed trees shared by --duplicates, --dead-code, --call-graph and --refactor, and by the scan itself when it runs in-process")
+    parser.add_argument('--watch', action='store_true', help="Keep the metrics of --scan in memory, re-analyse changed files and answer --query requests")
+    parser.add_argument('--socket', help="Unix socket of the --watch daemon (defaults to daemon.sock in the cache directory)")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between checks for changed files with --watch")
+    parser.add_argument('--query', metavar='JSON', help="Ask a running --watch daemon, e.g. '{\"query\": \"top\", \"n\": 20}'")
+    parser.add_argument('--cache', action='store_true', help="Reuse results of unchanged files from previous scans")
+    parser.add_argument('--cache-dir', default='.refactor_cache', help="Directory holding the result cache")
+    parser.add_argument('--cache-max-entries', type=int, default=200_000, help="Evict the least recently used results above this many entries")
+    parser.add_argument('--cache-max-age', type=float, default=30, help="Evict results not used for this many days")
+    parser.add_argument('--profile-startup', action='store_true', help="Run the command under -X importtime and report the import time of each package on stderr")
+    return parser
+
+def parse_args(argv=None):
+    return build_parser().parse_args(argv)
+
+def scan_results(args, cache=None, thresholds=None, timings=None, ast_cache=None):
+    if args.async_io:
+        from scanner.ingest import scan_repository_async
+        return scan_repository_async(args.scan, args.workers, args.read_concurrency, args.queue_size, cache, thresholds, timings)
+    from scanner.repo_scan import scan_repository
+    return scan_repository(args.scan, workers=args.workers, chunksize=args.chunksize, cache=cache, thresholds=thresholds, ast_cache=ast_cache)
+
+@contextlib.contextmanager
+def output_writer(args):
+    # The one NDJSONWriter every part of a run writes to, on --output, or None for the text summary
+    if args.format != 'ndjson':
+        yield None
+        return
+    from scanner.ndjson import NDJSONWriter
+    if args.output == '-':
+        yield NDJSONWriter(sys.stdout)
+        return
+    with open(args.output, 'w', encoding='utf-8') as stream:
+        yield NDJSONWriter(stream)
+
+def scan_ndjson(results, writer):
+    for result in results:
+        writer.write_result(result)
+
+def scan(results, cache=None):
+
+    files = 0
+    functions = 0
+    long_functions = 0
+    feature_envy = 0
+    total_loc = 0
+
+    for result in results:
+        files += 1
+        if result.error:
+            print(f"{result.path}: {result.error}")
+            continue
+        functions += len(result.functions)
+        long_functions += len(result.long_functions)
+        feature_envy += len(result.feature_envy)
+        total_loc += result.total_loc
+        for func in result.long_functions:
+            print(f"{result.path}:{func.start_lineno}-{func.end_lineno}: long function {func.get_name()}")
+        for finding in result.feature_envy:
+            print(f"{result.path}:{finding['start_lineno']}-{finding['end_lineno']}: feature envy {finding['name']} uses {finding['envied']} ({finding['foreign_accesses']} foreign, {finding['own_accesses']} own accesses)")
+
+    print(f"Files: {files} Functions: {functions} Long Functions: {long_functions} Feature Envy: {feature_envy} Lines of Code: {total_loc}")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache Hits: {stats['hits']} Misses: {stats['misses']} Entries: {stats['entries']}")
+
+def diff(rev_range, writer=None, thresholds=None):
+    from scanner.git_diff import diff_functions
+
+    for change in diff_functions(rev_range, thresholds=thresholds):
+        if writer is not None:
+            writer.write_change(change)
+            continue
+        status = "new" if change.is_new else f"complexity {change.complexity_delta:+} mloc {change.mloc_delta:+}"
+        smell = " long function" if change.long_function else ""
+        print(f"{change.path}:{change.start_lineno}-{change.end_lineno}: {change.name} complexity {change.complexity} mloc {change.mloc} ({status}){smell}")
+
+def duplicates(path, min_tokens, writer=None, ast_cache=None):
+    from code_metrics.ast_cache import ASTCache
+    from detectors.detect_duplicate_code import DuplicateCodeDetector
+    from scanner.repo_scan import iter_python_files
+
+    # Tokens only, the sources are read through the cache so the analyses after this one do not read them again
+    ast_cache = ast_cache if ast_cache is not None else ASTCache()
+    detector = DuplicateCodeDetector(min_tokens=min_tokens)
+    for file_path in iter_python_files(path):
+        try:
+            detector.add_file(file_path, ast_cache.read(file_path).source.decode('utf-8'))
+        except (OSError, UnicodeDecodeError):
+            continue
+
+    for group in detector.check_duplicate_code():
+        if writer is not None:
+            writer.write_clone_group(group)
+            continue
+        fragments = ", ".join(f"{file_path}:{start}-{end}" for file_path, start, end in group.fragments)
+        print(f"Type-{group.clone_type} clone ({group.tokens} tokens): {fragments}")
+
+def update_index(index, path, ast_cache=None):
+    # Brings a SymbolIndex or CallGraph up to date with the files under path. Files are read through
+    # the run's ASTCache and only parsed when the index does not already know their digest
+    from code_metrics.ast_cache import ASTCache
+    from code_metrics.source import PARSE_ERRORS
+    from scanner.repo_scan import iter_python_files
+
+    ast_cache = ast_cache if ast_cache is not None else ASTCache()
+    seen = set()
+    for file_path in iter_python_files(path):
+        seen.add(file_path)
+        try:
+            entry = ast_cache.read(file_path)
+        except OSError:
+            continue
+        current = index.files.get(file_path)
+        if current is not None and current.digest == entry.digest:
+            continue
+        try:
+            tree = entry.tree
+        except PARSE_ERRORS:
+            tree = None # the index records the file without symbols
+        try:
+            index.update_file(file_path, entry.source, tree, entry.digest)
+        except (RecursionError, MemoryError):
+            # Parsed, but nested too deeply for the index's visitor, it is left out like a file that does not parse
+            index.remove_file(file_path)
+    for file_path in set(index.files) - seen:
+        index.remove_file(file_path)
+
+def dead_code(path, writer=None, index_path=None, ast_cache=None):
+    from detectors.detect_dead_code import DeadCodeDetector, SymbolIndex
+
+    # With a cache the symbol index is kept between runs and only changed files are re-parsed
+    index = SymbolIndex.load(index_path) if index_path else SymbolIndex()
+    update_index(index, path, ast_cache)
+    if index_path:
+        index.save(index_path)
+
+    for finding in DeadCodeDetector(index).check_dead_code():
+        if writer is not None:
+            writer.write(dict(finding, type="finding", smell="dead_code"))
+            continue
+        print(f"{finding['path']}:{finding['start_lineno']}-{finding['end_lineno']}: unreferenced {finding['kind']} {finding['name']}")
+
+def build_call_graph(path, index_path=None, ast_cache=None):
+    from code_metrics.call_graph import CallGraph
+
+    # With a cache the graph's per-file data is kept between runs and only changed files are re-parsed
+    root = path if os.path.isdir(path) else os.path.dirname(path) or '.'
+    graph = CallGraph.load(index_path, root) if index_path else CallGraph(root)
+    update_index(graph, path, ast_cache)
+    if index_path:
+        graph.save(index_path)
+    return graph.build()
+
+def call_graph(path, writer=None, index_path=None, ast_cache=None, top=20):
+
+    graph = build_call_graph(path, index_path, ast_cache)
+    if writer is not None:
+        for row in graph.iter_metrics():
+            writer.write(dict(row, type="call_graph"))
+        for cycle in graph.cycles():
+            writer.write({"type": "finding", "smell": "call_cycle", "functions": cycle})
+        return
+
+    rows = sorted(graph.iter_metrics(), key=lambda row: (-row['impact'], -row['fan_in'], row['name']))
+    for row in rows[:top]:
+        print(f"{row['path']}:{row['start_lineno']}-{row['end_lineno']}: {row['name']} fan-in {row['fan_in']} fan-out {row['fan_out']} impact {row['impact']}")
+    cycles = graph.cycles()
+    for cycle in cycles:
+        print(f"Call cycle: {' -> '.join(cycle)}")
+    print(f"Functions: {len(graph.names)} Calls: {len(graph.targets)} Cycles: {len(cycles)}")
+
+def collect_classes(results, detector):
+    # Passes the scan results on, feeding their classes to the detector as they stream by
+    for result in results:
+        detector.add_classes(result.classes)
+        yield result
+
+def god_classes(detector, writer=None):
+
+    for finding in detector.check_god_class():
+        if writer is not None:
+            writer.write(dict(finding, type="finding", smell="god_class"))
+            continue
+        print(f"{finding['path']}:{finding['start_lineno']}-{finding['end_lineno']}: god class {finding['name']} WMC {finding['wmc']} TCC {finding['tcc']:.2f} ATFD {finding['atfd']}")
+
+def refactor(args, thresholds, writer=None):
+    from code_metrics.ast_cache import ASTCache
+    from refactorers.refactor_long_function import plan_files
+    from scanner.repo_scan import iter_python_files
+
+    # Long functions many others depend on are split first. The trees parsed for the call graph
+    # are planned on directly when the files are refactored in this process
+    ast_cache = ASTCache(args.ast_cache_mb * 1024 * 1024)
+    graph = build_call_graph(args.scan, ast_cache=ast_cache)
+    priorities = {path: graph.function_metrics(path) for path in graph.files}
+    priorities = {path: {name: impact for name, (fan_in, fan_out, impact) in metrics.items()} for path, metrics in priorities.items()}
+    paths = iter_python_files(args.scan)
+    transaction, planned = plan_files(paths, workers=args.workers, chunksize=args.chunksize, thresholds=thresholds, priorities=priorities, ast_cache=ast_cache)
+    commits = {} if args.dry_run else {commit.path: commit for commit in transaction.commit(args.workers)}
+
+    extractions = 0
+    for path, file_extractions, error in planned:
+        error = error or getattr(commits.get(path), 'error', None)
+        extractions += len(file_extractions)
+        if writer is not None:
+            for extraction in file_extractions:
+                writer.write(dict(vars(extraction), type="refactoring", refactoring="extract_method", path=path, written=path in commits and error is None))
+            if error:
+                writer.write({"type": "error", "path": path, "error": error})
+            continue
+        for extraction in file_extractions:
+            print(f"{path}:{extraction.start_lineno}-{extraction.end_lineno}: extracted {extraction.helper} from {extraction.function}")
+        if error:
+            print(f"{path}: {error}")
+
+    if writer is None:
+        written = sum(1 for commit in commits.values() if commit.error is None)
+        print(f"Extractions: {extractions} Patches: {len(transaction)} Files Written: {written}")
+
+def run_scan(args, writer=None, cache=None, thresholds=None):
+    from code_metrics.ast_cache import ASTCache
+    from detectors.rules import load_thresholds
+    thresholds = thresholds or load_thresholds()
+    timings = None
+    if args.async_io:
+        from scanner.ingest import StageTimings
+        timings = StageTimings()
+    # One read and parse per file for every analysis of this run that runs in this process
+    ast_cache = ASTCache(args.ast_cache_mb * 1024 * 1024)
+    results = scan_results(args, cache, thresholds['long_function'], timings, ast_cache)
+    if args.god_classes:
+        from detectors.detect_god_class import GodClassDetector
+        detector = GodClassDetector()
+        results = collect_classes(results, detector)
+    if writer is not None:
+        scan_ndjson(results, writer)
+    else:
+        scan(results, cache)
+    if args.async_io:
+        print(timings, file=sys.stderr)
+    if args.duplicates:
+        duplicates(args.scan, args.min_clone_tokens, writer, ast_cache)
+    if args.dead_code:
+        dead_code(args.scan, writer, os.path.join(args.cache_dir, 'symbols.pickle') if cache is not None else None, ast_cache)
+    if args.call_graph:
+        call_graph(args.scan, writer, os.path.join(args.cache_dir, 'call_graph.pickle') if cache is not None else None, ast_cache)
+    if args.god_classes:
+        god_classes(detector, writer)
+    if writer is None and len(ast_cache):
+        stats = ast_cache.stats()
+        print(f"AST Cache Hits: {stats['hits']} Misses: {stats['misses']} Hit Rate: {stats['hit_rate']:.0%} Entries: {stats['entries']} Memory: {stats['bytes'] / 1024 / 1024:.1f} MiB")
+
+def profile_startup(argv, top=15):
+
+    # The same command again in a fresh interpreter, imports already done in this one would not show
+    import subprocess
+    import time
+    argv = [arg for arg in argv if arg != '--profile-startup']
+    code = f"import sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); from main import main; sys.exit(main(sys.argv[1:]))"
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code, *argv], stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+
+    packages = {} # top level package -> microseconds spent in its own modules
+    modules = 0
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            print(line, file=sys.stderr)
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[0].strip().isdigit():
+            continue
+        package = fields[2].strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(fields[0])
+        modules += 1
+
+    print(f"Startup: {elapsed * 1000:.1f} ms wall, {sum(packages.values()) / 1000:.1f} ms importing {modules} modules", file=sys.stderr)
+    for package, microseconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<24} {microseconds / 1000:7.1f} ms", file=sys.stderr)
+    return process.returncode
+
+def main(argv=None):
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if (args.watch or args.refactor) and not args.scan:
+        parser.error(f"{'--watch' if args.watch else '--refactor'} needs --scan PATH")
+    if args.profile_startup:
+        return profile_startup(argv if argv is not None else sys.argv[1:])
+
+    socket_path = args.socket or os.path.join(args.cache_dir, 'daemon.sock')
+    if args.query:
+        import json
+        from scanner.client import query
+        try:
+            response = query(socket_path, json.loads(args.query))
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f"no daemon listening on {socket_path}", file=sys.stderr)
+            return 1
+        print(json.dumps(response, ensure_ascii=False))
+        return
+
+    from detectors.rules import find_pyproject, load_thresholds
+    try:
+        thresholds = load_thresholds(args.config or find_pyproject(args.scan or '.'))
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if args.diff:
+        with output_writer(args) as writer:
+            diff(args.diff, writer, thresholds['long_function'])
+        return
+
+    if args.scan and args.watch:
+        import asyncio
+        from scanner.daemon import serve
+        os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+        ready = lambda store: print(f"Watching {args.scan} ({len(store.results)} files), listening on {socket_path}", file=sys.stderr)
+        asyncio.run(serve(args.scan, socket_path, args.poll_interval, thresholds['long_function'], args.workers, ready))
+        return
+
+    if args.scan and args.refactor:
+        with output_writer(args) as writer:
+            refactor(args, thresholds['long_function'], writer)
+        return
+
+    if args.scan:
+        if not args.cache:
+            with output_writer(args) as writer:
+                run_scan(args, writer, thresholds=thresholds)
+            return
+        from scanner.cache import ResultCache, TOOL_VERSION, content_hash
+        # Cached results carry the long function flags, so they are only reused under the same thresholds
+        tool_version = f"{TOOL_VERSION}+{content_hash(repr(sorted(thresholds['long_function'].items())).encode('utf-8'))}"
+        with ResultCache(args.cache_dir, args.cache_max_entries, args.cache_max_age * 24 * 60 * 60, tool_version) as cache, output_writer(args) as writer:
+            run_scan(args, writer, cache, thresholds)
+        return
+
+    # Without a command only a source checkout has something to show, the sample module next to this file
+    sample = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'code_smells.py')
+    if not os.path.isfile(sample):
+        parser.error("nothing to do, pass --scan PATH, --diff RANGE or --query JSON")
+
+    import ast
+    from code_metrics.cyclomatic import CyclomaticComplexityVisitor
+    from code_metrics.source import SourceFile, dedented
+    with SourceFile(sample) as source:
+        node = ast.parse(source.data)
+        code = dedented(source.text())
     function_length = 0
     class_length = 0
     visitor = CyclomaticComplexityVisitor()
-    visitor.source_code = dedent(code).strip()
+    visitor.source_code = code
     visitor.visit(node)
     for func in visitor.functions:
         function_length += func.mloc
-    
+
     for cls in visitor.classes:
         for method in cls.methods:
             class_length += method.mloc
-    
+
     print(visitor.functions)
     print(visitor.classes)
     print(visitor.get_total_loc())
@@ -31,4 +396,4 @@ def main():
     #astpretty.pprint(node)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,516 @@
+import ast
+import difflib
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from code_metrics.source import SourceFile
+from code_metrics.unified import UnifiedMetricsVisitor
+from detectors.detect_long_function import LongFunctionDetector
+from refactorers.transaction import Patch, RefactorTransaction
+from scanner.cache import content_hash
+from scanner.repo_scan import PARALLEL_THRESHOLD
+
+# Statements that cannot move to another function without changing control flow or scoping
+UNMOVABLE = (ast.Return, ast.Yield, ast.YieldFrom, ast.Await, ast.Global, ast.Nonlocal)
+LOOPS = (ast.For, ast.AsyncFor, ast.While)
+NESTED_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+# Scopes that may run after the statements defining them, reading the enclosing variables as they are then
+DEFERRED_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda, ast.GeneratorExp)
+COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+DECISIONS = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.comprehension, ast.BoolOp, ast.Assert, ast.match_case)
+
+class Extraction:
+
+    def __init__(self, function, helper, start_lineno, end_lineno, params, outputs):
+        self.function = function # qualified name of the function that was shortened
+        self.helper = helper # qualified name of the new function
+        self.start_lineno = start_lineno # lines moved, as they were numbered before the edit
+        self.end_lineno = end_lineno
+        self.params = params
+        self.outputs = outputs
+
+    def __repr__(self):
+        return f"Extraction({self.function} lines {self.start_lineno}-{self.end_lineno} -> {self.helper}({', '.join(self.params)}) returning {self.outputs})"
+
+
+class NameUsage(ast.NodeVisitor):
+    # Names read and bound by statements of one scope, nested scopes only contribute their reads
+
+    def __init__(self):
+        self.loads = []
+        self.stores = set()
+        self.top_level_stores = set() # bound unconditionally by the statements themselves
+        self.deletes = False
+        self.uses_locals = False
+
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Load):
+            self.loads.append(node.id)
+        elif isinstance(node.ctx, ast.Store):
+            self.stores.add(node.id)
+        else:
+            self.deletes = True
+
+    def visit_AugAssign(self, node: ast.AugAssign):
+        if isinstance(node.target, ast.Name):
+            self.loads.append(node.target.id)
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler):
+        if node.name:
+            self.stores.add(node.name)
+        self.generic_visit(node)
+
+    def visit_alias(self, node: ast.alias):
+        self.stores.add(node.asname or node.name.split('.')[0])
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Name) and node.func.id in ('locals', 'vars') and not node.args:
+            self.uses_locals = True
+        self.generic_visit(node)
+
+    def visit_nested(self, node):
+        # Only reads of the enclosing scope matter inside a nested scope
+        inner = NameUsage()
+        for child in ast.iter_child_nodes(node):
+            inner.visit(child)
+        self.loads.extend(inner.loads)
+        self.uses_locals |= inner.uses_locals
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.stores.add(node.name)
+        for child in node.decorator_list + node.args.defaults + node.args.kw_defaults:
+            if child is not None:
+                self.visit(child)
+        self.visit_nested(ast.Module(body=node.body, type_ignores=[]))
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.stores.add(node.name)
+        for child in node.decorator_list + node.bases:
+            self.visit(child)
+        self.visit_nested(ast.Module(body=node.body, type_ignores=[]))
+
+    def visit_Lambda(self, node: ast.Lambda):
+        self.visit_nested(node.body)
+
+    def visit_comprehension_node(self, node):
+        self.visit_nested(node)
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_comprehension_node
+
+    def visit_statements(self, statements):
+        for statement in statements:
+            before = set(self.stores)
+            self.visit(statement)
+            if isinstance(statement, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+                self.top_level_stores |= self.stores - before
+        return self
+
+
+def is_movable(statements):
+    # No statement may leave the function, and break/continue must stay inside a loop that moves with them
+
+    def check(node, in_loop):
+        if isinstance(node, UNMOVABLE):
+            return False
+        if isinstance(node, (ast.Break, ast.Continue)) and not in_loop:
+            return False
+        if isinstance(node, NESTED_SCOPES):
+            return True
+        return all(check(child, in_loop or isinstance(node, LOOPS)) for child in ast.iter_child_nodes(node))
+
+    return all(check(statement, False) for statement in statements)
+
+
+def binds(target, name):
+    return any(isinstance(node, ast.Name) and node.id == name for node in ast.walk(target))
+
+
+def reads_unbound(node, name):
+    # Whether node can read name before binding it itself, a loop variable is bound inside its loop body
+    if isinstance(node, ast.Name):
+        return node.id == name and isinstance(node.ctx, ast.Load)
+    if isinstance(node, ast.AugAssign) and binds(node.target, name):
+        return True
+    if isinstance(node, (ast.For, ast.AsyncFor)) and binds(node.target, name):
+        return any(reads_unbound(child, name) for child in [node.iter] + node.orelse)
+    if isinstance(node, COMPREHENSIONS) and any(binds(generator.target, name) for generator in node.generators):
+        return reads_unbound(node.generators[0].iter, name)
+    return any(reads_unbound(child, name) for child in ast.iter_child_nodes(node))
+
+
+def reads_before_binding(statements, name):
+    for statement in statements:
+        if reads_unbound(statement, name):
+            return True
+        if name in NameUsage().visit_statements([statement]).top_level_stores:
+            return False
+    return False
+
+
+def first_lineno(statement):
+    # A decorated definition starts at its first decorator
+    return min([decorator.lineno for decorator in getattr(statement, 'decorator_list', ())] + [statement.lineno])
+
+
+def weight(statement):
+    # Lines plus decision points, what moving the statement takes off the function's mloc and complexity
+    decisions = sum(isinstance(node, DECISIONS) for node in ast.walk(statement))
+    return statement.end_lineno - first_lineno(statement) + 1 + decisions
+
+
+def captured_names(statements):
+    # Enclosing variables read by closures, lambdas and generators the statements create, None if they assign them
+    names = set()
+    for node in (node for statement in statements for node in ast.walk(statement)):
+        if isinstance(node, DEFERRED_SCOPES):
+            if any(isinstance(inner, ast.Nonlocal) for inner in ast.walk(node)):
+                return None
+            usage = NameUsage()
+            usage.visit(node)
+            names.update(usage.loads)
+    return names
+
+
+def declared_names(node):
+    # Names the function itself declares global or nonlocal, a helper would bind them as its own locals
+    names = set()
+    stack = list(node.body)
+    while stack:
+        child = stack.pop()
+        if isinstance(child, (ast.Global, ast.Nonlocal)):
+            names.update(child.names)
+        elif not isinstance(child, NESTED_SCOPES):
+            stack.extend(ast.iter_child_nodes(child))
+    return names
+
+
+def is_docstring(statement):
+    return isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant) and isinstance(statement.value.value, str)
+
+
+def shift(functions, delta):
+    for func in functions:
+        func.start_lineno += delta
+        func.end_lineno += delta
+        shift(func.closures, delta)
+
+
+class LongFunctionRefactorer:
+    """
+    Extract Method for the functions LongFunctionDetector flags. A run of statements from the
+    body moves to a new function placed right after it, at the same indentation, so the moved
+    lines are copied verbatim with their comments. After each edit only the rewritten region is
+    parsed and visited again, its Function records replace the old ones and everything below is
+    shifted by the change in line count.
+    """
+
+    def __init__(self, source, detector=None, max_params=5, max_outputs=2, tree=None):
+        self.lines = source.splitlines(keepends=True)
+        if self.lines and not self.lines[-1].endswith('\n'):
+            self.lines[-1] += '\n'
+        self.original = list(self.lines)
+        self.detector = detector if detector is not None else LongFunctionDetector()
+        self.max_params = max_params
+        self.max_outputs = max_outputs
+        self.extractions = []
+        self.regions_analysed = 0
+
+        visitor = UnifiedMetricsVisitor(source)
+        visitor.visit(tree if tree is not None else ast.parse(source))
+        self.functions = visitor.functions # module level functions
+        self.classes = visitor.classes
+
+    @classmethod
+    def from_file(cls, path, detector=None, ast_cache=None, **kwargs):
+        if ast_cache is not None:
+            entry = ast_cache.get(path)
+            return cls(entry.source.decode('utf-8'), detector, tree=entry.tree, **kwargs)
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(file.read(), detector, **kwargs)
+
+    @property
+    def source(self):
+        return ''.join(self.lines)
+
+    def patches(self, path):
+        # Everything changed so far as Patch objects against the original numbering
+        matcher = difflib.SequenceMatcher(None, self.original, self.lines, autojunk=False)
+        return [
+            Patch(path, i1 + 1, i2, self.lines[j1:j2])
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+            if tag != 'equal'
+        ]
+
+    def iter_functions(self):
+        # (function, owning class or None) for every function that can be refactored
+        for func in self.functions:
+            yield func, None
+        for cls in self.classes:
+            for method in cls.methods:
+                yield method, cls
+
+    def long_functions(self):
+        return [(func, cls) for func, cls in self.iter_functions() if self.detector.is_long_function(func)]
+
+    def decorators(self, func):
+        decorators = []
+        lineno = func.start_lineno - 1
+        while lineno > 0 and self.lines[lineno - 1].lstrip().startswith('@'):
+            decorators.append(self.lines[lineno - 1].strip())
+            lineno -= 1
+        return decorators
+
+    def parse_region(self, start_lineno, end_lineno, cls=None):
+        # Parses lines start..end on their own, they keep their indentation under a stand-in header:
+        # a class for methods, an if for functions nested in a module level if, try or with
+        header = ""
+        if cls is not None:
+            header = f"class {cls.name}:\n"
+        elif self.lines[start_lineno - 1][:1].isspace():
+            header = "if True:\n"
+        source = header + ''.join(self.lines[start_lineno - 1:end_lineno])
+        tree = ast.parse(source)
+        offset = start_lineno - 1 - bool(header)
+        return source, tree, offset
+
+    def function_node(self, func, cls):
+        source, tree, offset = self.parse_region(func.start_lineno, func.end_lineno, cls)
+        node = tree.body[0]
+        if isinstance(node, (ast.ClassDef, ast.If)):
+            node = node.body[0]
+        ast.increment_lineno(node, offset)
+        return node
+
+    def plan(self, func, cls):
+        # Best run of body statements to move: as balanced as possible, few parameters and results
+        decorators = self.decorators(func)
+        if cls is not None and (not func.is_method or '@staticmethod' in decorators):
+            return None
+
+        node = self.function_node(func, cls)
+        body = node.body[1:] if is_docstring(node.body[0]) else node.body
+        if not body or body[0].lineno == node.lineno:
+            return None
+        args = node.args
+        params = {arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs}
+        params.update(arg.arg for arg in (args.vararg, args.kwarg) if arg is not None)
+        self_name = args.args[0].arg if cls is not None and args.args else None
+        declared = declared_names(node)
+
+        total = sum(map(weight, body))
+        best = None
+        for first in range(len(body)):
+            # Statements sharing a line with a neighbour cannot be cut apart
+            if first and body[first - 1].end_lineno >= first_lineno(body[first]):
+                continue
+            before = NameUsage().visit_statements(body[:first])
+            bound_before = params | before.stores
+            definitely_bound = params | before.top_level_stores
+            for last in range(first + 1, len(body) + 1):
+                if last < len(body) and body[last - 1].end_lineno >= first_lineno(body[last]):
+                    continue
+                if first == 0 and last == len(body):
+                    continue
+                candidate = self.candidate(body, first, last, bound_before, definitely_bound, self_name, declared)
+                if candidate is None:
+                    continue
+                moved = sum(map(weight, body[first:last]))
+                score = (min(moved, total - moved), -len(candidate[0]) - len(candidate[1]))
+                if best is None or score > best[0]:
+                    best = (score, body[first], body[last - 1], candidate)
+
+        if best is None:
+            return None
+        score, first, last, (inputs, outputs) = best
+        return node, first, last, inputs, outputs, self_name, decorators
+
+    def candidate(self, body, first, last, bound_before, definitely_bound, self_name, declared=frozenset()):
+        statements = body[first:last]
+        # A single simple line would only be swapped for the line calling it
+        if sum(map(weight, statements)) < 2 or not is_movable(statements):
+            return None
+        usage = NameUsage().visit_statements(statements)
+        if usage.deletes or usage.uses_locals:
+            return None
+        # Global and nonlocal names are left to the function that declares them
+        if declared & (set(usage.loads) | usage.stores):
+            return None
+
+        after = NameUsage().visit_statements(body[last:])
+        # A closure moved into the helper would no longer see the caller rebind what it captured
+        captured = captured_names(statements)
+        if captured is None or captured & after.stores:
+            return None
+        inputs = []
+        for name in usage.loads:
+            if name in bound_before and name != self_name and name not in inputs and reads_before_binding(statements, name):
+                inputs.append(name)
+        outputs = sorted(name for name in usage.stores if name in after.loads)
+
+        # A name bound on some paths only could be passed or returned unbound
+        if any(name not in definitely_bound for name in inputs) or any(name not in usage.top_level_stores for name in outputs):
+            return None
+        if len(inputs) > self.max_params or len(outputs) > self.max_outputs:
+            return None
+        return inputs, outputs
+
+    def helper_name(self, func):
+        source = self.source
+        index = 1
+        while re.search(rf"\b{func.name}_part{index}\b", source):
+            index += 1
+        return f"{func.name}_part{index}"
+
+    def extract(self, func, cls=None):
+        planned = self.plan(func, cls)
+        if planned is None:
+            return None
+        node, first, last, inputs, outputs, self_name, decorators = planned
+
+        name = self.helper_name(func)
+        start_lineno = first_lineno(first)
+        def_indent = self.lines[func.start_lineno - 1][:node.col_offset]
+        body_indent = self.lines[start_lineno - 1][:first.col_offset]
+
+        params = ([self_name] if self_name else []) + inputs
+        receiver = f"{self_name}." if self_name else ""
+        target = f"{', '.join(outputs)} = " if outputs else ""
+        call = f"{body_indent}{target}{receiver}{name}({', '.join(inputs)})\n"
+
+        helper = [f"{def_indent}{decorator}\n" for decorator in decorators if decorator == '@classmethod']
+        helper.append(f"{def_indent}def {name}({', '.join(params)}):\n")
+        helper.extend(self.lines[start_lineno - 1:last.end_lineno])
+        if outputs:
+            helper.append(f"{body_indent}return {', '.join(outputs)}\n")
+
+        region = (
+            self.lines[func.start_lineno - 1:start_lineno - 1]
+            + [call]
+            + self.lines[last.end_lineno:func.end_lineno]
+            + ["\n"] * (1 if cls is not None else 2)
+            + helper
+        )
+        old_length = func.end_lineno - func.start_lineno + 1
+        lines = list(self.lines)
+        self.lines[func.start_lineno - 1:func.end_lineno] = region
+
+        extraction = Extraction(
+            func.get_name(),
+            f"{cls.name}.{name}" if cls is not None else name,
+            start_lineno,
+            last.end_lineno,
+            inputs,
+            outputs
+        )
+        try:
+            self.reanalyse(func, cls, len(region) - old_length)
+        except (SyntaxError, ValueError):
+            # The records are only replaced once the region parses, the lines are all there is to undo
+            self.lines = lines
+            raise
+        self.extractions.append(extraction)
+        return extraction
+
+    def reanalyse(self, func, cls, delta):
+        # Visits only the rewritten region and splices its functions in place of the old record
+
+        start = func.start_lineno
+        end = func.end_lineno + delta
+        source, tree, offset = self.parse_region(start, end, cls)
+        visitor = UnifiedMetricsVisitor(source)
+        visitor.visit(tree)
+        updated = visitor.classes[0].methods if cls is not None else visitor.functions
+        shift(updated, offset)
+        self.regions_analysed += 1
+
+        siblings = cls.methods if cls is not None else self.functions
+        index = siblings.index(func)
+        siblings[index:index + 1] = updated
+        shift(siblings[index + len(updated):], delta)
+
+        if cls is not None:
+            cls.end_lineno += delta
+            cls.complexity += sum(method.complexity for method in updated) - func.complexity
+            cls.mloc += sum(method.mloc for method in updated) - func.mloc
+            # The class totals would need the whole class body again
+            cls.halstead = None
+
+        for other in self.functions if cls is not None else ():
+            if other.start_lineno > func.start_lineno:
+                shift([other], delta)
+        for other in self.classes:
+            if other.start_lineno > func.start_lineno:
+                other.start_lineno += delta
+                other.end_lineno += delta
+                shift(other.methods, delta)
+
+    def refactor(self, max_extractions=50, key=None):
+        # Extracts until no long function is left that can be split any further, key(func) orders the long functions
+
+        stuck = set()
+        while len(self.extractions) < max_extractions:
+            candidates = [(func, cls) for func, cls in self.long_functions() if func.get_name() not in stuck]
+            if not candidates:
+                break
+            if key is not None:
+                candidates.sort(key=lambda candidate: key(candidate[0]))
+            func, cls = candidates[0]
+            try:
+                extraction = self.extract(func, cls)
+            except (SyntaxError, ValueError, IndexError):
+                # A function this refactorer cannot parse or rewrite on its own is left as it is
+                extraction = None
+            if extraction is None:
+                stuck.add(func.get_name())
+        return self.extractions
+
+
+def plan_file(path, priorities=None, thresholds=None, max_extractions=50, ast_cache=None):
+    # (path, digest, patches, extractions, error), planned without touching the file
+    # priorities maps function names to a rank, higher ranked long functions are split first
+    try:
+        if ast_cache is not None:
+            entry = ast_cache.get(path)
+            digest = entry.digest
+            refactorer = LongFunctionRefactorer(entry.source.decode('utf-8'), LongFunctionDetector(thresholds), tree=entry.tree)
+        else:
+            with SourceFile(path) as source:
+                digest = content_hash(source.data)
+                refactorer = LongFunctionRefactorer(source.text(), LongFunctionDetector(thresholds))
+    except (OSError, UnicodeDecodeError, SyntaxError, ValueError) as error:
+        return path, None, [], [], f"{type(error).__name__}: {error}"
+    key = None
+    if priorities:
+        key = lambda func: -priorities.get(func.get_name(), 0)
+    extractions = refactorer.refactor(max_extractions, key)
+    return path, digest, refactorer.patches(path), extractions, None
+
+
+def iter_plans(paths, workers=None, chunksize=16, thresholds=None, max_extractions=50, priorities=None, ast_cache=None):
+
+    plan = partial(plan_file, thresholds=thresholds, max_extractions=max_extractions)
+    paths = list(paths)
+    # Each file only gets the ranks of its own functions
+    ranks = [priorities.get(path) if priorities else None for path in paths]
+    # Like the scan, a few files are planned in-process, on the trees already in ast_cache
+    if workers == 1 or len(paths) < PARALLEL_THRESHOLD:
+        yield from map(partial(plan, ast_cache=ast_cache), paths, ranks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(plan, paths, ranks, chunksize=chunksize)
+
+
+def plan_files(paths, workers=None, chunksize=16, thresholds=None, max_extractions=50, priorities=None, ast_cache=None):
+    # Refactors every file in memory, in parallel, and collects the edits in one RefactorTransaction
+    # priorities is {path: {function name: rank}}, e.g. the impact of each function in the call graph
+
+    transaction = RefactorTransaction()
+    planned = [] # (path, extractions, error)
+    for path, digest, patches, extractions, error in iter_plans(paths, workers, chunksize, thresholds, max_extractions, priorities, ast_cache):
+        transaction.extend(patches, digest)
+        planned.append((path, extractions, error))
+    return transaction, planned
@@ -0,0 +1,124 @@
+import contextlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from scanner.cache import content_hash
+
+class Patch:
+
+    __slots__ = ('path', 'start_lineno', 'end_lineno', 'lines')
+
+    def __init__(self, path, start_lineno, end_lineno, lines):
+        self.path = path
+        self.start_lineno = start_lineno # first line replaced
+        self.end_lineno = end_lineno # last line replaced, start_lineno - 1 inserts before start_lineno
+        self.lines = lines # replacement lines, with their line endings
+
+    def overlaps(self, other):
+        # other starts at or after self, two inserts at the same line could go in either order
+        if (other.start_lineno, other.end_lineno) == (self.start_lineno, self.end_lineno):
+            return True
+        return other.start_lineno <= self.end_lineno
+
+    def __repr__(self):
+        return f"Patch({self.path}:{self.start_lineno}-{self.end_lineno}, {len(self.lines)} lines)"
+
+
+def apply_patches(lines, patches):
+    # Applies non-overlapping patches numbered against lines in one pass
+    result = []
+    lineno = 1
+    for patch in sorted(patches, key=lambda patch: (patch.start_lineno, patch.end_lineno)):
+        result.extend(lines[lineno - 1:patch.start_lineno - 1])
+        result.extend(patch.lines)
+        lineno = patch.end_lineno + 1
+    result.extend(lines[lineno - 1:])
+    return result
+
+
+def write_atomic(path, data):
+    # Readers see the old file or the new one, never a partial write
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+
+
+class FileCommit:
+
+    def __init__(self, path, patches, error=None):
+        self.path = path
+        self.patches = patches # number of patches written
+        self.error = error
+
+    def __repr__(self):
+        return f"FileCommit({self.path}, patches={self.patches}, error={self.error})"
+
+
+class RefactorTransaction:
+    """
+    Edits planned by any number of refactorings, collected per file as line range patches
+    against the file as it was read. commit() checks that no two patches of a file overlap,
+    applies them in one pass and writes every file once, atomically. A file changed on disk
+    since it was planned is left alone.
+    """
+
+    def __init__(self):
+        self.patches = {} # path -> [Patch]
+        self.digests = {} # path -> content hash the patches were planned against
+
+    def add(self, patch, digest=None):
+        self.patches.setdefault(patch.path, []).append(patch)
+        if digest is not None:
+            if self.digests.setdefault(patch.path, digest) != digest:
+                raise ValueError(f"{patch.path}: patches planned against different versions of the file")
+
+    def extend(self, patches, digest=None):
+        for patch in patches:
+            self.add(patch, digest)
+
+    def conflicts(self, path):
+        # Pairs of overlapping patches of path
+        patches = sorted(self.patches.get(path, ()), key=lambda patch: (patch.start_lineno, patch.end_lineno))
+        return [(first, second) for first, second in zip(patches, patches[1:]) if first.overlaps(second)]
+
+    def check(self):
+        for path in self.patches:
+            conflicts = self.conflicts(path)
+            if conflicts:
+                first, second = conflicts[0]
+                raise ValueError(f"{path}: overlapping patches {first} and {second}")
+
+    def commit_file(self, path):
+        patches = self.patches[path]
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            if path in self.digests and content_hash(data) != self.digests[path]:
+                return FileCommit(path, 0, "file changed since the patches were planned")
+            lines = data.decode('utf-8').splitlines(keepends=True)
+            write_atomic(path, ''.join(apply_patches(lines, patches)).encode('utf-8'))
+        except (OSError, UnicodeDecodeError) as error:
+            return FileCommit(path, 0, f"{type(error).__name__}: {error}")
+        return FileCommit(path, len(patches))
+
+    def commit(self, workers=None):
+        # Files are independent, writing them is I/O bound so threads are enough
+        self.check()
+        if workers == 1:
+            return [self.commit_file(path) for path in self.patches]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.commit_file, self.patches))
+
+    def __len__(self):
+        return sum(map(len, self.patches.values()))
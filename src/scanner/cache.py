@@ -0,0 +1,97 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+
+# Bump whenever metrics or detector output change so stale results are never served
+TOOL_VERSION = "0.1.3"
+CACHE_DIR = '.refactor_cache'
+
+def content_hash(data: bytes):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, directory=CACHE_DIR, max_entries=200_000, max_age=30 * 24 * 60 * 60, tool_version=TOOL_VERSION):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age # seconds since an entry was last used
+        self.tool_version = tool_version
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'results.sqlite'))
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, result BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def key(self, digest):
+        return f"{self.tool_version}:{digest}"
+
+    def get(self, digest, path=None):
+        key = self.key(digest)
+        row = self.connection.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        result = pickle.loads(row[0])
+        # Identical content may live at several paths, every record of the result is moved to this one
+        if path is not None and path != result.path:
+            result.relocate(path)
+        return result
+
+    def put(self, digest, result):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results (key, result, last_used) VALUES (?, ?, ?)",
+            (self.key(digest), pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), time.time())
+        )
+
+    def evict(self, now=None):
+        now = time.time() if now is None else now
+        evicted = self.connection.execute(
+            "DELETE FROM results WHERE last_used < ? OR key NOT LIKE ?",
+            (now - self.max_age, f"{self.tool_version}:%")
+        ).rowcount
+
+        count = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            evicted += self.connection.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+
+        self.evicted += evicted
+        return evicted
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evicted": self.evicted,
+            "entries": len(self),
+        }
+
+    def close(self):
+        self.evict()
+        self.connection.commit()
+        self.connection.close()
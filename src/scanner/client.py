@@ -0,0 +1,16 @@
+import json
+import socket
+
+def query(socket_path, request, timeout=10.0):
+    # One request to a running --watch daemon, blocking and without asyncio so the client starts fast
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        response = bytearray()
+        while not response.endswith(b'\n'):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    return json.loads(response)
@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+from heapq import nlargest
+from scanner.ndjson import class_record, finding_records, function_record, result_records
+from scanner.repo_scan import analyse_files, iter_python_files
+
+# Function columns the top query can rank by
+RANKED_FIELDS = ('complexity', 'mloc', 'num_params', 'num_localvar', 'branches')
+
+class MetricsStore:
+    """
+    FileResult of every Python file under root, kept in memory. changes() compares the mtime and
+    size of every file with the last poll, only files that differ are analysed again. Rankings
+    are computed once per version of the store, so repeated queries cost a slice.
+    """
+
+    def __init__(self, root, thresholds=None, workers=None):
+        self.root = root
+        self.thresholds = thresholds
+        self.workers = workers
+        self.results = {} # path -> FileResult
+        self.stats = {} # path -> (mtime_ns, size) the result was computed from
+        self.version = 0
+        self.rankings = {} # field -> functions by descending field, for the current version
+        self.analysed = 0
+        self.updated = None
+
+    def changes(self):
+        # (changed paths, removed paths, stats of every file)
+        stats = {}
+        changed = []
+        for path in iter_python_files(self.root):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (stat.st_mtime_ns, stat.st_size)
+            if self.stats.get(path) != stats[path]:
+                changed.append(path)
+        removed = [path for path in self.stats if path not in stats]
+        return changed, removed, stats
+
+    def analyse(self, paths):
+        return list(analyse_files(paths, self.workers, thresholds=self.thresholds))
+
+    def apply(self, results, removed, stats):
+        for path in removed:
+            self.results.pop(path, None)
+            self.stats.pop(path, None)
+        for result in results:
+            self.results[result.path] = result
+            self.stats[result.path] = stats[result.path]
+        self.analysed += len(results)
+        if results or removed:
+            self.version += 1
+            self.rankings = {}
+        self.updated = time.time()
+
+    def poll(self):
+        # Brings the store up to date in the calling thread, returns the number of files changed or removed
+        changed, removed, stats = self.changes()
+        self.apply(self.analyse(changed), removed, stats)
+        return len(changed) + len(removed)
+
+    def ranking(self, field):
+        ranking = self.rankings.get(field)
+        if ranking is None:
+            functions = [(result.path, func) for result in self.results.values() for func in result.functions]
+            ranking = self.rankings[field] = sorted(functions, key=lambda item: getattr(item[1], field), reverse=True)
+        return ranking
+
+    def find(self, path):
+        # Paths may be given relative to the working directory of the client
+        result = self.results.get(path)
+        if result is None:
+            absolute = os.path.abspath(path)
+            result = next((result for stored, result in self.results.items() if os.path.abspath(stored) == absolute), None)
+        return result
+
+    def query(self, request):
+        kind = request.get('query')
+        if kind == 'ping':
+            return {"ok": True, "version": self.version}
+        if kind == 'stats':
+            return {
+                "files": len(self.results),
+                "functions": sum(len(result.functions) for result in self.results.values()),
+                "long_functions": sum(len(result.long_functions) for result in self.results.values()),
+                "errors": sum(1 for result in self.results.values() if result.error),
+                "analysed": self.analysed,
+                "version": self.version,
+                "updated": self.updated,
+            }
+        if kind == 'top':
+            field = request.get('metric', 'complexity')
+            if field not in RANKED_FIELDS:
+                return {"error": f"unknown metric '{field}', expected one of {', '.join(RANKED_FIELDS)}"}
+            n = int(request.get('n', 20))
+            return {"functions": [function_record(path, func) for path, func in self.ranking(field)[:n]]}
+        if kind == 'file':
+            result = self.find(request.get('path', ''))
+            if result is None:
+                return {"error": f"no results for {request.get('path')}"}
+            return {"records": list(result_records(result))}
+        if kind == 'findings':
+            path = request.get('path')
+            results = [self.find(path)] if path else self.results.values()
+            return {"findings": [finding for result in results if result is not None for finding in finding_records(result)]}
+        if kind == 'classes':
+            n = int(request.get('n', 20))
+            classes = [(result.path, cls) for result in self.results.values() for cls in result.classes]
+            return {"classes": [class_record(path, cls) for path, cls in nlargest(n, classes, key=lambda item: item[1].complexity)]}
+        return {"error": f"unknown query '{kind}'"}
+
+
+def claim_socket(path):
+    # A socket file nobody listens on is left over from a daemon that died
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)
+            return
+    raise RuntimeError(f"a daemon is already listening on {path}")
+
+
+async def serve(root, socket_path, interval=1.0, thresholds=None, workers=None, ready=None):
+    """
+    Analyses root, then answers queries on a Unix socket while polling for changed files every
+    interval seconds. Requests and responses are one JSON object per line. Analysis runs on a
+    thread, results are applied on the event loop, so a query never sees a half updated store.
+    Returns when a shutdown query arrives.
+    """
+
+    loop = asyncio.get_running_loop()
+    store = MetricsStore(root, thresholds, workers)
+    stopped = asyncio.Event()
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+
+    async def refresh():
+        changed, removed, stats = await loop.run_in_executor(None, store.changes)
+        if changed or removed:
+            results = await loop.run_in_executor(None, store.analyse, changed)
+            store.apply(results, removed, stats)
+
+    async def watch():
+        # A failed refresh, e.g. a file removed while it was read, is reported and tried again on the next poll
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await refresh()
+            except Exception as error:
+                print(f"refreshing {root} failed: {type(error).__name__}: {error}", file=sys.stderr)
+
+    async def handle(reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    response = store.query(request) if request.get('query') != 'shutdown' else {"ok": True}
+                except (ValueError, AttributeError, TypeError) as error:
+                    request, response = {}, {"error": f"invalid request: {error}"}
+                writer.write(encoder.encode(response).encode('utf-8') + b'\n')
+                await writer.drain()
+                if request.get('query') == 'shutdown':
+                    stopped.set()
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    claim_socket(socket_path)
+    await refresh()
+    server = await asyncio.start_unix_server(handle, socket_path)
+    watcher = asyncio.create_task(watch())
+    try:
+        if ready is not None:
+            ready(store)
+        await stopped.wait()
+    finally:
+        watcher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await watcher
+        server.close()
+        await server.wait_closed()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+    return store
@@ -0,0 +1,174 @@
+import ast
+import os
+import re
+import subprocess
+from code_metrics.source import PARSE_ERRORS
+from code_metrics.unified import UnifiedMetricsVisitor
+from detectors.detect_long_function import LongFunctionDetector
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+C_ESCAPES = {'a': 7, 'b': 8, 't': 9, 'n': 10, 'v': 11, 'f': 12, 'r': 13, '"': 34, '\\': 92}
+
+class FunctionChange:
+
+    def __init__(self, path, func, before, long_function):
+        self.path = path
+        self.name = func.get_name()
+        self.start_lineno = func.start_lineno
+        self.end_lineno = func.end_lineno
+        self.complexity = func.complexity
+        self.mloc = func.mloc
+        self.before_complexity = before.complexity if before is not None else None
+        self.before_mloc = before.mloc if before is not None else None
+        self.long_function = long_function
+
+    @property
+    def is_new(self):
+        return self.before_complexity is None
+
+    @property
+    def complexity_delta(self):
+        return self.complexity - (self.before_complexity or 0)
+
+    @property
+    def mloc_delta(self):
+        return self.mloc - (self.before_mloc or 0)
+
+    def __repr__(self):
+        return f"FunctionChange({self.path}:{self.start_lineno}-{self.end_lineno} {self.name} complexity={self.complexity} ({self.complexity_delta:+}) mloc={self.mloc} ({self.mloc_delta:+}))"
+
+
+def run_git(args, cwd='.'):
+    return subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=True).stdout
+
+
+def resolve_revisions(rev_range, cwd='.'):
+    # 'A..B' compares two commits, 'A...B' compares B against the merge base, 'A' compares A against the working tree
+    if '...' in rev_range:
+        start, end = rev_range.split('...', 1)
+        start = run_git(['merge-base', start or 'HEAD', end or 'HEAD'], cwd).strip()
+        return start, end or 'HEAD'
+    if '..' in rev_range:
+        start, end = rev_range.split('..', 1)
+        return start or 'HEAD', end or 'HEAD'
+    return rev_range, None
+
+
+def unquote_path(path):
+    # git quotes paths with special or non-ASCII characters C-style, octal escapes are the bytes of the name
+    if not (len(path) > 1 and path.startswith('"') and path.endswith('"')):
+        return path
+    name = bytearray()
+    quoted = path[1:-1]
+    index = 0
+    while index < len(quoted):
+        char = quoted[index]
+        if char != '\\':
+            name.extend(char.encode('utf-8'))
+            index += 1
+        elif quoted[index + 1] in '01234567':
+            name.append(int(quoted[index + 1:index + 4], 8))
+            index += 4
+        else:
+            name.append(C_ESCAPES[quoted[index + 1]])
+            index += 2
+    return os.fsdecode(bytes(name))
+
+
+def changed_files(start, end=None, cwd='.'):
+    # Returns {path: (old_path, [(first_lineno, last_lineno), ...])} for the new side of every changed .py
+    # file, old_path is where the file was in start, None for added files
+
+    # Without prefixes the paths do not depend on the diff.noprefix and diff.mnemonicPrefix settings
+    args = ['diff', '--unified=0', '--no-color', '--no-ext-diff', '--no-prefix', '--find-renames', start]
+    if end is not None:
+        args.append(end)
+    args.extend(['--', '*.py'])
+
+    files = {}
+    path = old_path = None
+    in_header = False
+    for line in run_git(args, cwd).splitlines():
+        # Removed and added lines can start with '--- ' and '+++ ' too, file names are only read in the header
+        if line.startswith('diff --git '):
+            in_header = True
+            continue
+        if in_header and line.startswith('--- '):
+            source = line[4:].rstrip('\t')
+            old_path = None if source == '/dev/null' else unquote_path(source)
+            continue
+        if in_header and line.startswith('+++ '):
+            in_header = False
+            target = line[4:].rstrip('\t')
+            path = None if target == '/dev/null' else unquote_path(target)
+            if path is not None:
+                files.setdefault(path, (old_path, []))
+            continue
+        match = HUNK_HEADER.match(line)
+        if match and path is not None:
+            first = int(match.group(3))
+            count = int(match.group(4)) if match.group(4) is not None else 1
+            if count == 0:
+                # A pure deletion touches the line before it, or the first line when it is at the top
+                first = max(first, 1)
+                files[path][1].append((first, first))
+            else:
+                files[path][1].append((first, first + count - 1))
+
+    return files
+
+
+def changed_hunks(start, end=None, cwd='.'):
+    # Returns {path: [(first_lineno, last_lineno), ...]} for the new side of every changed .py file
+    return {path: ranges for path, (old_path, ranges) in changed_files(start, end, cwd).items()}
+
+
+def read_revision(path, revision, cwd='.'):
+    if revision is None:
+        try:
+            with open(os.path.join(cwd, path), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+    try:
+        return subprocess.run(['git', 'show', f'{revision}:{path}'], cwd=cwd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError:
+        return None
+
+
+def collect_functions(source):
+    if source is None:
+        return []
+    try:
+        node = ast.parse(source)
+    except PARSE_ERRORS:
+        return []
+    visitor = UnifiedMetricsVisitor()
+    visitor.visit(node)
+    functions = list(visitor.functions)
+    for cls in visitor.classes:
+        functions.extend(cls.methods)
+    return functions
+
+
+def overlaps(func, ranges):
+    return any(func.start_lineno <= last and first <= func.end_lineno for first, last in ranges)
+
+
+def diff_functions(rev_range, cwd='.', thresholds=None):
+
+    cwd = run_git(['rev-parse', '--show-toplevel'], cwd).strip()
+    start, end = resolve_revisions(rev_range, cwd)
+    long_func_detector = LongFunctionDetector(thresholds)
+
+    for path, (old_path, ranges) in changed_files(start, end, cwd).items():
+        functions = [func for func in collect_functions(read_revision(path, end, cwd)) if overlaps(func, ranges)]
+        if not functions:
+            continue
+
+        # Only files with touched functions pay for parsing the old revision, renamed files are read at their old path
+        before = {}
+        if old_path is not None:
+            before = {func.get_name(): func for func in collect_functions(read_revision(old_path, start, cwd))}
+        for func in functions:
+            yield FunctionChange(path, func, before.get(func.get_name()), long_func_detector.is_long_function(func))
@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from scanner.cache import content_hash
+from scanner.repo_scan import analyse_source, error_result, iter_python_files
+
+class StageTimings:
+    """
+    Wall-clock seconds spent in each stage of the ingestion pipeline. Waits show where the
+    pipeline is bound: readers blocked on a full queue mean analysis is the bottleneck,
+    analysers waiting on an empty queue mean the disk is.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes_read = 0
+        self.cache_hits = 0
+        self.read = 0.0 # summed over all readers
+        self.read_wait = 0.0 # readers blocked on a full queue
+        self.analyse = 0.0 # summed over all analysers, including transfer to and from workers
+        self.analyse_wait = 0.0 # analysers waiting for a file to be read
+        self.max_queued = 0
+        self.wall = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __repr__(self):
+        return (
+            f"StageTimings(files={self.files} read={self.read:.3f}s read_wait={self.read_wait:.3f}s "
+            f"analyse={self.analyse:.3f}s analyse_wait={self.analyse_wait:.3f}s max_queued={self.max_queued} wall={self.wall:.3f}s)"
+        )
+
+
+def read_source(path):
+    # Runs in a reader thread, hashing there keeps the event loop free
+    with open(path, 'rb') as file:
+        data = file.read()
+    return data, content_hash(data)
+
+
+async def ingest(paths, workers=None, read_concurrency=16, queue_size=64, cache=None, thresholds=None, timings=None):
+    """
+    Reads files on a thread pool and analyses them on a process pool at the same time. At most
+    queue_size read files wait for analysis, readers block once it is full. Results are yielded
+    in completion order.
+    """
+
+    loop = asyncio.get_running_loop()
+    timings = timings if timings is not None else StageTimings()
+    analysers = workers or os.cpu_count() or 1
+    paths = iter(paths)
+    queue = asyncio.Queue(queue_size)
+    results = asyncio.Queue()
+    started = time.perf_counter()
+
+    async def read_stage(readers):
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                data, digest = await loop.run_in_executor(readers, read_source, path)
+            except OSError as error:
+                timings.read += time.perf_counter() - start
+                await results.put(error_result(path, error))
+                continue
+            timings.read += time.perf_counter() - start
+            timings.bytes_read += len(data)
+
+            # Unchanged files are answered from the cache and never reach the analysers
+            result = cache.get(digest, path) if cache is not None else None
+            if result is not None:
+                timings.cache_hits += 1
+                await results.put(result)
+                continue
+
+            start = time.perf_counter()
+            await queue.put((path, data, digest))
+            timings.read_wait += time.perf_counter() - start
+            timings.max_queued = max(timings.max_queued, queue.qsize())
+
+    async def analyse_stage(executor):
+        while True:
+            start = time.perf_counter()
+            item = await queue.get()
+            timings.analyse_wait += time.perf_counter() - start
+            if item is None:
+                break
+
+            path, data, digest = item
+            start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(executor, analyse_source, path, data, thresholds, digest)
+            except Exception as error:
+                # One file failing to analyse is reported like an unreadable one, the others carry on
+                result = error_result(path, error)
+            timings.analyse += time.perf_counter() - start
+            if cache is not None and result.digest is not None:
+                cache.put(result.digest, result)
+            await results.put(result)
+
+    async def run(readers, executor):
+        # Always ends the results with None, or with the exception that stopped the pipeline
+        analyse_tasks = [asyncio.create_task(analyse_stage(executor)) for _ in range(analysers)]
+        end = None
+        try:
+            await asyncio.gather(*(read_stage(readers) for _ in range(read_concurrency)))
+            for _ in analyse_tasks:
+                await queue.put(None)
+            await asyncio.gather(*analyse_tasks)
+        except Exception as error:
+            end = error
+        finally:
+            for task in analyse_tasks:
+                task.cancel()
+            results.put_nowait(end)
+
+    # A single worker analyses on a thread, parsing holds the GIL but reads still overlap with it
+    executor = ThreadPoolExecutor(1) if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    with ThreadPoolExecutor(read_concurrency) as readers, executor:
+        runner = asyncio.create_task(run(readers, executor))
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                if isinstance(result, Exception):
+                    raise result
+                timings.files += 1
+                yield result
+            await runner
+        finally:
+            # When the consumer stops early no more files are read or analysed
+            runner.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await runner
+            timings.wall = time.perf_counter() - started
+
+
+def scan_repository_async(root, workers=None, read_concurrency=16, queue_size=64, cache=None, thresholds=None, timings=None):
+    # Synchronous front end of ingest(), drop-in for scan_repository
+
+    loop = asyncio.new_event_loop()
+    results = ingest(iter_python_files(root), workers, read_concurrency, queue_size, cache, thresholds, timings)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(results))
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.close()
@@ -0,0 +1,104 @@
+import json
+import sys
+
+FUNCTION_FIELDS = ('start_lineno', 'end_lineno', 'is_method', 'belongs_to', 'complexity', 'mloc', 'num_params', 'num_localvar', 'branches')
+CLASS_FIELDS = ('start_lineno', 'end_lineno', 'complexity', 'mloc')
+
+def function_record(path, func):
+    record = {"type": "function", "path": path, "name": func.get_name()}
+    for field in FUNCTION_FIELDS:
+        record[field] = getattr(func, field)
+    if func.halstead is not None:
+        record["halstead_volume"] = func.halstead.volume()
+        record["halstead_difficulty"] = func.halstead.difficulty()
+        record["halstead_effort"] = func.halstead.effort()
+        record["halstead_bugs"] = func.halstead.bugs()
+        record["maintainability_index"] = func.maintainability_index()
+    return record
+
+
+def class_record(path, cls):
+    record = {"type": "class", "path": path, "name": cls.name}
+    for field in CLASS_FIELDS:
+        record[field] = getattr(cls, field)
+    record["methods"] = len(cls.methods)
+    if cls.halstead is not None:
+        record["halstead_volume"] = cls.halstead.volume()
+        record["halstead_difficulty"] = cls.halstead.difficulty()
+        record["halstead_effort"] = cls.halstead.effort()
+        record["halstead_bugs"] = cls.halstead.bugs()
+    return record
+
+
+def finding_records(result):
+    for func in result.long_functions:
+        yield {
+            "type": "finding",
+            "smell": "long_function",
+            "path": result.path,
+            "name": func.get_name(),
+            "start_lineno": func.start_lineno,
+            "end_lineno": func.end_lineno,
+        }
+    for finding in result.feature_envy:
+        yield dict(finding, type="finding", smell="feature_envy")
+
+
+def result_records(result):
+    # Every record written for a FileResult, functions first, then classes and findings
+    if result.error:
+        yield {"type": "error", "path": result.path, "error": result.error}
+        return
+    for func in result.functions:
+        yield function_record(result.path, func)
+    for cls in result.classes:
+        yield class_record(result.path, cls)
+    yield from finding_records(result)
+
+
+class NDJSONWriter:
+    """
+    Writes one JSON object per line for every function, class and finding of a FileResult,
+    flushing after each file so consumers see results while the scan is still running.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+        self.records = 0
+
+    def write(self, record):
+        self.stream.write(self.encoder.encode(record))
+        self.stream.write('\n')
+        self.records += 1
+
+    def write_result(self, result):
+        for record in result_records(result):
+            self.write(record)
+        self.stream.flush()
+
+    def write_change(self, change):
+        self.write({
+            "type": "function_change",
+            "path": change.path,
+            "name": change.name,
+            "start_lineno": change.start_lineno,
+            "end_lineno": change.end_lineno,
+            "complexity": change.complexity,
+            "complexity_delta": change.complexity_delta,
+            "mloc": change.mloc,
+            "mloc_delta": change.mloc_delta,
+            "is_new": change.is_new,
+            "long_function": change.long_function,
+        })
+        self.stream.flush()
+
+    def write_clone_group(self, group):
+        self.write({
+            "type": "finding",
+            "smell": "duplicate_code",
+            "clone_type": group.clone_type,
+            "tokens": group.tokens,
+            "fragments": [{"path": path, "start_lineno": start, "end_lineno": end} for path, start, end in group.fragments],
+        })
+        self.stream.flush()
@@ -0,0 +1,207 @@
+import ast
+import os
+from itertools import chain, islice, repeat
+from code_metrics.unified import UnifiedMetricsVisitor
+from code_metrics.records import FunctionRecord, ClassRecord
+from code_metrics.source import MMAP_THRESHOLD, PARSE_ERRORS, SourceFile
+from detectors.detect_long_function import LongFunctionDetector
+from detectors.detect_feature_envy import FeatureEnvyDetector
+from scanner.cache import content_hash
+
+# Fewer files than this are analysed in the calling process, starting worker processes costs more
+PARALLEL_THRESHOLD = 32
+EXCLUDED_DIRS = {'.git', '.hg', '.svn', '.venv', 'venv', '__pycache__', 'node_modules', '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.refactor_cache'}
+
+class FileResult:
+
+    def __init__(self, path, functions, classes, long_functions, halstead, total_loc, error=None, digest=None, feature_envy=None):
+        self.path = path
+        self.functions = functions # FunctionRecord for every function and method
+        self.classes = classes # ClassRecord, sharing its method records with functions
+        self.long_functions = long_functions # FunctionRecord flagged by LongFunctionDetector
+        self.halstead = halstead # (operators, operands, unique_operators, unique_operands)
+        self.total_loc = total_loc
+        self.error = error
+        self.digest = digest # content hash of the analysed source, None if it could not be read
+        self.feature_envy = feature_envy or [] # findings of FeatureEnvyDetector
+
+    def relocate(self, path):
+        # Moves the result to another file with the same content, e.g. a cached result of a renamed or copied module
+        previous, self.path = self.path, path
+        # Methods are listed in functions as well, long_functions shares its records with both
+        for record in chain(self.functions, self.classes):
+            record.path = path
+        for finding in self.feature_envy:
+            finding['path'] = path
+        if self.error and previous:
+            # Syntax errors name the file as "(module.py, line 3)"
+            self.error = self.error.replace(f"({os.path.basename(previous)}, line", f"({os.path.basename(path)}, line")
+        return self
+
+    def __repr__(self):
+        return f"FileResult({self.path}, functions={len(self.functions)}, classes={len(self.classes)}, long_functions={len(self.long_functions)}, error={self.error})"
+
+
+def iter_python_files(root, excluded_dirs=EXCLUDED_DIRS):
+
+    if os.path.isfile(root):
+        yield root
+        return
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Prune in place so os.walk never descends into excluded directories
+        dirnames[:] = sorted(d for d in dirnames if d not in excluded_dirs and not d.endswith('.egg-info'))
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                yield os.path.join(dirpath, filename)
+
+
+def error_result(path, error):
+    return FileResult(path, [], [], [], None, 0, error=f"{type(error).__name__}: {error}")
+
+
+def analyse_file(path, thresholds=None, source=None, digest=None):
+    # source and digest are what the caller already read and hashed of the file, it is not read again
+
+    if source is not None:
+        return analyse_source(path, source, thresholds, digest)
+    try:
+        source = SourceFile(path)
+    except OSError as error:
+        return error_result(path, error)
+
+    # Parsed and hashed straight from the mapping, no result keeps a reference to it
+    with source:
+        return analyse_source(path, source.data, thresholds, digest)
+
+
+def analyse_cached(path, ast_cache, thresholds=None):
+    # Same as analyse_file, with the tree taken from an ASTCache shared with other analysers
+    try:
+        entry = ast_cache.get(path)
+    except (OSError, *PARSE_ERRORS):
+        return analyse_file(path, thresholds)
+    return analyse_source(path, entry.source, thresholds, entry.digest, entry.tree)
+
+
+def analyse_source(path, code, thresholds=None, digest=None, tree=None):
+
+    digest = digest or content_hash(code)
+    try:
+        node = tree if tree is not None else ast.parse(code, filename=path)
+    except PARSE_ERRORS as error:
+        return FileResult(path, [], [], [], None, 0, error=f"{type(error).__name__}: {error}", digest=digest)
+
+    # One walk gives both the cyclomatic and Halstead metrics
+    visitor = UnifiedMetricsVisitor()
+    visitor.visit(node)
+
+    functions = list(visitor.functions)
+    for cls in visitor.classes:
+        functions.extend(cls.methods)
+
+    # Access profiles stay in the worker, only the findings are sent back
+    feature_envy = FeatureEnvyDetector().check_feature_envy(functions, path)
+
+    # Only compact records cross the process boundary, Function objects carry bodies and closures
+    records = [FunctionRecord.from_function(func, path) for func in visitor.functions]
+    classes = []
+    for cls in visitor.classes:
+        record = ClassRecord.from_class(cls, path)
+        classes.append(record)
+        records.extend(record.methods)
+
+    # The rule is checked on the records themselves, no finding dict is built only to be dropped
+    long_func_detector = LongFunctionDetector(thresholds)
+    for record in records:
+        record.long_function = long_func_detector.is_long_function(record)
+
+    return FileResult(
+        path,
+        records,
+        classes,
+        [record for record in records if record.long_function],
+        (
+            visitor.operators,
+            visitor.operands,
+            len(visitor.unique_operators),
+            len(visitor.unique_operands)
+        ),
+        visitor.get_total_loc(),
+        digest=digest,
+        feature_envy=feature_envy
+    )
+
+
+def split_cached(paths, cache, ast_cache=None):
+    # Yields the cached results and returns the misses as {path: (source, digest)}. Files under the
+    # mmap threshold keep the bytes read for the digest, so analysing a miss does not read it again
+
+    misses = {}
+    for path in paths:
+        try:
+            if ast_cache is not None:
+                entry = ast_cache.read(path)
+                source, digest = entry.source, entry.digest
+            else:
+                with SourceFile(path) as file:
+                    source, digest = file.data, content_hash(file.data)
+                    source = source if len(source) < MMAP_THRESHOLD else None
+        except OSError:
+            misses[path] = (None, None)
+            continue
+
+        result = cache.get(digest, path)
+        if result is None:
+            misses[path] = (source if source is not None and len(source) < MMAP_THRESHOLD else None, digest)
+        else:
+            yield result
+
+    return misses
+
+
+def analyse_files(paths, workers=None, chunksize=16, thresholds=None, ast_cache=None, read=None):
+    # read maps paths to the (source, digest) split_cached already has of them
+
+    read = read or {}
+    paths = iter(paths)
+    first = list(islice(paths, PARALLEL_THRESHOLD))
+    if workers == 1 or len(first) < PARALLEL_THRESHOLD:
+        for path in chain(first, paths):
+            if ast_cache is not None:
+                yield analyse_cached(path, ast_cache, thresholds)
+            else:
+                yield analyse_file(path, thresholds, *read.get(path, (None, None)))
+        return
+
+    # Imported here, multiprocessing alone takes longer to import than analysing a small file
+    from concurrent.futures import ProcessPoolExecutor
+    paths = list(chain(first, paths))
+    known = [read.get(path, (None, None)) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Chunking amortises the pickling/IPC cost of many small files across a single task
+        yield from executor.map(
+            analyse_file,
+            paths,
+            repeat(thresholds, len(paths)),
+            [source for source, digest in known],
+            [digest for source, digest in known],
+            chunksize=chunksize
+        )
+
+
+def scan_repository(root, workers=None, chunksize=16, cache=None, thresholds=None, ast_cache=None):
+    # ast_cache holds what split_cached reads, and the trees when analysing in-process (workers=1 or a few files), trees cannot be shared with worker processes
+
+    paths = iter_python_files(root)
+
+    if cache is None:
+        yield from analyse_files(paths, workers, chunksize, thresholds, ast_cache)
+        return
+
+    # Unchanged files are answered from the cache, only the rest are parsed
+    misses = yield from split_cached(paths, cache, ast_cache)
+    for result in analyse_files(misses, workers, chunksize, thresholds, ast_cache, misses):
+        if result.digest is not None:
+            cache.put(result.digest, result)
+        yield result
@@ -0,0 +1,87 @@
+import os
+from src.code_metrics.ast_cache import ASTCache, AST_BYTES_PER_SOURCE_BYTE
+from src.scanner.repo_scan import scan_repository
+import pytest
+
+def test_one_parse_per_file(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text("def func(a):\n    return a\n")
+    cache = ASTCache()
+    tree = cache.parse(str(path))
+    assert cache.parse(str(path)) is tree
+    assert cache.stats()["hit_rate"] == 0.5
+
+    # Touched but unchanged files keep their tree
+    os.utime(path, ns=(0, 0))
+    assert cache.parse(str(path)) is tree
+
+    path.write_text("def func(a, b):\n    return a + b\n")
+    changed = cache.parse(str(path))
+    assert changed is not tree
+    assert len(changed.body[0].args.args) == 2
+    assert (cache.hits, cache.misses, len(cache)) == (2, 2, 1)
+
+def test_lru_eviction(tmp_path):
+    paths = []
+    for index in range(4):
+        path = tmp_path / f"module_{index}.py"
+        path.write_text(f"x = {index}\n")
+        paths.append(str(path))
+    entry_bytes = len("x = 0\n") * (AST_BYTES_PER_SOURCE_BYTE + 1)
+
+    cache = ASTCache(max_bytes=entry_bytes * 2)
+    for path in paths[:3]:
+        cache.parse(path)
+    assert paths[0] not in cache and len(cache) == 2
+
+    # Using an entry makes it the most recent
+    cache.parse(paths[1])
+    cache.parse(paths[3])
+    assert paths[1] in cache and paths[2] not in cache
+    stats = cache.stats()
+    assert (stats["evictions"], stats["entries"], stats["bytes"]) == (2, 2, entry_bytes * 2)
+
+def test_errors_propagate(tmp_path):
+    path = tmp_path / "broken.py"
+    path.write_text("def broken(:\n")
+    cache = ASTCache()
+    with pytest.raises(SyntaxError):
+        cache.parse(str(path))
+    with pytest.raises(OSError):
+        cache.parse(str(tmp_path / "missing.py"))
+    assert len(cache) == 0
+
+def test_scan_shares_trees(tmp_path):
+    (tmp_path / "module.py").write_text("def func(a):\n    if a:\n        return 1\n    return a\n")
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+    cache = ASTCache()
+    first = list(scan_repository(str(tmp_path), workers=1, ast_cache=cache))
+    second = list(scan_repository(str(tmp_path), workers=1, ast_cache=cache))
+    assert [(result.path, result.error is None, len(result.functions)) for result in first] == \
+        [(result.path, result.error is None, len(result.functions)) for result in second]
+    # Files that do not parse are not cached and are tried again
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def test_read_does_not_parse(tmp_path):
+    path = tmp_path / "broken.py"
+    path.write_text("def broken(:\n")
+    cache = ASTCache()
+    entry = cache.read(str(path))
+    assert entry.source == b"def broken(:\n" and entry.parsed is None
+    with pytest.raises(SyntaxError):
+        entry.tree
+    with pytest.raises(SyntaxError):
+        cache.get(str(path))
+    assert len(cache) == 0
+
+def test_plans_reuse_the_call_graph_trees(tmp_path):
+    from src.main import build_call_graph
+    from src.refactorers.refactor_long_function import plan_files
+    from tests.test_long_function_refactorer import SOURCE
+    (tmp_path / "module.py").write_text(SOURCE)
+    cache = ASTCache()
+    graph = build_call_graph(str(tmp_path), ast_cache=cache)
+    assert len(graph.files) == 1 and (cache.hits, cache.misses) == (0, 1)
+    transaction, planned = plan_files([str(tmp_path / "module.py")], ast_cache=cache)
+    assert planned[0][1] and planned[0][2] is None
+    assert (cache.hits, cache.misses) == (1, 1)
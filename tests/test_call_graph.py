@@ -0,0 +1,120 @@
+import os
+import pickle
+from src.code_metrics.call_graph import CallGraph, module_name
+from src.scanner.cache import TOOL_VERSION
+
+FILES = {
+    "pkg/__init__.py": "from .core import run\n",
+    "pkg/core.py": '''\
+from .util import helper
+import pkg.util as util
+
+def run(values):
+    return [step(value) for value in values]
+
+def step(value):
+    if value > 1:
+        return step(value - 1) + ping(value)
+    return helper(value)
+
+def ping(value):
+    return pong(value - 1)
+
+def pong(value):
+    return ping(value) if value else util.helper(value)
+''',
+    "pkg/util.py": '''\
+def helper(value):
+    return Box(value).get()
+
+class Box:
+    def __init__(self, value):
+        self.value = self.check(value)
+
+    def check(self, value):
+        def inner():
+            return self.get()
+        return value
+
+    def get(self):
+        return self.value
+''',
+    "app.py": '''\
+from pkg import run
+
+def main():
+    run([1, 2])
+''',
+}
+
+def build(tmp_path):
+    graph = CallGraph(str(tmp_path))
+    for name, source in FILES.items():
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(source)
+        graph.update_file(str(path), source)
+    return graph.build()
+
+def test_module_name():
+    assert module_name(os.path.join("root", "pkg", "mod.py"), "root") == "pkg.mod"
+    assert module_name(os.path.join("root", "pkg", "__init__.py"), "root") == "pkg"
+
+def test_edges(tmp_path):
+    graph = build(tmp_path)
+    # Re-exported through the package __init__
+    assert graph.callees("app.main") == ["pkg.core.run"]
+    assert graph.callees("pkg.core.run") == ["pkg.core.step"]
+    # Recursion is not an edge
+    assert sorted(graph.callees("pkg.core.step")) == ["pkg.core.ping", "pkg.util.helper"]
+    # Calling a class calls its __init__, methods are resolved through self but not through other objects
+    assert graph.callees("pkg.util.helper") == ["pkg.util.Box.__init__"]
+    assert graph.callees("pkg.util.Box.__init__") == ["pkg.util.Box.check"]
+    assert graph.callees("pkg.util.Box.check.inner") == ["pkg.util.Box.get"]
+    assert sorted(graph.callers("pkg.util.helper")) == ["pkg.core.pong", "pkg.core.step"]
+
+def test_metrics(tmp_path):
+    graph = build(tmp_path)
+    assert graph.fan_in("pkg.util.helper") == 2
+    assert graph.fan_out("pkg.core.step") == 2
+    assert graph.cycles() == [["pkg.core.ping", "pkg.core.pong"]]
+    assert graph.cycle("pkg.core.ping") == ["pkg.core.pong"]
+    # main, run, step, ping, pong and helper all reach Box.__init__
+    assert graph.impact("pkg.util.Box.__init__") == 6
+    assert graph.impact("app.main") == 0
+    assert graph.function_metrics(str(tmp_path / "pkg" / "util.py"))["Box.check"] == (1, 0, 7)
+
+def test_incremental_update(tmp_path):
+    graph = build(tmp_path)
+    path = str(tmp_path / "app.py")
+
+    # Same calls on other lines, the graph is kept
+    assert graph.update_file(path, "\n\n" + FILES["app.py"])
+    assert graph.built
+    row = next(row for row in graph.iter_metrics() if row["name"] == "app.main")
+    assert (row["start_lineno"], row["end_lineno"]) == (5, 6)
+    assert not graph.update_file(path, "\n\n" + FILES["app.py"])
+
+    graph.update_file(path, FILES["app.py"].replace("run([1, 2])", "run([1, 2])\n    helper(0)").replace("import run", "import run\nfrom pkg.util import helper"))
+    assert not graph.built
+    assert graph.build().fan_in("pkg.util.helper") == 3
+    assert graph.impact("pkg.util.helper") == 5
+
+    graph.remove_file(path)
+    assert "app.main" not in graph.build().ids
+    assert graph.impact("pkg.util.Box.__init__") == 5
+
+def test_save_and_load(tmp_path):
+    graph = build(tmp_path)
+    path = str(tmp_path / "cache" / "call_graph.pickle")
+    graph.save(path)
+    loaded = CallGraph.load(path, str(tmp_path))
+    assert list(loaded.build().iter_metrics()) == list(graph.iter_metrics())
+    assert CallGraph.load(path, "elsewhere").files == {}
+
+def test_stale_or_broken_saves_are_discarded(tmp_path):
+    path = tmp_path / "call_graph.pickle"
+    for payload in (pickle.dumps(("0.0.0", str(tmp_path), {})), pickle.dumps((TOOL_VERSION, str(tmp_path), {"a.py": None})), b"not a pickle"):
+        path.write_bytes(payload)
+        assert CallGraph.load(str(path), str(tmp_path)).files == {}
+        assert not path.exists()
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import socket
+import threading
+from src.scanner.client import query
+from src.scanner.daemon import MetricsStore, claim_socket, serve
+import pytest
+
+LONG = "def long(a):\n" + "".join(f"    if a == {index}:\n        a += {index}\n" for index in range(8)) + "    return a\n"
+SHORT = "def short(a):\n    return a\n"
+
+def test_poll_only_analyses_changes(tmp_path):
+    (tmp_path / "long.py").write_text(LONG)
+    (tmp_path / "short.py").write_text(SHORT)
+    store = MetricsStore(str(tmp_path), workers=1)
+    assert store.poll() == 2
+    assert store.poll() == 0
+    assert store.version == 1
+
+    (tmp_path / "short.py").write_text(SHORT + "\ndef other(b):\n    return b\n")
+    (tmp_path / "long.py").unlink()
+    assert store.poll() == 2
+    assert store.analysed == 3
+    assert [func.name for func in store.results[str(tmp_path / "short.py")].functions] == ["short", "other"]
+    assert str(tmp_path / "long.py") not in store.results
+
+def test_queries(tmp_path):
+    (tmp_path / "long.py").write_text(LONG)
+    (tmp_path / "short.py").write_text(SHORT)
+    store = MetricsStore(str(tmp_path), workers=1)
+    store.poll()
+
+    top = store.query({"query": "top", "n": 1})["functions"]
+    assert [(record["name"], record["complexity"]) for record in top] == [("long", 9)]
+    assert store.query({"query": "top", "metric": "mloc"})["functions"][-1]["name"] == "short"
+    # Rankings are reused until the store changes
+    assert store.ranking("complexity") is store.ranking("complexity")
+    assert "error" in store.query({"query": "top", "metric": "size"})
+
+    records = store.query({"query": "file", "path": str(tmp_path / "long.py")})["records"]
+    assert [record["type"] for record in records] == ["function", "finding"]
+    findings = store.query({"query": "findings"})["findings"]
+    assert [(finding["smell"], finding["name"]) for finding in findings] == [("long_function", "long")]
+    assert store.query({"query": "findings", "path": str(tmp_path / "short.py")}) == {"findings": []}
+    assert store.query({"query": "stats"})["files"] == 2
+    assert "error" in store.query({"query": "file", "path": "missing.py"})
+    assert "error" in store.query({"query": "unknown"})
+
+def test_serve_over_unix_socket(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "long.py").write_text(LONG)
+    socket_path = str(tmp_path / "daemon.sock")
+    ready = threading.Event()
+    thread = threading.Thread(target=asyncio.run, args=(serve(str(tmp_path / "src"), socket_path, 0.05, ready=lambda store: ready.set()),))
+    thread.start()
+    try:
+        assert ready.wait(10)
+        assert query(socket_path, {"query": "stats"})["functions"] == 1
+        with pytest.raises(RuntimeError):
+            claim_socket(socket_path)
+
+        (tmp_path / "src" / "short.py").write_text(SHORT)
+        for _ in range(100):
+            if query(socket_path, {"query": "stats"})["files"] == 2:
+                break
+            threading.Event().wait(0.05)
+        assert query(socket_path, {"query": "stats"})["files"] == 2
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(b"not json\n")
+            assert b"invalid request" in client.recv(4096)
+    finally:
+        query(socket_path, {"query": "shutdown"})
+        thread.join(10)
+    assert not os.path.exists(socket_path)
+
+def test_stale_socket_is_claimed(tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.close()
+    claim_socket(socket_path)
+    assert not os.path.exists(socket_path)
+
+def test_failed_refresh_keeps_watching(tmp_path, monkeypatch, capsys):
+    (tmp_path / "long.py").write_text(LONG)
+    socket_path = str(tmp_path / "daemon.sock")
+    changes = MetricsStore.changes
+    calls = []
+    def failing_once(store):
+        calls.append(store)
+        if len(calls) == 2:
+            raise OSError("gone while reading")
+        return changes(store)
+    monkeypatch.setattr(MetricsStore, "changes", failing_once)
+
+    ready = threading.Event()
+    thread = threading.Thread(target=asyncio.run, args=(serve(str(tmp_path), socket_path, 0.05, ready=lambda store: ready.set()),))
+    thread.start()
+    try:
+        assert ready.wait(10)
+        (tmp_path / "short.py").write_text(SHORT)
+        for _ in range(100):
+            if query(socket_path, {"query": "stats"})["files"] == 2:
+                break
+            threading.Event().wait(0.05)
+        assert query(socket_path, {"query": "stats"})["files"] == 2
+    finally:
+        query(socket_path, {"query": "shutdown"})
+        thread.join(10)
+    assert "OSError: gone while reading" in capsys.readouterr().err
+
+def test_query_without_daemon(tmp_path, capsys):
+    from src.main import main
+    socket_path = str(tmp_path / "daemon.sock")
+    assert main(['--query', '{"query": "stats"}', '--socket', socket_path]) == 1
+    assert capsys.readouterr().err == f"no daemon listening on {socket_path}\n"
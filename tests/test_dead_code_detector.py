@@ -0,0 +1,119 @@
+import pickle
+from src.detectors.detect_dead_code import DeadCodeDetector, SymbolIndex
+from src.scanner.cache import TOOL_VERSION
+import pytest
+from textwrap import dedent
+
+code_blocks = [
+    # Functions used from another module are alive
+    (
+        {
+            'a.py': '''
+            def used():
+                return 1
+
+            def unused():
+                return 2
+            ''',
+            'b.py': '''
+            from a import used
+            print(used())
+            ''',
+        },
+        [('unused', 'function')]
+    ),
+    # Recursion alone does not keep a function alive
+    (
+        {
+            'a.py': '''
+            def recurse(n):
+                return recurse(n - 1) if n else 0
+            ''',
+        },
+        [('recurse', 'function')]
+    ),
+    # Methods are resolved through attribute access, dunders and decorated definitions are skipped
+    (
+        {
+            'a.py': '''
+            class Shape:
+                def __init__(self, size):
+                    self.size = size
+
+                def area(self):
+                    return self.size ** 2
+
+                def perimeter(self):
+                    return self.size * 4
+
+                @property
+                def name(self):
+                    return 'shape'
+
+            class Unused:
+                pass
+
+            print(Shape(2).area())
+            ''',
+        },
+        [('Shape.perimeter', 'method'), ('Unused', 'class')]
+    ),
+    # __all__ and getattr keep names alive
+    (
+        {
+            'a.py': '''
+            __all__ = ['exported']
+
+            def exported():
+                pass
+
+            def dynamic():
+                pass
+
+            getattr(object, 'dynamic')
+            ''',
+        },
+        []
+    ),
+]
+
+def build_index(files):
+    index = SymbolIndex()
+    for path, source in files.items():
+        index.update_file(path, dedent(source))
+    return index
+
+@pytest.mark.parametrize("files,expected", code_blocks)
+def test_code_blocks(files, expected):
+    detector = DeadCodeDetector(build_index(files))
+    assert expected == [(finding["name"], finding["kind"]) for finding in detector.check_dead_code()]
+
+def test_incremental_update():
+    index = build_index(code_blocks[0][0])
+    detector = DeadCodeDetector(index)
+    assert not index.update_file('b.py', dedent(code_blocks[0][0]['b.py']))
+
+    index.update_file('b.py', 'from a import unused\nunused()\n')
+    assert [finding["name"] for finding in detector.check_dead_code()] == ['used']
+
+    index.remove_file('b.py')
+    assert [finding["name"] for finding in detector.check_dead_code()] == ['used', 'unused']
+
+def test_save_and_load(tmp_path):
+    index = build_index(code_blocks[0][0])
+    index.save(str(tmp_path / 'symbols.pickle'))
+    loaded = SymbolIndex.load(str(tmp_path / 'symbols.pickle'))
+    assert loaded.reference_count('used') == index.reference_count('used')
+    assert [finding["name"] for finding in DeadCodeDetector(loaded).check_dead_code()] == ['unused']
+
+@pytest.mark.parametrize("payload", [
+    pickle.dumps(("0.0.0", {})),
+    pickle.dumps((TOOL_VERSION, {"a.py": None})),
+    pickle.dumps({}),
+    b"not a pickle",
+])
+def test_stale_or_broken_saves_are_discarded(tmp_path, payload):
+    path = tmp_path / 'symbols.pickle'
+    path.write_bytes(payload)
+    assert SymbolIndex.load(str(path)).files == {}
+    assert not path.exists()
@@ -0,0 +1,111 @@
+from src.detectors.detect_duplicate_code import DuplicateCodeDetector, kgram_hashes, winnow
+import pytest
+from textwrap import dedent
+
+original = dedent('''
+import os
+
+def load(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as file:
+        lines = file.readlines()
+    result = []
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        result.append(line.strip())
+    return result
+''')
+
+# Same code, different layout and comments
+reformatted = dedent('''
+def load(path, default):
+    # Missing files fall back to the default
+    if not os.path.exists(path):
+        return default
+
+    with open(path) as file:
+        lines = file.readlines()
+    result = []
+    for line in lines:
+        if line.startswith('#'):   continue
+        result.append(line.strip())
+    return result
+''')
+
+# Same structure, identifiers and literals renamed
+renamed = dedent('''
+x = 1
+
+def read_config(filename, fallback):
+    if not os.path.exists(filename):
+        return fallback
+    with open(filename) as handle:
+        rows = handle.readlines()
+    output = []
+    for row in rows:
+        if row.startswith(';'):
+            continue
+        output.append(row.strip())
+    return output
+''')
+
+unrelated = dedent('''
+def area(width, height):
+    return width * height
+''')
+
+code_blocks = [
+    ([original, unrelated], []),
+    ([original, reformatted], [(1, ['0.py', '1.py'])]),
+    ([original, renamed], [(2, ['0.py', '1.py'])]),
+    ([original, reformatted, renamed, unrelated], [(1, ['0.py', '1.py']), (2, ['0.py', '2.py'])]),
+]
+
+@pytest.mark.parametrize("sources,expected", code_blocks)
+def test_code_blocks(sources, expected):
+    detector = DuplicateCodeDetector(min_tokens=30, kgram=10)
+    for index, source in enumerate(sources):
+        detector.add_file(f"{index}.py", source)
+    detector.check_duplicate_code()
+    assert expected == [(group.clone_type, [path for path, start, end in group.fragments]) for group in detector.duplicates]
+
+def test_fragment_lines():
+    detector = DuplicateCodeDetector(min_tokens=30, kgram=10)
+    detector.add_file("a.py", original)
+    detector.add_file("b.py", renamed)
+    [group] = detector.check_duplicate_code()
+    assert group.fragments == [("a.py", 4, 14), ("b.py", 4, 14)]
+
+def test_repeated_code_is_not_a_clone_of_itself():
+    source = "def f(val):\n" + "    val = val - 1\n" * 40 + "    return val\n"
+    detector = DuplicateCodeDetector(min_tokens=30, kgram=10)
+    detector.add_file("a.py", source)
+    assert detector.check_duplicate_code() == []
+
+def test_winnowing_guarantee():
+    tokens = list(range(100))
+    hashes = kgram_hashes(tokens, 5)
+    positions = [position for value, position in winnow(hashes, 4)]
+    assert all(later - earlier <= 4 for earlier, later in zip(positions, positions[1:]))
+
+@pytest.mark.parametrize("copies", [3, 70])
+def test_widely_copied_code_is_one_group(copies):
+    detector = DuplicateCodeDetector(min_tokens=30, kgram=10)
+    for index in range(copies):
+        detector.add_file(f"{index}.py", original)
+    [group] = detector.check_duplicate_code()
+    assert (group.clone_type, len(group.fragments)) == (1, copies)
+
+def test_boilerplate_buckets_are_given_up(monkeypatch):
+    # The shared statement is shorter than a clone, each file is otherwise different
+    detector = DuplicateCodeDetector(min_tokens=30, kgram=10, max_bucket=4)
+    for index in range(40):
+        detector.add_file(f"{index}.py", f"value = compute(first, second, third)\nx{index} = {index}\n")
+    calls = []
+    extend_match = detector.extend_match
+    monkeypatch.setattr(detector, "extend_match", lambda first, second: calls.append(first) or extend_match(first, second))
+    assert detector.check_duplicate_code() == []
+    assert 0 < len(calls) <= 4 * sum(1 for occurrences in detector.index.values() if len(occurrences) > 1)
+    assert len(calls) < sum(len(occurrences) - 1 for occurrences in detector.index.values())
@@ -0,0 +1,83 @@
+from src.code_metrics.unified import UnifiedMetricsVisitor
+from src.detectors.detect_feature_envy import FeatureEnvyDetector
+import ast
+import pytest
+from textwrap import dedent
+
+code_blocks = [
+    # Reads the order's data far more than its own
+    (
+        '''
+        class Invoice:
+            def total(self, order):
+                return order.price * order.quantity - order.discount + self.fee
+        ''',
+        [('Invoice.total', 'order', 3, 1)]
+    ),
+    # Own data dominates
+    (
+        '''
+        class Invoice:
+            def total(self, order):
+                return order.price + self.fee + self.tax + self.shipping
+        ''',
+        []
+    ),
+    # Data reached through one of self's attributes belongs to that object
+    (
+        '''
+        class Report:
+            def header(self):
+                return self.customer.name + self.customer.street + self.customer.city
+        ''',
+        [('Report.header', 'self.customer', 3, 0)]
+    ),
+    # Method calls are behaviour, not data
+    (
+        '''
+        class Invoice:
+            def total(self, order):
+                return order.price() + order.quantity() + order.discount()
+        ''',
+        []
+    ),
+    # Too many data providers: a coordinator rather than envy
+    (
+        '''
+        class Checkout:
+            def run(self, cart, user, payment):
+                return cart.items, user.address, payment.card, payment.amount
+        ''',
+        []
+    ),
+    # Plain functions and static methods have no own class data
+    (
+        '''
+        def total(order):
+            return order.price * order.quantity - order.discount
+
+        class Invoice:
+            @staticmethod
+            def total(order):
+                return order.price * order.quantity - order.discount
+        ''',
+        []
+    ),
+]
+
+@pytest.mark.parametrize("code, expected", code_blocks)
+def test_code_blocks(code, expected):
+    code = dedent(code)
+    visitor = UnifiedMetricsVisitor(code)
+    visitor.visit(ast.parse(code))
+    functions = list(visitor.functions)
+    for cls in visitor.classes:
+        functions.extend(cls.methods)
+
+    findings = FeatureEnvyDetector().check_feature_envy(functions, 'example.py')
+    assert [(finding['name'], finding['envied'], finding['foreign_accesses'], finding['own_accesses']) for finding in findings] == expected
+
+@pytest.mark.parametrize("min_foreign", [0, -1])
+def test_min_foreign_below_one_is_rejected(min_foreign):
+    with pytest.raises(ValueError):
+        FeatureEnvyDetector(min_foreign=min_foreign)
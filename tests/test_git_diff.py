@@ -0,0 +1,88 @@
+import subprocess
+from src.scanner.git_diff import diff_functions, changed_hunks, unquote_path
+from textwrap import dedent
+
+before = dedent('''
+def untouched():
+    return 1
+
+def changed(a):
+    return a
+''').lstrip()
+
+after = dedent('''
+def untouched():
+    return 1
+
+def changed(a):
+    if a:
+        return a
+    return None
+
+def added():
+    pass
+''').lstrip()
+
+def git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args], cwd=cwd, check=True, capture_output=True)
+
+def make_repo(tmp_path):
+    git(tmp_path, 'init', '-q')
+    (tmp_path / 'module.py').write_text(before)
+    git(tmp_path, 'add', 'module.py')
+    git(tmp_path, 'commit', '-q', '-m', 'before')
+    (tmp_path / 'module.py').write_text(after)
+
+def test_changed_hunks(tmp_path):
+    make_repo(tmp_path)
+    assert changed_hunks('HEAD', cwd=tmp_path) == {'module.py': [(5, 10)]}
+
+def test_diff_functions_working_tree(tmp_path):
+    make_repo(tmp_path)
+    changes = {change.name: change for change in diff_functions('HEAD', cwd=tmp_path)}
+    assert sorted(changes) == ['added', 'changed']
+    assert (changes['changed'].complexity_delta, changes['changed'].mloc_delta) == (1, 2)
+    assert changes['added'].is_new
+
+def test_diff_functions_commit_range(tmp_path):
+    make_repo(tmp_path)
+    git(tmp_path, 'commit', '-q', '-am', 'after')
+    changes = [change.name for change in diff_functions('HEAD~1..HEAD', cwd=tmp_path)]
+    assert changes == ['changed', 'added']
+
+def test_unquote_path():
+    assert unquote_path('module.py') == 'module.py'
+    assert unquote_path('"\\303\\251t\\303\\251.py"') == 'été.py'
+    assert unquote_path('"tab\\there \\"quoted\\".py"') == 'tab\there "quoted".py'
+
+def test_changed_hunks_quoted_paths_and_prefix_settings(tmp_path):
+    make_repo(tmp_path)
+    (tmp_path / 'été 2.py').write_text(before)
+    git(tmp_path, 'add', 'été 2.py')
+    # Neither setting changes the paths reported
+    git(tmp_path, 'config', 'diff.mnemonicPrefix', 'true')
+    git(tmp_path, 'config', 'core.quotePath', 'true')
+    assert changed_hunks('HEAD', cwd=tmp_path) == {'module.py': [(5, 10)], 'été 2.py': [(1, 5)]}
+    git(tmp_path, 'config', 'diff.noprefix', 'true')
+    assert sorted(changed_hunks('HEAD', cwd=tmp_path)) == ['module.py', 'été 2.py']
+
+def test_changed_hunks_deletion_at_top(tmp_path):
+    make_repo(tmp_path)
+    (tmp_path / 'module.py').write_text(before.split('\n', 1)[1])
+    assert changed_hunks('HEAD', cwd=tmp_path) == {'module.py': [(1, 1)]}
+
+def test_diff_functions_renamed_file(tmp_path):
+    unchanged = ''.join(f"\ndef kept_{index}(a):\n    return a + {index}\n" for index in range(10))
+    git(tmp_path, 'init', '-q')
+    (tmp_path / 'module.py').write_text(before + unchanged)
+    git(tmp_path, 'add', 'module.py')
+    git(tmp_path, 'commit', '-q', '-m', 'before')
+    git(tmp_path, 'mv', 'module.py', 'renamed.py')
+    (tmp_path / 'renamed.py').write_text(after + unchanged)
+    git(tmp_path, 'commit', '-q', '-am', 'after')
+
+    # The old revision is read at the old path, only the added function is new
+    changes = {change.name: change for change in diff_functions('HEAD~1..HEAD', cwd=tmp_path)}
+    assert sorted(changes) == ['added', 'changed']
+    assert {change.path for change in changes.values()} == {'renamed.py'}
+    assert (changes['changed'].is_new, changes['changed'].complexity_delta, changes['added'].is_new) == (False, 1, True)
@@ -0,0 +1,79 @@
+from src.code_metrics.unified import UnifiedMetricsVisitor
+from src.detectors.detect_god_class import GodClassDetector
+import ast
+import pytest
+from textwrap import dedent
+
+code = dedent('''
+    class Cohesive:
+        def __init__(self):
+            self.items = []
+            self.size = 0
+
+        def add(self, item):
+            self.items.append(item)
+            self.size += 1
+
+        def clear(self):
+            self.items = []
+            self.size = 0
+
+    class Controller:
+        def __init__(self, order, customer):
+            self.order = order
+            self.customer = customer
+            self.log = []
+
+        def total(self, order):
+            if order.discount:
+                return order.price - order.discount
+            return order.price
+
+        def notify(self, customer):
+            if customer.email:
+                return customer.email
+            elif customer.phone:
+                return customer.phone
+            return customer.name
+
+        def audit(self):
+            for entry in self.log:
+                if entry:
+                    print(entry)
+''')
+
+def detect(**thresholds):
+    visitor = UnifiedMetricsVisitor(code)
+    visitor.visit(ast.parse(code))
+    detector = GodClassDetector(**thresholds)
+    detector.add_classes(visitor.classes, 'example.py')
+    return detector
+
+def test_class_metrics():
+    table = detect().table
+    assert table.names == ['Cohesive', 'Controller']
+    assert list(table.wmc()) == [3, 9]
+    assert list(table.nom()) == [3, 4]
+    assert list(table.noa) == [2, 3]
+    assert list(table.atfd) == [0, 5]
+    # Cohesive: every pair of methods shares items/size
+    assert table.tcc[0] == pytest.approx(1.0)
+    assert table.lcom[0] == 0
+    # Controller: only __init__ and audit share an attribute (log), 1 of 6 pairs
+    assert table.tcc[1] == pytest.approx(1 / 6)
+    assert table.lcom[1] == 4
+
+def test_default_thresholds():
+    assert detect().check_god_class() == []
+
+@pytest.mark.parametrize("thresholds, expected", [
+    ({'wmc': 9, 'atfd': 4}, ['Controller']),
+    ({'wmc': 10, 'atfd': 4}, []),
+    ({'wmc': 9, 'atfd': 5}, []),
+    ({'wmc': 1, 'tcc': 1.01, 'atfd': -1}, ['Cohesive', 'Controller']),
+])
+def test_god_class_detection(thresholds, expected):
+    findings = detect(**thresholds).check_god_class()
+    assert [finding['name'] for finding in findings] == expected
+    for finding in findings:
+        assert finding['path'] == 'example.py'
@@ -1,5 +1,6 @@
 import ast
 from src.code_metrics.halstead import HalsteadMetricsVisitor
+from src.code_metrics.trace import VisitTracer
 import pytest
 from textwrap import dedent
 
@@ -130,4 +131,23 @@ def test_code_blocks(code, expected):
                         halstead_visitor.operators, 
                         len(halstead_visitor.unique_operands), 
                         len(halstead_visitor.unique_operators)
-                        )
\ No newline at end of file
+                        )
+
+@pytest.mark.parametrize("code,expected", code_blocks)
+def test_traced_code_blocks(code, expected, capsys):
+    tree = ast.parse(dedent(code).strip())
+    seen = []
+    tracer = VisitTracer(callback=lambda node, elapsed: seen.append(node))
+    halstead_visitor = HalsteadMetricsVisitor(tracer)
+    halstead_visitor.visit(tree)
+    assert expected == (halstead_visitor.operands,
+                        halstead_visitor.operators,
+                        len(halstead_visitor.unique_operands),
+                        len(halstead_visitor.unique_operators)
+                        )
+    # Nothing is printed, every visited node is counted once
+    assert capsys.readouterr().out == ""
+    assert sum(tracer.counts.values()) == len(seen)
+    assert tracer.counts['Module'] == 1
+    for node_type, visits, total, own in tracer.report():
+        assert 0 <= own <= total
@@ -0,0 +1,66 @@
+import os
+from src.scanner.cache import ResultCache
+from src.scanner.ingest import StageTimings, scan_repository_async
+from src.scanner.repo_scan import scan_repository
+import pytest
+
+def write_tree(root, files=20):
+    for index in range(files):
+        (root / f"module_{index}.py").write_text(f"def func_{index}(a):\n    if a:\n        return {index}\n    return a\n")
+    (root / "broken.py").write_text("def broken(:\n")
+
+def summary(results):
+    return sorted((result.path, result.error is not None, [(func.name, func.complexity) for func in result.functions]) for result in results)
+
+@pytest.mark.parametrize("workers, queue_size", [(1, 1), (1, 64), (2, 4)])
+def test_matches_scan_repository(tmp_path, workers, queue_size):
+    write_tree(tmp_path)
+    timings = StageTimings()
+    results = list(scan_repository_async(str(tmp_path), workers=workers, read_concurrency=4, queue_size=queue_size, timings=timings))
+    assert summary(results) == summary(scan_repository(str(tmp_path), workers=1))
+    assert timings.files == 21
+    assert timings.bytes_read == sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert timings.max_queued <= queue_size
+    assert timings.wall > 0
+
+def test_cache(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    write_tree(source, files=5)
+    with ResultCache(str(tmp_path / "cache")) as cache:
+        first = list(scan_repository_async(str(source), workers=1, cache=cache))
+        timings = StageTimings()
+        second = list(scan_repository_async(str(source), workers=1, cache=cache, timings=timings))
+    assert summary(first) == summary(second)
+    # The unparsable file is cached as well, its error is part of the result
+    assert timings.cache_hits == 6
+
+def test_early_close(tmp_path):
+    write_tree(tmp_path)
+    results = scan_repository_async(str(tmp_path), workers=1, read_concurrency=2, queue_size=1)
+    assert next(results).path.startswith(str(tmp_path))
+    results.close()
+
+def test_analysis_failures_are_error_results(tmp_path, monkeypatch):
+    import src.scanner.ingest as ingest
+    write_tree(tmp_path, files=3)
+    analyse_source = ingest.analyse_source
+    def failing(path, *args):
+        if path.endswith("module_1.py"):
+            raise RecursionError("maximum recursion depth exceeded during ast construction")
+        return analyse_source(path, *args)
+    monkeypatch.setattr(ingest, "analyse_source", failing)
+    results = {os.path.basename(result.path): result for result in scan_repository_async(str(tmp_path), workers=1)}
+    assert len(results) == 4
+    assert results["module_1.py"].error == "RecursionError: maximum recursion depth exceeded during ast construction"
+    assert results["module_0.py"].error is None
+
+def test_pipeline_failure_reaches_the_consumer(tmp_path, monkeypatch):
+    import src.scanner.ingest as ingest
+    write_tree(tmp_path, files=3)
+    def failing(path):
+        raise RuntimeError("reader died")
+    monkeypatch.setattr(ingest, "read_source", failing)
+    # Raised in the consumer instead of leaving it waiting for results that never come
+    with pytest.raises(RuntimeError, match="reader died"):
+        list(scan_repository_async(str(tmp_path), workers=1))
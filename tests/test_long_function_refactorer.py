@@ -0,0 +1,178 @@
+import ast
+from src.refactorers.refactor_long_function import LongFunctionRefactorer, reads_before_binding
+from src.code_metrics.unified import UnifiedMetricsVisitor
+
+SOURCE = '''\
+def process(values, scale, offset=0):
+    """Normalise and summarise values."""
+    cleaned = []
+    for value in values:
+        if value is None:
+            continue
+        if value < 0:
+            value = -value
+        cleaned.append(value * scale)
+    total = 0
+    for value in cleaned:
+        if value > 100:
+            total += 100
+        elif value > 10:
+            total += value / 2
+        else:
+            total += value
+    if offset:
+        total += offset
+    return total
+
+
+class Stats:
+    def __init__(self, data):
+        self.data = data
+
+    def describe(self):
+        data = [x for x in self.data if x is not None]
+        low = min(data)
+        high = max(data)
+        if low < 0:
+            low = 0
+        if high > 1000:
+            high = 1000
+        spread = high - low
+        if spread == 0:
+            spread = 1
+        buckets = {}
+        for x in data:
+            key = round((x - low) / spread, 1)
+            if key in buckets:
+                buckets[key] += 1
+            else:
+                buckets[key] = 1
+        return buckets
+
+
+def tail():
+    return 1
+'''
+
+def records(functions):
+    return [(func.get_name(), func.start_lineno, func.end_lineno, func.complexity, func.mloc) for func in functions]
+
+def test_refactor_preserves_behaviour():
+    refactorer = LongFunctionRefactorer(SOURCE)
+    extractions = refactorer.refactor()
+    assert extractions
+    assert refactorer.long_functions() == []
+
+    before, after = {}, {}
+    exec(SOURCE, before)
+    exec(refactorer.source, after)
+    for values in ([1, None, -5, 200, 30], [], [0, 11]):
+        assert before['process'](values, 2, 3) == after['process'](values, 2, 3)
+    data = [1, 5, None, 2000, -3]
+    assert before['Stats'](data).describe() == after['Stats'](data).describe()
+    assert after['tail']() == 1
+
+def test_method_helper_takes_self():
+    refactorer = LongFunctionRefactorer(SOURCE)
+    stats = refactorer.classes[0]
+    extraction = refactorer.extract(stats.methods[1], stats)
+    assert extraction.helper.startswith("Stats.describe_part")
+    assert f"self.{extraction.helper.split('.')[1]}(" in refactorer.source
+    assert f"def {extraction.helper.split('.')[1]}(self" in refactorer.source
+
+def test_incremental_records_match_full_analysis():
+    refactorer = LongFunctionRefactorer(SOURCE)
+    refactorer.refactor()
+    assert refactorer.regions_analysed == len(refactorer.extractions)
+
+    visitor = UnifiedMetricsVisitor(refactorer.source)
+    visitor.visit(ast.parse(refactorer.source))
+    assert records(refactorer.functions) == records(visitor.functions)
+    for updated, full in zip(refactorer.classes, visitor.classes):
+        assert (updated.start_lineno, updated.end_lineno, updated.complexity, updated.mloc) == (full.start_lineno, full.end_lineno, full.complexity, full.mloc)
+        assert records(updated.methods) == records(full.methods)
+
+def test_unextractable_function_is_left_alone():
+    source = (
+        "def search(items, target):\n"
+        "    for item in items:\n"
+        "        if item == target:\n"
+        "            return item\n"
+        "        if item > target:\n"
+        "            return None\n"
+        "        if item < 0:\n"
+        "            break\n"
+        "        if item == 0:\n"
+        "            continue\n"
+        "        if item > 100:\n"
+        "            return 100\n"
+        "        if item < -100:\n"
+        "            return -100\n"
+    )
+    refactorer = LongFunctionRefactorer(source)
+    assert len(refactorer.long_functions()) == 1
+    assert refactorer.refactor() == []
+    assert refactorer.source == source
+
+def test_loop_variable_is_not_an_input():
+    statements = ast.parse("for value in values:\n    total += value\nprint(value)\n").body
+    assert not reads_before_binding(statements[:1], 'value')
+    assert reads_before_binding(statements[:1], 'total')
+    # After the loop it is only bound when there was an item
+    assert reads_before_binding(statements, 'value')
+    statements = ast.parse("print(value)\nvalue = 1\n").body
+    assert reads_before_binding(statements, 'value')
+
+def test_key_orders_long_functions():
+    refactorer = LongFunctionRefactorer(SOURCE)
+    assert refactorer.refactor(max_extractions=1)[0].function == "process"
+    refactorer = LongFunctionRefactorer(SOURCE)
+    ranks = {"Stats.describe": 2, "process": 1}
+    assert refactorer.refactor(max_extractions=1, key=lambda func: -ranks[func.get_name()])[0].function == "Stats.describe"
+
+def refactored_behaves_the_same(source, name, arguments):
+    refactorer = LongFunctionRefactorer(source)
+    extractions = refactorer.refactor()
+    before, after = {}, {}
+    exec(source, before)
+    exec(refactorer.source, after)
+    assert [before[name](argument) for argument in arguments] == [after[name](argument) for argument in arguments]
+    return refactorer, extractions
+
+def branches(indices, indent, expression="{index}"):
+    return "".join(f"{indent}if a > {index}:\n{indent}    out.append({expression.format(index=index)})\n" for index in indices)
+
+def test_function_nested_in_module_level_if():
+    source = "import sys\nif sys:\n    def f(a):\n        out = []\n" + branches(range(8), "        ") + "        return out\n"
+    refactorer, extractions = refactored_behaves_the_same(source, 'f', range(9))
+    assert len(extractions) == 1
+    assert "    def f_part1(a):\n" in refactorer.source
+
+def test_decorated_definition_moves_with_its_decorators():
+    source = (
+        "def deco(fn):\n    return fn\n\ndef h(a):\n    out = []\n" + branches(range(4), "    ")
+        + "    @deco\n    def g():\n        return 1\n" + branches(range(4, 8), "    ", "g() + {index}") + "    return out\n"
+    )
+    refactorer, extractions = refactored_behaves_the_same(source, 'h', range(9))
+    assert extractions[0].start_lineno == 14
+    assert "    @deco\n    def g():" in refactorer.source
+
+def test_closure_is_not_separated_from_a_rebound_variable():
+    # Moving x = 1 and g without x = 2 would leave g reading the helper's x
+    source = (
+        "def h(a):\n    out = []\n" + branches(range(4), "    ") + "    x = 1\n    def g():\n        return x\n"
+        + branches(range(4, 8), "    ") + "    x = 2\n    return sum(out) + g()\n"
+    )
+    refactorer, extractions = refactored_behaves_the_same(source, 'h', range(9))
+    assert extractions
+
+def test_names_declared_global_stay_in_the_function():
+    # A helper assigning total would bind a local of its own, reading it first raises UnboundLocalError
+    source = (
+        "total = 0\ndef bump(a):\n    global total\n    out = []\n" + branches(range(4), "    ")
+        + "    total = total + a\n    total = total * 2\n" + branches(range(4, 8), "    ") + "    return out, total\n"
+    )
+    refactorer, extractions = refactored_behaves_the_same(source, 'bump', range(9))
+    assert extractions
+    helpers = refactorer.source[refactorer.source.index("def bump_part1"):]
+    assert "total" not in helpers
@@ -0,0 +1,98 @@
+import io
+import json
+from src.detectors.detect_duplicate_code import CloneGroup
+from src.main import main
+from src.scanner.git_diff import FunctionChange
+from src.scanner.ndjson import NDJSONWriter
+from src.scanner.repo_scan import analyse_source
+from textwrap import dedent
+
+SOURCE = dedent('''
+class Caché:
+    def größe(self, a):
+        if a:
+            return a
+        return 0
+
+def ñandú(x):
+    return x
+''').lstrip()
+
+PATH = "pakke/módulo.py"
+
+def records(stream):
+    lines = stream.getvalue().splitlines()
+    # One compact object per line, nothing else in between
+    assert all(line.startswith('{') and line.endswith('}') for line in lines)
+    return [json.loads(line) for line in lines]
+
+def test_write_result():
+    stream = io.StringIO()
+    writer = NDJSONWriter(stream)
+    writer.write_result(analyse_source(PATH, SOURCE.encode('utf-8'), {'mloc': 2}))
+    written = records(stream)
+    assert writer.records == len(written)
+    assert [(record["type"], record["name"]) for record in written] == [
+        ("function", "ñandú"),
+        ("function", "Caché.größe"),
+        ("class", "Caché"),
+        ("finding", "Caché.größe"),
+    ]
+    assert all(record["path"] == PATH for record in written)
+    # Non-ASCII names are written as is, not as \u escapes
+    assert "größe" in stream.getvalue()
+
+    function = written[1]
+    assert {"start_lineno", "end_lineno", "is_method", "complexity", "mloc", "halstead_volume", "maintainability_index"} <= function.keys()
+    assert (function["is_method"], function["belongs_to"], function["complexity"]) == (True, "Caché", 2)
+    assert (written[2]["methods"], written[3]["smell"]) == (1, "long_function")
+
+def test_write_result_error():
+    stream = io.StringIO()
+    NDJSONWriter(stream).write_result(analyse_source(PATH, b"def broken(:\n"))
+    [record] = records(stream)
+    assert (record["type"], record["path"]) == ("error", PATH)
+    assert record["error"].startswith("SyntaxError")
+
+def test_write_change():
+    class Func:
+        def __init__(self, complexity, mloc):
+            self.start_lineno, self.end_lineno = 2, 6
+            self.complexity, self.mloc = complexity, mloc
+
+        def get_name(self):
+            return "Caché.größe"
+
+    stream = io.StringIO()
+    writer = NDJSONWriter(stream)
+    writer.write_change(FunctionChange(PATH, Func(3, 5), Func(1, 2), False))
+    writer.write_change(FunctionChange(PATH, Func(1, 1), None, True))
+    changed, added = records(stream)
+    assert changed == {
+        "type": "function_change", "path": PATH, "name": "Caché.größe", "start_lineno": 2, "end_lineno": 6,
+        "complexity": 3, "complexity_delta": 2, "mloc": 5, "mloc_delta": 3, "is_new": False, "long_function": False,
+    }
+    assert (added["is_new"], added["long_function"]) == (True, True)
+
+def test_write_clone_group():
+    stream = io.StringIO()
+    NDJSONWriter(stream).write_clone_group(CloneGroup(2, 60, [(PATH, 1, 10), ("ñ.py", 20, 29)]))
+    [record] = records(stream)
+    assert record == {
+        "type": "finding", "smell": "duplicate_code", "clone_type": 2, "tokens": 60,
+        "fragments": [{"path": PATH, "start_lineno": 1, "end_lineno": 10}, {"path": "ñ.py", "start_lineno": 20, "end_lineno": 29}],
+    }
+
+def test_format_ndjson(tmp_path, capsys):
+    package = tmp_path / "pakke"
+    package.mkdir()
+    (package / "módulo.py").write_text(SOURCE, encoding='utf-8')
+    output = tmp_path / "out.ndjson"
+    main(['--scan', str(package), '--workers', '1', '--format', 'ndjson', '--output', str(output), '--dead-code', '--god-classes'])
+
+    # Every section of the run writes to --output, nothing to stdout
+    assert capsys.readouterr().out == ""
+    written = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert {record["type"] for record in written} == {"function", "class", "finding"}
+    assert {record["path"] for record in written} == {str(package / "módulo.py")}
+    assert {record.get("smell") for record in written} == {None, "dead_code"}
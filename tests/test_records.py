@@ -0,0 +1,62 @@
+import ast
+import pickle
+from src.code_metrics.cyclomatic import CyclomaticComplexityVisitor
+from src.code_metrics.records import FunctionRecord, ClassRecord, MetricsTable
+from src.code_metrics.unified import UnifiedMetricsVisitor
+from textwrap import dedent
+
+code = dedent('''
+def func(a, b):
+    if a:
+        return b
+    return a
+
+class TestClass:
+    def method(self):
+        x = 1
+        return x
+''').lstrip()
+
+def visit(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text(code)
+    visitor = CyclomaticComplexityVisitor()
+    visitor.visit(ast.parse(code))
+    return str(path), visitor
+
+def test_function_record(tmp_path):
+    path, visitor = visit(tmp_path)
+    record = FunctionRecord.from_function(visitor.functions[0], path)
+    assert (record.get_name(), record.start_lineno, record.end_lineno, record.complexity, record.num_params) == ("func", 1, 4, 2, 2)
+    assert record.body == "def func(a, b):\n    if a:\n        return b\n    return a\n"
+    assert not hasattr(record, '__dict__')
+    assert pickle.loads(pickle.dumps(record)) == record
+
+def test_class_record(tmp_path):
+    path, visitor = visit(tmp_path)
+    record = ClassRecord.from_class(visitor.classes[0], path)
+    assert [method.get_name() for method in record.methods] == ["TestClass.method"]
+    assert record.methods[0].body.splitlines()[0] == "    def method(self):"
+    assert record.avg_method_complexity() == 1
+
+def test_metrics_table(tmp_path):
+    path, visitor = visit(tmp_path)
+    records = [FunctionRecord.from_function(func, path) for func in visitor.functions + visitor.classes[0].methods]
+    table = MetricsTable.from_records(records * 1000)
+    assert len(table) == 2000
+    assert table[1] == records[1]
+    assert table.total('complexity') == 3000
+    assert table.mean('num_params') == 1.5
+    assert table.maximum('mloc') == records[0].mloc
+    assert [record.name for record in table.top('complexity', 2)] == ["func", "func"]
+    assert table.strings == ["func", path, "method", "TestClass"]
+
+def test_metrics_table_halstead(tmp_path):
+    path, visitor = visit(tmp_path)
+    unified = UnifiedMetricsVisitor(code).visit(ast.parse(code))
+    records = [FunctionRecord.from_function(func, path) for func in visitor.functions + unified.functions]
+    table = MetricsTable.from_records(records)
+    assert table[0].halstead is None and table[0].maintainability_index() is None
+    halstead = table[1].halstead
+    assert (halstead.operators, halstead.operands, halstead.unique_operators, halstead.unique_operands) == (1, 0, 1, 0)
+    assert table[1].maintainability_index() == records[1].maintainability_index()
@@ -0,0 +1,51 @@
+import os
+from src.code_metrics.ast_cache import ASTCache
+from src.scanner.daemon import MetricsStore
+from src.scanner.repo_scan import PARALLEL_THRESHOLD, iter_python_files, scan_repository
+import pytest
+
+FUNCTION = "def func_{0}(a):\n    if a:\n        return {0}\n    return a\n"
+# Parses into a tree too deep for the parser's recursion limit
+DEEP = "x = " + " + ".join(["1"] * 200_000) + "\n"
+
+def summary(results):
+    return sorted((result.path, result.error, [(func.name, func.complexity) for func in result.functions]) for result in results)
+
+def test_excluded_directories_are_pruned(tmp_path):
+    for directory in ("pkg", "pkg/sub", ".git", "venv", "pkg/__pycache__", "pkg/node_modules/dep", "tool.egg-info"):
+        (tmp_path / directory).mkdir(parents=True, exist_ok=True)
+        (tmp_path / directory / "module.py").write_text("x = 1\n")
+    (tmp_path / "pkg" / "notes.txt").write_text("x = 1\n")
+    (tmp_path / "top.py").write_text("x = 1\n")
+
+    paths = [os.path.relpath(path, tmp_path) for path in iter_python_files(str(tmp_path))]
+    assert paths == ["top.py", os.path.join("pkg", "module.py"), os.path.join("pkg", "sub", "module.py")]
+    assert list(iter_python_files(str(tmp_path / "top.py"))) == [str(tmp_path / "top.py")]
+
+@pytest.mark.parametrize("files", [3, PARALLEL_THRESHOLD + 8])
+def test_worker_pool_matches_in_process(tmp_path, files):
+    for index in range(files):
+        (tmp_path / f"module_{index}.py").write_text(FUNCTION.format(index))
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+
+    serial = summary(scan_repository(str(tmp_path), workers=1))
+    assert summary(scan_repository(str(tmp_path), workers=2, chunksize=4)) == serial
+    assert len(serial) == files + 1
+    assert [error is not None for path, error, functions in serial].count(True) == 1
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unparsable_module_does_not_stop_the_scan(tmp_path, workers):
+    (tmp_path / "deep.py").write_text(DEEP)
+    (tmp_path / "module.py").write_text(FUNCTION.format(0))
+    results = {os.path.basename(result.path): result for result in scan_repository(str(tmp_path), workers=workers, ast_cache=ASTCache())}
+    assert results["deep.py"].error.startswith("RecursionError")
+    assert results["deep.py"].digest is not None
+    assert [func.name for func in results["module.py"].functions] == ["func_0"]
+
+def test_daemon_applies_changes_next_to_an_unparsable_module(tmp_path):
+    (tmp_path / "deep.py").write_text(DEEP)
+    store = MetricsStore(str(tmp_path), workers=1)
+    assert store.poll() == 1
+    (tmp_path / "module.py").write_text(FUNCTION.format(0))
+    assert store.poll() == 1
+    assert store.query({"query": "stats"})["files"] == 2
@@ -0,0 +1,101 @@
+import os
+import time
+from src.scanner.cache import ResultCache, content_hash
+from src.scanner.repo_scan import FileResult, analyse_file, scan_repository, split_cached
+from src.code_metrics.source import MMAP_THRESHOLD
+from src.code_metrics.records import FunctionRecord
+import pytest
+from textwrap import dedent
+
+def make_result(path):
+    return FileResult(path, [FunctionRecord("func", path, 1, 2, False, None, 1, 2, 0, 0, 0)], [], [], (1, 1, 1, 1), 2)
+
+def test_get_and_put(tmp_path):
+    digest = content_hash(b"x = 1")
+    with ResultCache(str(tmp_path)) as cache:
+        assert cache.get(digest) is None
+        cache.put(digest, make_result("a.py"))
+        result = cache.get(digest, "b.py")
+        assert (result.path, result.functions[0].complexity) == ("b.py", 1)
+        assert (cache.hits, cache.misses) == (1, 1)
+
+def test_tool_version_invalidates(tmp_path):
+    digest = content_hash(b"x = 1")
+    with ResultCache(str(tmp_path), tool_version="1") as cache:
+        cache.put(digest, make_result("a.py"))
+    with ResultCache(str(tmp_path), tool_version="2") as cache:
+        assert cache.get(digest) is None
+        assert cache.evict() == 1
+
+@pytest.mark.parametrize("max_entries,max_age,now_offset,expected", [
+    (10, 100, 0, 3),
+    (2, 100, 0, 2),
+    (10, 100, 1000, 0),
+])
+def test_evict(tmp_path, max_entries, max_age, now_offset, expected):
+    with ResultCache(str(tmp_path), max_entries=max_entries, max_age=max_age) as cache:
+        for i in range(3):
+            cache.put(content_hash(bytes([i])), make_result(f"{i}.py"))
+        cache.evict(now=time.time() + now_offset)
+        assert len(cache) == expected
+
+def test_scan_reuses_unchanged_files(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "a.py").write_text("def a():\n    return 1\n")
+    (source / "b.py").write_text("def b():\n    return 2\n")
+    cache_dir = str(tmp_path / ".refactor_cache")
+
+    with ResultCache(cache_dir) as cache:
+        assert len(list(scan_repository(str(source), workers=1, cache=cache))) == 2
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    (source / "b.py").write_text("def b():\n    if b:\n        return 2\n")
+    with ResultCache(cache_dir) as cache:
+        results = {os.path.basename(result.path): result for result in scan_repository(str(source), workers=1, cache=cache)}
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert results["b.py"].functions[0].complexity == 2
+
+def test_misses_are_read_once(tmp_path):
+    small = tmp_path / "small.py"
+    small.write_text("def a():\n    return 1\n")
+    large = tmp_path / "large.py"
+    large.write_text("x = 1\n" * (MMAP_THRESHOLD // 6 + 1))
+    with ResultCache(str(tmp_path / ".refactor_cache")) as cache:
+        results = split_cached([str(small), str(large), str(tmp_path / "missing.py")], cache)
+        with pytest.raises(StopIteration) as stop:
+            next(results)
+    misses = stop.value.value
+    # Bytes under the mmap threshold go along with the digest, larger files are mapped again by the worker
+    assert misses[str(small)] == (small.read_bytes(), content_hash(small.read_bytes()))
+    assert misses[str(large)] == (None, content_hash(large.read_bytes()))
+    assert misses[str(tmp_path / "missing.py")] == (None, None)
+
+    small.unlink()
+    result = analyse_file(str(small), None, *misses[str(small)])
+    assert (result.error, result.functions[0].name, result.digest) == (None, "a", misses[str(small)][1])
+
+def test_hit_moves_every_record_to_the_new_path(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "a.py").write_text(dedent('''
+        class Invoice:
+            def total(self, order):
+                return order.price * order.quantity - order.discount + self.fee
+    '''))
+    (source / "broken.py").write_text("def broken(:\n")
+    cache_dir = str(tmp_path / ".refactor_cache")
+    with ResultCache(cache_dir) as cache:
+        list(scan_repository(str(source), workers=1, cache=cache))
+
+    os.rename(source / "a.py", source / "renamed.py")
+    os.rename(source / "broken.py", source / "still_broken.py")
+    with ResultCache(cache_dir) as cache:
+        results = {os.path.basename(result.path): result for result in scan_repository(str(source), workers=1, cache=cache)}
+        assert cache.hits == 2
+    result = results["renamed.py"]
+    paths = {record.path for record in result.functions + result.long_functions + result.classes + list(result.classes[0].methods)}
+    paths |= {finding["path"] for finding in result.feature_envy}
+    assert paths == {result.path} and result.feature_envy
+    assert "return order.price" in result.functions[0].body
+    assert "(still_broken.py, line 1)" in results["still_broken.py"].error
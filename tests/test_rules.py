@@ -0,0 +1,94 @@
+import ast
+from src.code_metrics.batch import VECTOR_MIN_ROWS
+from src.code_metrics.cyclomatic import CyclomaticComplexityVisitor
+from src.code_metrics.records import FunctionRecord, MetricsTable
+from src.detectors.detect_long_function import LongFunctionDetector
+from src.detectors.rules import DEFAULT_THRESHOLDS, find_pyproject, load_thresholds
+import pytest
+from textwrap import dedent
+
+code = dedent('''
+def short(a):
+    return a
+
+def branchy(a, b, c, d, e, f):
+    if a:
+        pass
+    if b:
+        pass
+    if c:
+        pass
+    if d:
+        pass
+    if e:
+        pass
+    return f
+
+def complex(a):
+    for i in a:
+        if i:
+            while i:
+                i -= 1
+        elif i is None:
+            break
+    return [j for j in a if j]
+''')
+
+def table(copies=100):
+    visitor = CyclomaticComplexityVisitor()
+    visitor.visit(ast.parse(code))
+    return MetricsTable.from_records(FunctionRecord.from_function(func) for func in visitor.functions * copies)
+
+@pytest.mark.parametrize("thresholds, expected", [
+    (None, ['branchy', 'complex']),
+    ({'complexity': 10}, ['branchy']),
+    ({'branches': 5, 'complexity': 6}, ['complex']),
+    ({'mloc': 0}, ['short', 'branchy', 'complex']),
+])
+def test_select_matches_per_record(thresholds, expected):
+    metrics = table()
+    detector = LongFunctionDetector(thresholds)
+    selected = detector.select(metrics)
+    assert [index for index in range(len(metrics)) if detector.is_long_function(metrics[index])] == list(selected)
+    assert [metrics[index].name for index in selected[:len(expected)]] == expected
+    assert len(selected) == 100 * len(expected)
+
+def test_select_large_table_matches_small():
+    # Tables of VECTOR_MIN_ROWS rows or more are evaluated with numpy when it is installed
+    small = LongFunctionDetector().select(table(100))
+    large = LongFunctionDetector().select(table(VECTOR_MIN_ROWS))
+    assert list(large[:len(small)]) == list(small)
+    assert len(large) == len(small) * VECTOR_MIN_ROWS // 100
+
+def test_select_empty_table():
+    assert list(LongFunctionDetector().select(MetricsTable())) == []
+
+def test_load_thresholds(tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text("[project]\nname = 'example'\n\n[tool.refactoring.long_function]\ncomplexity = 10\nmloc = 30\n")
+    (tmp_path / "pkg").mkdir()
+    assert find_pyproject(str(tmp_path / "pkg")) == str(path)
+
+    thresholds = load_thresholds(str(path))
+    assert thresholds['long_function'] == dict(DEFAULT_THRESHOLDS['long_function'], complexity=10, mloc=30)
+    assert load_thresholds() == DEFAULT_THRESHOLDS
+
+@pytest.mark.parametrize("config", [
+    "[tool.refactoring.long_function]\nlength = 10\n",
+    "[tool.refactoring.long_function]\nmloc = 'ten'\n",
+    "[tool]\nrefactoring = 1\n",
+    "[tool.refactoring]\nlong_function = 5\n",
+])
+def test_invalid_thresholds(tmp_path, config):
+    path = tmp_path / "pyproject.toml"
+    path.write_text(config)
+    with pytest.raises(ValueError):
+        load_thresholds(str(path))
+
+def test_unknown_rule_tables_are_ignored(tmp_path):
+    path = tmp_path / "pyproject.toml"
+    path.write_text("[tool.refactoring.duplicates]\nmin_tokens = 50\n\n[tool.refactoring.long_function]\nmloc = 30\n")
+    with pytest.warns(UserWarning, match="duplicates"):
+        thresholds = load_thresholds(str(path))
+    assert 'duplicates' not in thresholds
+    assert thresholds['long_function']['mloc'] == 30
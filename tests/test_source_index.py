@@ -0,0 +1,54 @@
+import ast
+import mmap
+from textwrap import dedent
+from src.code_metrics.source import SourceIndex, SourceFile, dedented
+import pytest
+
+code_blocks = [
+    '''def f():\n    return 1\n''',
+    '''x = 1\n\ndef f(a):\n    return a\n\nclass C:\n    def m(self):\n        return 'é'\n''',
+    '''s = "ünïcödé"; t = (lambda: s)\r\ndef g():\r\n    return t\r\n''',
+    '''if True:\r    y = [1,\r         2]\r''',
+]
+
+@pytest.mark.parametrize("code", code_blocks)
+def test_segment_matches_get_source_segment(code):
+    index = SourceIndex(code)
+    for node in ast.walk(ast.parse(code)):
+        if hasattr(node, 'lineno'):
+            assert index.segment(node) == ast.get_source_segment(code, node)
+
+def test_lines():
+    index = SourceIndex(code_blocks[1])
+    assert len(index) == 9
+    assert index.lines(3, 4) == "def f(a):\n    return a\n"
+    assert index.lines(8, 8) == "        return 'é'\n"
+
+@pytest.mark.parametrize("code", code_blocks)
+@pytest.mark.parametrize("threshold", [0, 1 << 20])
+def test_source_file_matches_read(tmp_path, code, threshold):
+    path = tmp_path / "module.py"
+    path.write_bytes(code.encode('utf-8'))
+    with SourceFile(str(path), mmap_threshold=threshold) as source:
+        assert isinstance(source.data, mmap.mmap) == (threshold == 0)
+        assert source.text() == code
+        assert source.text() is source.text()
+        tree = ast.parse(source.data)
+        index = source.index()
+        for node in ast.walk(tree):
+            if hasattr(node, 'end_col_offset'):
+                assert index.segment(node) == ast.get_source_segment(code, node)
+
+def test_empty_source_file(tmp_path):
+    path = tmp_path / "empty.py"
+    path.write_bytes(b"")
+    with SourceFile(str(path), mmap_threshold=0) as source:
+        assert len(source) == 0 and source.text() == ""
+        assert ast.parse(source.data).body == []
+
+def test_dedented():
+    code = "def f():\n    return 1\n"
+    assert dedented(code) is code
+    indented = "\n    def f():\n        return 1\n"
+    assert dedented(indented) == dedent(indented).strip()
+    assert dedented(indented.encode('utf-8')) == dedent(indented).strip()
@@ -0,0 +1,71 @@
+import os
+from src.refactorers.transaction import Patch, RefactorTransaction, apply_patches
+from src.refactorers.refactor_long_function import LongFunctionRefactorer, plan_files
+from src.scanner.cache import content_hash
+import pytest
+from tests.test_long_function_refactorer import SOURCE
+
+LINES = ["a\n", "b\n", "c\n", "d\n"]
+
+def test_apply_patches_in_one_pass():
+    patches = [
+        Patch("f.py", 4, 4, ["D\n", "E\n"]),
+        Patch("f.py", 1, 0, ["start\n"]),
+        Patch("f.py", 2, 3, []),
+    ]
+    assert apply_patches(LINES, patches) == ["start\n", "a\n", "D\n", "E\n"]
+
+def test_overlapping_patches_are_rejected():
+    transaction = RefactorTransaction()
+    transaction.extend([Patch("f.py", 1, 2, ["x\n"]), Patch("f.py", 2, 3, ["y\n"]), Patch("g.py", 1, 1, [])])
+    assert len(transaction.conflicts("f.py")) == 1
+    assert transaction.conflicts("g.py") == []
+    with pytest.raises(ValueError):
+        transaction.check()
+
+    # Two inserts at the same line have no defined order
+    transaction = RefactorTransaction()
+    transaction.extend([Patch("f.py", 2, 1, ["x\n"]), Patch("f.py", 2, 1, ["y\n"])])
+    with pytest.raises(ValueError):
+        transaction.check()
+
+def test_refactorer_patches_reproduce_its_source():
+    refactorer = LongFunctionRefactorer(SOURCE)
+    refactorer.refactor()
+    patches = refactorer.patches("module.py")
+    assert patches
+    assert ''.join(apply_patches(SOURCE.splitlines(keepends=True), patches)) == refactorer.source
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_commit_writes_each_file_once(tmp_path, workers):
+    paths = []
+    for index in range(3):
+        path = tmp_path / f"module_{index}.py"
+        path.write_text(SOURCE)
+        paths.append(str(path))
+    (tmp_path / "short.py").write_text("def f():\n    return 1\n")
+
+    transaction, planned = plan_files(paths + [str(tmp_path / "short.py")], workers=workers)
+    assert [len(extractions) > 0 for path, extractions, error in planned] == [True, True, True, False]
+    assert sorted(transaction.patches) == paths
+
+    # A file edited after planning is not overwritten
+    os.chmod(paths[0], 0o755)
+    with open(paths[1], 'a') as file:
+        file.write("x = 1\n")
+    commits = {commit.path: commit for commit in transaction.commit(workers)}
+    assert commits[paths[1]].error is not None
+    assert commits[paths[0]].error is None and commits[paths[2]].error is None
+
+    refactorer = LongFunctionRefactorer(SOURCE)
+    refactorer.refactor()
+    assert open(paths[0]).read() == refactorer.source
+    assert open(paths[1]).read() == SOURCE + "x = 1\n"
+    assert os.stat(paths[0]).st_mode & 0o777 == 0o755
+    assert sorted(os.listdir(tmp_path)) == ["module_0.py", "module_1.py", "module_2.py", "short.py"]
+
+def test_patches_against_different_versions_are_rejected():
+    transaction = RefactorTransaction()
+    transaction.add(Patch("f.py", 1, 1, []), content_hash(b"one"))
+    with pytest.raises(ValueError):
+        transaction.add(Patch("f.py", 3, 3, []), content_hash(b"two"))
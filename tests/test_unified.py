@@ -0,0 +1,99 @@
+import ast
+from src.code_metrics.cyclomatic import CyclomaticComplexityVisitor
+from src.code_metrics.halstead import HalsteadMetricsVisitor
+from src.code_metrics.unified import UnifiedMetricsVisitor
+from tests.test_cyclomatic import code_blocks as cyclomatic_code_blocks
+from tests.test_halstead import code_blocks as halstead_code_blocks
+import pytest
+from textwrap import dedent
+
+def function_metrics(functions):
+    return [
+        (func.name, func.start_lineno, func.end_lineno, func.is_method, func.belongs_to, func.complexity,
+         func.mloc, func.num_params, func.num_localvar, func.branches, function_metrics(func.closures))
+        for func in functions
+    ]
+
+@pytest.mark.parametrize("code,expected, kwargs", cyclomatic_code_blocks)
+def test_cyclomatic_code_blocks(code, expected, kwargs):
+    visitor = UnifiedMetricsVisitor()
+    visitor.visit(ast.parse(dedent(code).strip()))
+    assert visitor.total_complexity() == expected
+
+@pytest.mark.parametrize("code,expected", halstead_code_blocks)
+def test_halstead_code_blocks(code, expected):
+    visitor = UnifiedMetricsVisitor()
+    visitor.visit(ast.parse(dedent(code).strip()))
+    assert expected == (visitor.operands,
+                        visitor.operators,
+                        len(visitor.unique_operands),
+                        len(visitor.unique_operators)
+                        )
+
+def test_matches_individual_visitors():
+    with open('src/code_smells.py', 'r') as file:
+        code = file.read()
+    code += dedent('''
+    def outer(a, b):
+        x, y = a, b
+        def inner(c):
+            if c and a:
+                return [i for i in range(c) if i]
+            return c
+        while x < y:
+            x += 1
+        else:
+            assert x
+        return inner(x)
+    class Nested:
+        class Inner:
+            z = 1
+        async def run(self):
+            if self:
+                pass
+    ''')
+    node = ast.parse(code)
+
+    cyclomatic_visitor = CyclomaticComplexityVisitor()
+    cyclomatic_visitor.visit(node)
+    halstead_visitor = HalsteadMetricsVisitor()
+    halstead_visitor.visit(node)
+    visitor = UnifiedMetricsVisitor()
+    visitor.visit(node)
+
+    assert function_metrics(visitor.functions) == function_metrics(cyclomatic_visitor.functions)
+    assert [(cls.name, cls.complexity, cls.mloc, function_metrics(cls.methods)) for cls in visitor.classes] == \
+        [(cls.name, cls.complexity, cls.mloc, function_metrics(cls.methods)) for cls in cyclomatic_visitor.classes]
+    assert visitor.total_complexity() == cyclomatic_visitor.total_complexity()
+    assert visitor.get_total_loc() == cyclomatic_visitor.get_total_loc()
+    assert (visitor.operators, visitor.operands, visitor.unique_operators, visitor.unique_operands) == \
+        (halstead_visitor.operators, halstead_visitor.operands, halstead_visitor.unique_operators, halstead_visitor.unique_operands)
+    assert [scope.kind for scope in visitor.scopes].count('function') == 11
+
+def test_function_halstead_matches_halstead_visitor():
+    with open('src/code_smells.py', 'r') as file:
+        code = file.read()
+    node = ast.parse(code)
+
+    halstead_visitor = HalsteadMetricsVisitor()
+    halstead_visitor.visit(node)
+    visitor = UnifiedMetricsVisitor()
+    visitor.visit(node)
+
+    def collect(functions):
+        for func in functions:
+            yield func
+            yield from collect(func.closures)
+
+    functions = list(collect(visitor.functions))
+    for cls in visitor.classes:
+        functions.extend(collect(cls.methods))
+        assert cls.halstead.operators >= sum(method.halstead.operators for method in cls.methods)
+
+    def counts(metrics):
+        return (metrics.operators, metrics.operands, metrics.unique_operators, metrics.unique_operands)
+
+    assert {(func.name, func.start_lineno): counts(func.halstead) for func in functions} == \
+        {(function_node.name, function_node.lineno): counts(metrics) for function_node, metrics in halstead_visitor.functions}
+    for func in functions:
+        assert 0 <= func.maintainability_index() <= 100
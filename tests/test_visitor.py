@@ -0,0 +1,79 @@
+import ast
+import sys
+from src.code_metrics.visitor import DispatchVisitor
+from src.code_metrics.cyclomatic import CyclomaticComplexityVisitor
+from src.code_metrics.halstead import HalsteadMetricsVisitor
+from src.code_metrics.trace import VisitTracer
+
+CODE = '''
+def f(a, b=1):
+    if a and b:
+        return [x for x in a if x]
+    while a:
+        a -= 1
+    assert a, "message"
+
+class C:
+    def m(self):
+        return self.f(1) < 2
+'''
+
+class Recorder(DispatchVisitor):
+
+    leaves = frozenset((ast.Assert,))
+
+    def __init__(self):
+        self.seen = []
+
+    def visit_Name(self, node: ast.Name):
+        self.seen.append(node.id)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.seen.append(node.name)
+
+
+class NodeRecorder(ast.NodeVisitor):
+
+    def __init__(self):
+        self.seen = []
+
+    def visit_Name(self, node: ast.Name):
+        self.seen.append(node.id)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.seen.append(node.name)
+        self.generic_visit(node)
+
+    def visit_Assert(self, node: ast.Assert):
+        pass
+
+
+def test_same_order_as_node_visitor():
+    tree = ast.parse(CODE)
+    expected = NodeRecorder()
+    expected.visit(tree)
+    assert Recorder().visit(tree).seen == expected.seen
+    assert ast.Assert not in Recorder.handlers and ast.Name in Recorder.handlers
+
+def test_deep_nesting_within_recursion_limit():
+    depth = sys.getrecursionlimit() * 2
+    tree = ast.BinOp(ast.Name('a', ast.Load()), ast.Add(), ast.Name('b', ast.Load()))
+    for _ in range(depth):
+        tree = ast.BinOp(tree, ast.Add(), ast.Name('b', ast.Load()))
+    tree = ast.Module([ast.Expr(tree, lineno=1, col_offset=0)], [])
+
+    halstead_visitor = HalsteadMetricsVisitor()
+    halstead_visitor.visit(tree)
+    assert halstead_visitor.operators == depth + 1
+    assert CyclomaticComplexityVisitor().visit(tree).cyclomatic_complexity == 1
+
+def test_traced_walk_counts_every_node():
+    tree = ast.parse(CODE)
+    tracer = VisitTracer()
+    traced = Recorder()
+    tracer.attach(traced)
+    traced.visit(tree)
+    assert traced.seen == Recorder().visit(tree).seen
+    # The children of the assert are not visited
+    assert sum(tracer.counts.values()) == sum(1 for node in ast.walk(tree)) - 3
+    assert tracer.starts == [] and tracer.child_time == []